@@ -9,9 +9,13 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+
+from billing.streaming import StreamingASGIHandler
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'billing.settings')
 
-application = get_asgi_application()
+# как get_asgi_application, но потоковые ответы читаются вне событийного цикла
+django.setup(set_prefix=False)
+application = StreamingASGIHandler()
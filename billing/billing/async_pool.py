@@ -0,0 +1,113 @@
+"""
+Пул потоков для блокирующих обращений к базе и редису из асинхронных вью.
+
+Драйверы базы и редиса синхронные, поэтому асинхронная вью отдаёт работу с ними в
+ограниченный пул потоков воркера (ASYNC_POOL['THREADS']), а событийный цикл тем временем
+принимает другие запросы. Количество одновременно обрабатываемых запросов на воркер
+ограничено ASYNC_POOL['CONCURRENCY'], запрос сверх лимита ждёт не дольше
+ASYNC_POOL['QUEUE_TIMEOUT'] секунд.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+)
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Воркер уже обрабатывает ASYNC_POOL['CONCURRENCY'] запросов."""
+
+
+# пул по pid процесса: после fork у воркера будет свой пул, а не копия пула мастера
+_executors: Dict[int, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+# ограничение одновременных запросов для каждого событийного цикла
+_semaphores: 'WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = (
+    WeakKeyDictionary()
+)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Пул потоков текущего процесса, создаётся при первом обращении."""
+    pid = os.getpid()
+    executor = _executors.get(pid)
+    if executor is not None:
+        return executor
+
+    with _executors_lock:
+        if pid not in _executors:
+            _executors.clear()
+            _executors[pid] = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_POOL['THREADS'],
+                thread_name_prefix='async-pool',
+            )
+        return _executors[pid]
+
+
+def _call_with_connections(func: Callable, *args, **kwargs) -> Any:
+    """
+    Вызов в потоке пула.
+
+    Соединения с базой у каждого потока свои, поэтому закрываем устаревшие до и после
+    вызова, как это делает джанго в начале и конце запроса.
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func: Callable, *args, **kwargs) -> Any:
+    """
+    Выполнение блокирующей функции в пуле потоков без блокировки событийного цикла.
+
+    :param func: синхронная функция (запросы к базе, редису)
+    :return: результат функции
+    """
+    loop = asyncio.get_running_loop()
+    # контекст запроса (метрики этапов) передаётся в поток пула
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        get_executor(),
+        partial(context.run, _call_with_connections, func, *args, **kwargs),
+    )
+
+
+@asynccontextmanager
+async def concurrency_limit():
+    """
+    Ограничение одновременно обрабатываемых запросов воркера.
+
+    :raises ConcurrencyLimitExceeded: свободного места не появилось за QUEUE_TIMEOUT секунд
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(settings.ASYNC_POOL['CONCURRENCY'])
+
+    if semaphore.locked():
+        try:
+            await asyncio.wait_for(
+                semaphore.acquire(),
+                timeout=settings.ASYNC_POOL['QUEUE_TIMEOUT'],
+            )
+        except asyncio.TimeoutError:
+            raise ConcurrencyLimitExceeded()
+    else:
+        await semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
@@ -0,0 +1,48 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from billing.metrics import (
+    STAGE_AUTH,
+    stage_timer,
+)
+from users.user_cache import (
+    build_user,
+    get_user_data,
+)
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """JWT авторизация с замером времени проверки токена и чтения пользователя."""
+
+    def authenticate(self, request):
+        """Авторизация запроса как этап auth метрик запроса."""
+        with stage_timer(STAGE_AUTH):
+            return super().authenticate(request)
+
+
+class CachedJWTAuthentication(TimedJWTAuthentication):
+    """
+    JWT авторизация без чтения пользователя из базы.
+
+    id пользователя берётся из токена, активность и права - из кэша пользователей
+    (users.user_cache), база читается только при промахе кэша.
+    """
+
+    def get_user(self, validated_token):
+        """Пользователь по токену с теми же ошибками, что и у JWTAuthentication."""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        data = get_user_data(user_id)
+        if data is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not data['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return build_user(data)
@@ -0,0 +1,122 @@
+"""Общие функции для нагрузочных замеров (management команды benchmark_*)."""
+import bisect
+import itertools
+import math
+import random
+import resource
+from typing import (
+    Callable,
+    Dict,
+    List,
+)
+
+
+# распределения популярности кошельков в нагрузочных замерах:
+# все одинаково популярны / k-й по популярности выбирается с весом 1 / k^s
+DISTRIBUTION_UNIFORM = 'uniform'
+DISTRIBUTION_ZIPF = 'zipf'
+DISTRIBUTIONS = (
+    DISTRIBUTION_UNIFORM,
+    DISTRIBUTION_ZIPF,
+)
+# метрики сводки, которые сравниваются между прогонами, и лучше ли их рост
+COMPARED_METRICS = {
+    'throughput': True,
+    'p50_ms': False,
+    'p90_ms': False,
+    'p99_ms': False,
+}
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Перцентиль по методу ближайшего ранга.
+
+    :param values: отсортированные по возрастанию значения
+    :param percent: перцентиль от 0 до 100
+    :return: значение перцентиля или 0 для пустого списка
+    """
+    if not values:
+        return 0
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def summarize_latencies(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """
+    Сводка по замерам: пропускная способность и перцентили задержки.
+
+    :param latencies: время выполнения каждой операции в секундах
+    :param elapsed: общее время прогона в секундах
+    :return: количество операций, операций в секунду и перцентили в миллисекундах
+    """
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': (latencies[-1] if latencies else 0) * 1000,
+    }
+
+
+def format_summary(name: str, summary: Dict[str, float]) -> str:
+    """Сводка одной строкой для вывода в консоль."""
+    return (
+        f'{name}: {summary["count"]} ops, {summary["throughput"]:.1f} ops/s, '
+        f'p50 {summary["p50_ms"]:.2f} ms, p90 {summary["p90_ms"]:.2f} ms, '
+        f'p99 {summary["p99_ms"]:.2f} ms, max {summary["max_ms"]:.2f} ms'
+    )
+
+
+def get_peak_rss_mb() -> float:
+    """Пиковый RSS процесса в мегабайтах (ru_maxrss в Linux - в килобайтах)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def make_sampler(size: int,
+                 distribution: str,
+                 zipf_s: float = 1.1,
+                 rng: random.Random = None) -> Callable[[], int]:
+    """
+    Выбор индекса от 0 до size - 1 с заданным распределением популярности.
+
+    :param size: количество элементов
+    :param distribution: DISTRIBUTION_UNIFORM или DISTRIBUTION_ZIPF (индекс 0 самый популярный)
+    :param zipf_s: показатель распределения Ципфа, чем больше, тем горячее первые элементы
+    :param rng: генератор случайных чисел (для воспроизводимости прогона)
+    :return: функция без аргументов, возвращающая индекс
+    """
+    rng = rng or random.Random()  # noqa: S311
+    if distribution == DISTRIBUTION_UNIFORM:
+        return lambda: rng.randrange(size)
+
+    cum_weights = list(itertools.accumulate(1 / rank ** zipf_s for rank in range(1, size + 1)))
+    total = cum_weights[-1]
+    return lambda: bisect.bisect_left(cum_weights, rng.random() * total)
+
+
+def compare_results(baseline: Dict[str, Dict], current: Dict[str, Dict]) -> List[str]:
+    """
+    Сравнение сводок двух прогонов по сценариям.
+
+    :param baseline: сводки предыдущего прогона по имени сценария
+    :param current: сводки текущего прогона по имени сценария
+    :return: строки с изменением метрик в процентах для вывода в консоль
+    """
+    lines = []
+    for name, summary in current.items():
+        base = baseline.get(name)
+        if base is None:
+            lines.append(f'{name}: no baseline')
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = base.get(metric, 0), summary.get(metric, 0)
+            change = (after - before) / before * 100 if before else 0
+            is_better = (change > 0) == higher_is_better
+            verdict = '' if abs(change) < 5 else (' better' if is_better else ' worse')
+            changes.append(f'{metric} {before:.1f} -> {after:.1f} ({change:+.1f}%{verdict})')
+        lines.append(f'{name}: ' + ', '.join(changes))
+    return lines
@@ -0,0 +1,142 @@
+"""
+Метрики запросов в формате Prometheus.
+
+MetricsMiddleware замеряет каждый запрос, а код горячего пути отмечает этапы
+(stage_timer, observe_stage): авторизация, валидация, ожидание лока кошельков, транзакция.
+Количество и время SQL запросов считаются обёрткой над выполнением запросов каждого
+соединения с базой. Этапы и SQL складываются в контекст текущего запроса (contextvars),
+поэтому запросы из пула потоков асинхронных вью тоже учитываются, а вне запроса
+(management команды) замеры ничего не делают.
+
+Под gunicorn метрики воркеров складываются в каталог PROMETHEUS_MULTIPROC_DIR
+и суммируются при выдаче /metrics (см. gunicorn.conf.py).
+"""
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import (
+    dataclass,
+    field,
+)
+from time import perf_counter
+from typing import (
+    Dict,
+    Iterator,
+    Optional,
+)
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    multiprocess,
+)
+
+
+STAGE_AUTH = 'auth'
+STAGE_VALIDATION = 'validation'
+STAGE_LOCK_WAIT = 'lock_wait'
+STAGE_TRANSACTION = 'transaction'
+STAGE_SQL = 'sql'
+
+REQUEST_DURATION = Histogram(
+    'billing_request_duration_seconds',
+    'Request duration',
+    ('endpoint', 'method', 'status'),
+)
+STAGE_DURATION = Histogram(
+    'billing_request_stage_duration_seconds',
+    'Time spent in a stage of request processing',
+    ('endpoint', 'stage'),
+)
+SQL_QUERIES = Histogram(
+    'billing_request_sql_queries',
+    'SQL queries per request',
+    ('endpoint',),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, float('inf')),
+)
+
+
+@dataclass
+class RequestMetrics:
+    """Этапы текущего запроса: суммарное время по этапу, количество SQL запросов."""
+
+    stages: Dict[str, float] = field(default_factory=dict)
+    sql_queries: int = 0
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar('request_metrics', default=None)
+
+
+def observe_stage(stage: str, duration: float):
+    """
+    Учёт времени этапа текущего запроса (этап может повторяться, время суммируется).
+
+    :param stage: имя этапа
+    :param duration: время в секундах
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.stages[stage] = metrics.stages.get(stage, 0) + duration
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Замер времени блока кода как этапа текущего запроса."""
+    started_at = perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, perf_counter() - started_at)
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка над выполнением SQL запроса (connection.execute_wrapper)."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    started_at = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_queries += 1
+        observe_stage(STAGE_SQL, perf_counter() - started_at)
+
+
+@receiver(connection_created)
+def install_query_recorder(connection, **kwargs):  # noqa: U100
+    """Считаем запросы каждого соединения (сигнал приходит и при переподключении)."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def request_metrics() -> Iterator[RequestMetrics]:
+    """Контекст замеров одного запроса."""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def observe_request(endpoint: str, method: str, status: int, duration: float,
+                    metrics: RequestMetrics):
+    """Запись замеров завершённого запроса в гистограммы."""
+    REQUEST_DURATION.labels(endpoint, method, status).observe(duration)
+    for stage, stage_duration in metrics.stages.items():
+        STAGE_DURATION.labels(endpoint, stage).observe(stage_duration)
+    SQL_QUERIES.labels(endpoint).observe(metrics.sql_queries)
+
+
+def get_registry() -> CollectorRegistry:
+    """Реестр метрик: под gunicorn - сумма по всем воркерам, иначе метрики процесса."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
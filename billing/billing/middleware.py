@@ -0,0 +1,48 @@
+import asyncio
+from time import perf_counter
+
+from django.utils.deprecation import MiddlewareMixin
+
+from billing.metrics import (
+    observe_request,
+    request_metrics,
+)
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    Замер запроса: общее время, этапы горячего пути и SQL запросы по эндпоинту.
+
+    Эндпоинт - шаблон маршрута (wallet/transaction/), а не путь запроса, чтобы id
+    в пути не размножали метрики. Работает и в синхронном, и в асинхронном стеке.
+    """
+
+    def __call__(self, request):
+        """Синхронный запрос."""
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self._acall(request)
+
+        with request_metrics() as metrics:
+            started_at = perf_counter()
+            response = self.get_response(request)
+            self._observe(request, response, perf_counter() - started_at, metrics)
+        return response
+
+    async def _acall(self, request):
+        """Асинхронный запрос."""
+        with request_metrics() as metrics:
+            started_at = perf_counter()
+            response = await self.get_response(request)
+            self._observe(request, response, perf_counter() - started_at, metrics)
+        return response
+
+    @staticmethod
+    def _observe(request, response, duration: float, metrics):
+        resolver_match = request.resolver_match
+        observe_request(
+            endpoint=resolver_match.route if resolver_match else 'unmatched',
+            method=request.method,
+            status=response.status_code,
+            duration=duration,
+            metrics=metrics,
+        )
@@ -0,0 +1,213 @@
+"""
+Общий для процесса пул соединений с редисом.
+
+Все обращения к редису (локи кошельков, кэши) должны идти через get_redis_client(),
+чтобы не открывать новое соединение на каждый запрос. Пул создаётся лениво в каждом
+процессе: после fork (gunicorn воркеры) соединения родителя не переиспользуются.
+"""
+import os
+import random
+import threading
+from time import (
+    perf_counter,
+    sleep,
+)
+from typing import Dict
+
+from django.conf import settings
+from redis import (
+    BlockingConnectionPool,
+    StrictRedis,
+)
+from redis.exceptions import (
+    ConnectionError,
+    TimeoutError,
+)
+
+
+# так BlockingConnectionPool сообщает, что свободного соединения не дождались за timeout
+POOL_EXHAUSTED_MESSAGE = 'No connection available.'
+
+
+class PoolExhaustedError(ConnectionError):
+    """Все соединения пула заняты дольше POOL_TIMEOUT."""
+
+
+class MeasuredConnectionPool(BlockingConnectionPool):
+    """
+    Пул соединений со счётчиками для подбора размера пула на воркер.
+
+    Если все max_connections соединений заняты, запрос ждёт свободное соединение
+    не дольше timeout секунд (затем PoolExhaustedError), время ожидания накапливается
+    в статистике.
+    """
+
+    def reset(self):
+        """Сброс пула, в том числе после fork."""
+        super().reset()
+        self._stats_lock = threading.Lock()
+        self._wait_count = 0
+        self._wait_total = 0
+        self._wait_max = 0
+
+    def get_connection(self, command_name, *keys, **options):
+        """Соединение из пула с замером времени ожидания."""
+        started_at = perf_counter()
+        try:
+            return super().get_connection(command_name, *keys, **options)
+        except ConnectionError as exc:
+            if exc.args == (POOL_EXHAUSTED_MESSAGE,):
+                raise PoolExhaustedError(POOL_EXHAUSTED_MESSAGE) from exc
+            raise
+        finally:
+            wait_time = perf_counter() - started_at
+            with self._stats_lock:
+                self._wait_count += 1
+                self._wait_total += wait_time
+                self._wait_max = max(self._wait_max, wait_time)
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Статистика пула текущего процесса.
+
+        :return: размер пула, занятые и свободные соединения, время ожидания соединения
+        """
+        idle = sum(1 for connection in list(self.pool.queue) if connection is not None)
+        created = len(self._connections)
+        with self._stats_lock:
+            return {
+                'pid': self.pid,
+                'max_connections': self.max_connections,
+                'created': created,
+                'in_use': created - idle,
+                'idle': idle,
+                'wait_count': self._wait_count,
+                'wait_total_ms': self._wait_total * 1000,
+                'wait_max_ms': self._wait_max * 1000,
+            }
+
+
+# Команды, повтор которых после обрыва или таймаута не меняет данных и результата:
+# чтение и перезапись тем же значением. Повтор XADD, EVALSHA, INCR или SET NX мог бы
+# выполнить команду дважды или вернуть результат, не соответствующий первой попытке.
+IDEMPOTENT_COMMANDS = frozenset((
+    'EXISTS',
+    'EXPIRE',
+    'GET',
+    'HGET',
+    'HGETALL',
+    'MGET',
+    'PEXPIRE',
+    'PING',
+    'PTTL',
+    'SCRIPT LOAD',
+    'SET',
+    'TTL',
+    'XLEN',
+    'XPENDING',
+    'XRANGE',
+    'ZCARD',
+    'ZRANGE',
+    'ZREVRANGE',
+    'ZSCORE',
+))
+# параметры SET, с которыми результат зависит от того, выполнилась ли первая попытка
+CONDITIONAL_SET_OPTIONS = frozenset(('NX', 'XX', 'GET'))
+
+
+def is_idempotent(*args) -> bool:
+    """Команду можно повторить, даже если первая попытка могла выполниться."""
+    command_name = str(args[0]).upper()
+    if command_name not in IDEMPOTENT_COMMANDS:
+        return False
+    if command_name == 'SET':
+        return not CONDITIONAL_SET_OPTIONS & {str(arg).upper() for arg in args[3:]}
+    return True
+
+
+class RetryingRedis(StrictRedis):
+    """
+    Клиент редиса с повтором команды при обрыве соединения.
+
+    Если соединение не удалось открыть, команда не отправлялась и повторяется любая.
+    Исчерпание пула (PoolExhaustedError) не повторяется: запрос уже ждал POOL_TIMEOUT,
+    и при перегрузке он должен сразу получить ошибку, а не ждать ещё раз.
+    Обрыв или таймаут после отправки повторяется только для команд из IDEMPOTENT_COMMANDS:
+    остальные могли выполниться. Между попытками ждём с экспоненциальной задержкой
+    и случайным разбросом, чтобы воркеры не переподключались одновременно.
+    """
+
+    def __init__(self, *args, retry_attempts: int = 1, retry_backoff: float = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_attempts = retry_attempts
+        self.retry_backoff = retry_backoff
+
+    def execute_command(self, *args, **options):
+        """Выполнение команды с повторами (как StrictRedis.execute_command)."""
+        pool = self.connection_pool
+        command_name = args[0]
+        attempt = 1
+        while True:
+            try:
+                connection = self.connection or pool.get_connection(command_name, **options)
+            except PoolExhaustedError:
+                raise
+            except (ConnectionError, TimeoutError):
+                if attempt >= self.retry_attempts:
+                    raise
+            else:
+                try:
+                    connection.send_command(*args)
+                    return self.parse_response(connection, command_name, **options)
+                except (ConnectionError, TimeoutError):
+                    connection.disconnect()
+                    if attempt >= self.retry_attempts or not is_idempotent(*args):
+                        raise
+                finally:
+                    if not self.connection:
+                        pool.release(connection)
+            sleep(self.retry_backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))  # noqa: S311
+            attempt += 1
+
+
+# пул по pid процесса: после fork у воркера будет свой пул, а не копия пула мастера
+_pools: Dict[int, MeasuredConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool() -> MeasuredConnectionPool:
+    """Пул соединений текущего процесса, создаётся при первом обращении."""
+    pid = os.getpid()
+    pool = _pools.get(pid)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        if pid not in _pools:
+            config = settings.REDIS
+            _pools.clear()
+            _pools[pid] = MeasuredConnectionPool(
+                host=config['HOST'],
+                port=config['PORT'],
+                max_connections=config['MAX_CONNECTIONS'],
+                timeout=config['POOL_TIMEOUT'],
+                socket_timeout=config['SOCKET_TIMEOUT'],
+                socket_connect_timeout=config['SOCKET_CONNECT_TIMEOUT'],
+                health_check_interval=config['HEALTH_CHECK_INTERVAL'],
+                decode_responses=True,
+            )
+        return _pools[pid]
+
+
+def get_redis_client() -> StrictRedis:
+    """Клиент редиса поверх общего пула соединений (создание клиента не открывает соединений)."""
+    return RetryingRedis(
+        connection_pool=get_connection_pool(),
+        retry_attempts=settings.REDIS['RETRY_ATTEMPTS'],
+        retry_backoff=settings.REDIS['RETRY_BACKOFF'],
+    )
+
+
+def get_pool_stats() -> Dict[str, float]:
+    """Статистика пула соединений текущего процесса."""
+    return get_connection_pool().get_stats()
@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    # первым, чтобы в замер попадали все остальные middleware
+    'billing.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +94,9 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'example'),
         'HOST': os.getenv('DB_HOST', 'db'),
         'PORT': os.getenv('DB_PORT', 5432),
+        # сколько секунд держать соединение с базой открытым между запросами
+        # (0 - новое соединение на каждый запрос, в том числе в потоках ASYNC_POOL)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
     },
 }
 
@@ -121,7 +126,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'billing.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -135,6 +140,143 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
 }
 
+# Кэш пользователей для JWT авторизации (см. users/user_cache.py): в редисе на TTL секунд
+# и в памяти процесса до LOCAL_SIZE записей на LOCAL_TTL секунд - за это время деактивация
+# пользователя доходит до остальных воркеров
+AUTH_USER_CACHE = {
+    'TTL': int(os.getenv('AUTH_USER_CACHE_TTL', 5 * 60)),
+    'LOCAL_TTL': float(os.getenv('AUTH_USER_CACHE_LOCAL_TTL', 5)),
+    'LOCAL_SIZE': int(os.getenv('AUTH_USER_CACHE_LOCAL_SIZE', 10000)),
+}
+
+# Хэширование паролей входа и регистрации в пуле из WORKERS процессов на воркер с приоритетом
+# ниже на NICE (см. users/password_pool.py). Во всём сервисе одновременно хэшируется не больше
+# MAX_PENDING паролей, остальные запросы сразу получают 503; место упавшего воркера
+# освобождается через STALE_AFTER секунд
+PASSWORD_POOL = {
+    'ENABLED': os.getenv('PASSWORD_POOL_ENABLED', 'false').lower() == 'true',
+    'WORKERS': int(os.getenv('PASSWORD_POOL_WORKERS', 1)),
+    'MAX_PENDING': int(os.getenv('PASSWORD_POOL_MAX_PENDING', 4)),
+    'NICE': int(os.getenv('PASSWORD_POOL_NICE', 10)),
+    'STALE_AFTER': float(os.getenv('PASSWORD_POOL_STALE_AFTER', 30)),
+}
+
+# Массовое создание пользователей (команда provision_users и internal/provision-users/):
+# пароли хэшируются в WORKERS процессах, пользователи пишутся пачками по CHUNK_SIZE
+USER_PROVISION_WORKERS = int(os.getenv('USER_PROVISION_WORKERS', os.cpu_count() or 1))
+USER_PROVISION_CHUNK_SIZE = int(os.getenv('USER_PROVISION_CHUNK_SIZE', 1000))
+
+# Массовая деактивация пользователей (UserQuerySet.deactivate): пользователей в одной транзакции
+USER_DEACTIVATION_BATCH_SIZE = int(os.getenv('USER_DEACTIVATION_BATCH_SIZE', 1000))
+
+# Редис: один пул соединений на процесс (см. billing/redis_pool.py)
+REDIS = {
+    'HOST': os.getenv('REDIS_HOST'),
+    'PORT': int(os.getenv('REDIS_PORT', 6389)),
+    # максимум соединений на воркер, при исчерпании ждём свободное не дольше POOL_TIMEOUT
+    'MAX_CONNECTIONS': int(os.getenv('REDIS_MAX_CONNECTIONS', 20)),
+    'POOL_TIMEOUT': float(os.getenv('REDIS_POOL_TIMEOUT', 2)),
+    'SOCKET_TIMEOUT': float(os.getenv('REDIS_SOCKET_TIMEOUT', 1)),
+    'SOCKET_CONNECT_TIMEOUT': float(os.getenv('REDIS_SOCKET_CONNECT_TIMEOUT', 0.5)),
+    # проверка соединения, простоявшего в пуле дольше указанного числа секунд
+    'HEALTH_CHECK_INTERVAL': int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 30)),
+    # всего попыток выполнить команду при обрыве соединения и базовая задержка между ними
+    # (после отправки повторяются только идемпотентные команды, исчерпание пула не повторяется)
+    'RETRY_ATTEMPTS': int(os.getenv('REDIS_RETRY_ATTEMPTS', 2)),
+    'RETRY_BACKOFF': float(os.getenv('REDIS_RETRY_BACKOFF', 0.05)),
+}
+
+# Способ проведения перевода между кошельками:
+# locking - под локом в редисе, conditional - одним запросом с условным списанием (только postgres)
+WALLET_TRANSFER_ENGINE = os.getenv('WALLET_TRANSFER_ENGINE', 'locking')
+
+# Бэкенд локов кошельков при переводах:
+# wallet.secure_transaction.RedisWalletLock - лок в редисе,
+# wallet.secure_transaction.AdvisoryWalletLock - транзакционный advisory лок postgres,
+# wallet.secure_transaction.LocalWalletLock - лок внутри процесса (для тестов)
+WALLET_LOCK_BACKEND = os.getenv(
+    'WALLET_LOCK_BACKEND',
+    'wallet.secure_transaction.RedisWalletLock',
+)
+# Используется, если основной бэкенд недоступен, пустое значение отключает переключение
+WALLET_LOCK_FALLBACK_BACKEND = os.getenv(
+    'WALLET_LOCK_FALLBACK_BACKEND',
+    'wallet.secure_transaction.AdvisoryWalletLock',
+)
+# Время жизни лока в редисе в секундах: лок упавшего воркера освободится сам.
+# Пока перевод идёт, лок продлевается каждые WALLET_LOCK_RENEW_INTERVAL секунд
+WALLET_LOCK_LEASE = float(os.getenv('WALLET_LOCK_LEASE', 10))
+WALLET_LOCK_RENEW_INTERVAL = float(os.getenv('WALLET_LOCK_RENEW_INTERVAL', 3))
+# Сколько секунд ждать занятый кошелёк, после чего запрос получает 429 с Retry-After
+WALLET_LOCK_ACQUIRE_TIMEOUT = float(os.getenv('WALLET_LOCK_ACQUIRE_TIMEOUT', 2))
+WALLET_LOCK_RETRY_AFTER = int(os.getenv('WALLET_LOCK_RETRY_AFTER', 1))
+# Ожидание лока дольше порога (секунды) и таймауты записываются в статистику кошелька
+WALLET_LOCK_CONTENTION_THRESHOLD = float(os.getenv('WALLET_LOCK_CONTENTION_THRESHOLD', 0.005))
+# Скользящее окно статистики локов для поиска горячих кошельков: окно складывается
+# из интервалов по WALLET_CONTENTION_BUCKET секунд, интервалы хранятся
+# WALLET_CONTENTION_MAX_WINDOW секунд. Переводы без ожидания лока записываются
+# с вероятностью WALLET_CONTENTION_SAMPLE_RATE
+WALLET_CONTENTION_BUCKET = int(os.getenv('WALLET_CONTENTION_BUCKET', 10))
+WALLET_CONTENTION_MAX_WINDOW = int(os.getenv('WALLET_CONTENTION_MAX_WINDOW', 60 * 60))
+WALLET_CONTENTION_SAMPLE_RATE = float(os.getenv('WALLET_CONTENTION_SAMPLE_RATE', 0.1))
+
+# Транзакции моложе указанного числа секунд не попадают в снимок баланса кошелька:
+# транзакция, начатая раньше, может закоммититься позже с меньшим created_at
+WALLET_BALANCE_SNAPSHOT_LAG = int(os.getenv('WALLET_BALANCE_SNAPSHOT_LAG', 300))
+
+# На сколько месяцев вперёд создаются секции таблицы транзакций (после migrate
+# и командой create_transaction_partitions) и куда выгружаются архивные месяцы
+WALLET_TRANSACTION_PARTITIONS_AHEAD = int(os.getenv('WALLET_TRANSACTION_PARTITIONS_AHEAD', 3))
+WALLET_TRANSACTION_ARCHIVE_DIR = os.getenv(
+    'WALLET_TRANSACTION_ARCHIVE_DIR',
+    str(BASE_DIR / 'archive'),
+)
+
+# Время жизни баланса кошелька в кэше редиса (секунды) и доля чтений из кэша,
+# для которых версия баланса сверяется с базой (статистика отставания кэша)
+WALLET_BALANCE_CACHE_TTL = float(os.getenv('WALLET_BALANCE_CACHE_TTL', 60))
+WALLET_BALANCE_CACHE_STALENESS_SAMPLE_RATE = float(
+    os.getenv('WALLET_BALANCE_CACHE_STALENESS_SAMPLE_RATE', 0.01),
+)
+
+# Сколько секунд хранится ответ на запрос с заголовком Idempotency-Key, сколько живёт
+# отметка о том, что запрос выполняется, и сколько повтор ждёт ответа выполняющегося запроса
+WALLET_IDEMPOTENCY_TTL = int(os.getenv('WALLET_IDEMPOTENCY_TTL', 24 * 60 * 60))
+WALLET_IDEMPOTENCY_PENDING_TTL = float(os.getenv('WALLET_IDEMPOTENCY_PENDING_TTL', 30))
+WALLET_IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('WALLET_IDEMPOTENCY_WAIT_TIMEOUT', 1))
+
+# Способ проведения пополнений: sync - транзакция базы на каждый запрос, stream - запрос
+# добавляется в поток редиса STREAM, а воркеры группы STREAM_GROUP (команда deposit_worker)
+# проводят пополнения пачками до BATCH_SIZE, собирая пачку не дольше BATCH_LATENCY секунд.
+# Неподтверждённые сообщения упавшего воркера забираются через CLAIM_IDLE секунд, сообщение,
+# не проведённое за MAX_DELIVERIES попыток, переносится в поток DEAD_LETTER_STREAM
+WALLET_DEPOSIT_MODE = os.getenv('WALLET_DEPOSIT_MODE', 'sync')
+WALLET_DEPOSIT_STREAM = os.getenv('WALLET_DEPOSIT_STREAM', 'wallet_deposits')
+WALLET_DEPOSIT_STREAM_GROUP = os.getenv('WALLET_DEPOSIT_STREAM_GROUP', 'deposit_workers')
+WALLET_DEPOSIT_BATCH_SIZE = int(os.getenv('WALLET_DEPOSIT_BATCH_SIZE', 500))
+WALLET_DEPOSIT_BATCH_LATENCY = float(os.getenv('WALLET_DEPOSIT_BATCH_LATENCY', 0.05))
+WALLET_DEPOSIT_CLAIM_IDLE = float(os.getenv('WALLET_DEPOSIT_CLAIM_IDLE', 60))
+WALLET_DEPOSIT_MAX_DELIVERIES = int(os.getenv('WALLET_DEPOSIT_MAX_DELIVERIES', 5))
+WALLET_DEPOSIT_DEAD_LETTER_STREAM = os.getenv(
+    'WALLET_DEPOSIT_DEAD_LETTER_STREAM',
+    'wallet_deposits_dead',
+)
+
+# Асинхронные вью перевода и пополнения, включаются при запуске под ASGI (uvicorn).
+# Запросы к базе и редису выполняются в пуле из THREADS потоков на воркер, одновременно
+# обрабатывается не больше CONCURRENCY запросов, лишние ждут QUEUE_TIMEOUT секунд и получают 503
+WALLET_ASYNC_VIEWS = os.getenv('WALLET_ASYNC_VIEWS', 'false').lower() == 'true'
+ASYNC_POOL = {
+    'THREADS': int(os.getenv('ASYNC_POOL_THREADS', 8)),
+    'CONCURRENCY': int(os.getenv('ASYNC_POOL_CONCURRENCY', 32)),
+    'QUEUE_TIMEOUT': float(os.getenv('ASYNC_POOL_QUEUE_TIMEOUT', 1)),
+}
+
+# Сколько раз проводить перевод при deadlock или ошибке сериализации в базе
+# и базовая пауза между попытками в секундах
+WALLET_TRANSFER_RETRY_ATTEMPTS = int(os.getenv('WALLET_TRANSFER_RETRY_ATTEMPTS', 3))
+WALLET_TRANSFER_RETRY_BACKOFF = float(os.getenv('WALLET_TRANSFER_RETRY_BACKOFF', 0.01))
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -0,0 +1,100 @@
+"""
+Потоковые ответы под ASGI.
+
+Джанго 3.2 перебирает StreamingHttpResponse прямо в событийном цикле, поэтому генератор,
+читающий базу (выписка по кошельку), падает с SynchronousOnlyOperation, а любой другой
+блокирующий генератор останавливает цикл. StreamingASGIHandler забирает куски потокового
+ответа в отдельном потоке на ответ: все куски читаются в одном потоке, поэтому курсор
+и транзакция генератора остаются на одном соединении с базой, и оно не делится с
+другими запросами, как общий поток синхронного кода. В конце ответа соединение потока
+закрывается.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    AsyncIterator,
+    List,
+    Tuple,
+)
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import (
+    close_old_connections,
+    connections,
+)
+from django.http import StreamingHttpResponse
+
+
+def _close_response(response: StreamingHttpResponse):
+    """Закрытие генератора ответа и соединений потока, в котором он читался."""
+    try:
+        response.close()
+    finally:
+        connections.close_all()
+
+
+async def iterate_in_thread(response: StreamingHttpResponse) -> AsyncIterator[bytes]:
+    """
+    Куски потокового ответа, прочитанные в отдельном потоке.
+
+    :param response: потоковый ответ
+    :return: куски ответа
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='streaming')
+    try:
+        parts = await loop.run_in_executor(executor, iter, response)
+        while True:
+            part = await loop.run_in_executor(executor, next, parts, None)
+            if part is None:
+                break
+            yield part
+    finally:
+        await loop.run_in_executor(executor, _close_response, response)
+        executor.shutdown(wait=False)
+
+
+def _get_headers(response: StreamingHttpResponse) -> List[Tuple[bytes, bytes]]:
+    """Заголовки и cookie ответа, как их собирает ASGIHandler."""
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGI обработчик, читающий потоковые ответы вне событийного цикла."""
+
+    async def send_response(self, response, send):
+        """Отправка ответа, потоковый ответ читается в отдельном потоке."""
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': _get_headers(response),
+        })
+        parts = iterate_in_thread(response)
+        try:
+            async for part in parts:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+        finally:
+            # генератор закрывается и при обрыве соединения клиентом
+            await parts.aclose()
+        await send({'type': 'http.response.body'})
+        # как после response.close в ASGIHandler: закрываем устаревшие соединения общего потока
+        await sync_to_async(close_old_connections, thread_sensitive=True)()
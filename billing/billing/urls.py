@@ -26,6 +26,16 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 
+from billing.views import (
+    RedisPoolStatsView,
+    metrics_view,
+)
+from users.views import ProvisionUsersView
+from wallet.views import (
+    BalanceCacheStatsView,
+    HotWalletsView,
+)
+
 
 version = 'v0.1'
 
@@ -46,6 +56,11 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('wallet/', include('wallet.urls')),
     path('admin/', admin.site.urls),
+    path('internal/redis-pool/', RedisPoolStatsView.as_view()),
+    path('internal/balance-cache/', BalanceCacheStatsView.as_view()),
+    path('internal/hot-wallets/', HotWalletsView.as_view()),
+    path('internal/provision-users/', ProvisionUsersView.as_view()),
+    path('metrics', metrics_view),
 ]
 
 # Для дебага подключаем сваггер
@@ -0,0 +1,36 @@
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    generate_latest,
+)
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from billing.metrics import get_registry
+from billing.redis_pool import get_pool_stats
+
+
+class RedisPoolStatsView(APIView):
+    """
+    Статистика пула соединений с редисом.
+
+    Пул у каждого воркера свой, поэтому ответ относится к воркеру, обработавшему запрос
+    (его pid есть в ответе). Нужна для подбора REDIS_MAX_CONNECTIONS.
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):  # noqa: U100
+        """Статистика пула текущего процесса."""
+        return Response(get_pool_stats())
+
+
+def metrics_view(request):  # noqa: U100
+    """
+    Метрики для Prometheus в текстовом формате.
+
+    Под gunicorn метрики суммируются по всем воркерам. Снаружи недоступна: nginx
+    не проксирует /metrics, Prometheus ходит в сервис напрямую.
+    """
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
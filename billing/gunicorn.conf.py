@@ -0,0 +1,28 @@
+"""
+Настройки gunicorn, загружаются из рабочего каталога (/opt/project).
+
+Каждый воркер пишет метрики Prometheus в файлы каталога PROMETHEUS_MULTIPROC_DIR,
+/metrics суммирует их по всем воркерам (billing.metrics.get_registry).
+"""
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):  # noqa: U100
+    """Очистка метрик прошлого запуска мастера."""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):  # noqa: U100
+    """
+    Завершение воркера (--max-requests перезапускает воркеры).
+
+    Гистограммы воркера остаются в сумме, чтобы счётчики не уменьшались.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
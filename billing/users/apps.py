@@ -1,4 +1,8 @@
 from django.apps import AppConfig
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+)
 
 
 class UsersConfig(AppConfig):
@@ -6,3 +10,16 @@ class UsersConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        """Сброс кэша пользователей для авторизации при их изменении и деактивации."""
+        from users.signals import users_deactivated
+        from users.user_cache import (
+            invalidate_deactivated_users,
+            invalidate_user_on_change,
+        )
+
+        user_model = self.get_model('User')
+        post_save.connect(invalidate_user_on_change, sender=user_model)
+        post_delete.connect(invalidate_user_on_change, sender=user_model)
+        users_deactivated.connect(invalidate_deactivated_users, sender=user_model)
@@ -0,0 +1,7 @@
+# форматы файла для массового создания пользователей
+PROVISION_FORMAT_CSV = 'csv'
+PROVISION_FORMAT_NDJSON = 'ndjson'
+PROVISION_FORMATS = (
+    PROVISION_FORMAT_CSV,
+    PROVISION_FORMAT_NDJSON,
+)
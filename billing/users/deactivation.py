@@ -0,0 +1,136 @@
+"""
+Массовая деактивация пользователей (мягкое удаление) с заморозкой их кошельков.
+
+Пользователи обрабатываются пачками по id: в транзакции пачки строки кошельков
+блокируются в порядке id (как при переводах), затем слоты шардированных кошельков.
+Пользователи, у которых на каком-либо кошельке (со слотами) ненулевой баланс,
+не деактивируются. У остальных кошельки замораживаются (Wallet.is_frozen), а сами
+пользователи деактивируются - по одному UPDATE на пачку для кошельков и пользователей.
+После коммита пачки отправляется один сигнал users_deactivated со всеми её id, по нему
+пользователи удаляются из кэша авторизации.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from logging import getLogger
+from typing import (
+    Dict,
+    List,
+    Set,
+)
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from users.models import User
+from users.signals import users_deactivated
+from wallet.models import (
+    Wallet,
+    WalletBalanceSlot,
+)
+
+
+logger = getLogger(__name__)
+
+
+def _get_funded_users(user_ids: List[int]) -> Set[int]:
+    """
+    Пользователи с ненулевым балансом хотя бы на одном кошельке.
+
+    Блокирует строки кошельков и слотов до конца транзакции, чтобы баланс
+    не изменился до заморозки.
+    """
+    balances: Dict = defaultdict(Decimal)
+    wallet_users = {}
+    sharded = []
+    for wallet_id, user_id, balance, slot_count in Wallet.objects.select_for_update().filter(
+        user_id__in=user_ids,
+    ).order_by(
+        'pk',
+    ).values_list(
+        'pk',
+        'user_id',
+        'balance',
+        'slot_count',
+    ):
+        wallet_users[wallet_id] = user_id
+        balances[wallet_id] += balance
+        if slot_count:
+            sharded.append(wallet_id)
+
+    if sharded:
+        for wallet_id, balance in WalletBalanceSlot.objects.select_for_update().filter(
+            wallet_id__in=sharded,
+        ).order_by(
+            'wallet_id',
+            'slot',
+        ).values_list(
+            'wallet_id',
+            'balance',
+        ):
+            balances[wallet_id] += balance
+
+    return {wallet_users[wallet_id] for wallet_id, balance in balances.items() if balance}
+
+
+def _deactivate_batch(user_ids: List[int]) -> Set[int]:
+    """
+    Деактивация пачки пользователей одной транзакцией.
+
+    :return: id пользователей, не деактивированных из-за ненулевого баланса
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        refused = _get_funded_users(user_ids)
+        deactivated = [user_id for user_id in user_ids if user_id not in refused]
+        if deactivated:
+            Wallet.objects.filter(
+                user_id__in=deactivated,
+            ).update(
+                is_frozen=True,
+                updated_at=now,
+            )
+            User.objects.filter(
+                pk__in=deactivated,
+            ).update(
+                is_active=False,
+                updated_at=now,
+            )
+            transaction.on_commit(
+                lambda: users_deactivated.send(sender=User, user_ids=deactivated),
+            )
+
+    logger.info(
+        'Deactivated %s users, refused %s with non-zero balance',
+        len(deactivated),
+        len(refused),
+        extra={'user_ids': deactivated, 'refused_user_ids': sorted(refused)},
+    )
+    return refused
+
+
+def deactivate_users(queryset: QuerySet, batch_size: int = 0) -> Dict:
+    """
+    Деактивация активных пользователей выборки пачками.
+
+    :param queryset: пользователи
+    :param batch_size: пользователей в пачке, по умолчанию USER_DEACTIVATION_BATCH_SIZE
+    :return: deactivated - число деактивированных пользователей, refused - id пользователей,
+             не деактивированных из-за ненулевого баланса, batches - число пачек
+    """
+    batch_size = batch_size or settings.USER_DEACTIVATION_BATCH_SIZE
+    queryset = queryset.filter(is_active=True).order_by('pk')
+    result = {'deactivated': 0, 'refused': [], 'batches': 0}
+    last_id = 0
+    while True:
+        # пачки по возрастанию id: следующая начинается после последнего id предыдущей
+        user_ids = list(queryset.filter(pk__gt=last_id).values_list('pk', flat=True)[:batch_size])
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+        refused = _deactivate_batch(user_ids)
+        result['deactivated'] += len(user_ids) - len(refused)
+        result['refused'].extend(sorted(refused))
+        result['batches'] += 1
+    return result
@@ -0,0 +1,72 @@
+import random
+import uuid
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import reset_queries
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Замер поиска пользователя по email при входе в зависимости от размера таблицы users.
+
+    Таблица наполняется временными пользователями до каждого размера из --sizes, на каждом
+    размере замеряется поиск get_by_natural_key (LOWER(email) по индексу) и, для сравнения,
+    прежний email__iexact (UPPER(email), полный просмотр таблицы). После замера временные
+    пользователи удаляются. Если время get_by_natural_key не растёт с размером, вход
+    читает индекс.
+    """
+
+    help = 'Measure login user lookup time as the users table grows'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры замера."""
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='comma separated numbers of benchmark users',
+        )
+        parser.add_argument('--lookups', type=int, default=200, help='lookups per size')
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Запуск замера."""
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        prefix = f'benchmark-{uuid.uuid4().hex}-'
+        created = 0
+        try:
+            for size in sizes:
+                created = self._create_users(prefix=prefix, start=created, stop=size)
+                emails = [
+                    f'{prefix}{random.randrange(created)}@Example.com'.upper()  # noqa: S311
+                    for _ in range(options['lookups'])
+                ]
+                lookup = self._measure(emails, User.objects.get_by_natural_key)
+                iexact = self._measure(emails, lambda email: User.objects.get(email__iexact=email))
+                self.stdout.write(
+                    f'{created} users: lower(email) {lookup:.3f} ms, iexact {iexact:.3f} ms',
+                )
+        finally:
+            # UserQuerySet.delete только деактивирует пользователей
+            User.objects.filter(email__startswith=prefix)._raw_delete(User.objects.db)
+
+    def _create_users(self, prefix: str, start: int, stop: int) -> int:
+        """Пользователи с номерами [start, stop) пачками, без хэширования паролей."""
+        batch_size = 5000
+        for offset in range(start, stop, batch_size):
+            User.objects.bulk_create([
+                User(email=f'{prefix}{number}@example.com', password='!')
+                for number in range(offset, min(offset + batch_size, stop))
+            ])
+            # при DEBUG запросы копятся в connection.queries
+            reset_queries()
+        return max(start, stop)
+
+    def _measure(self, emails, lookup) -> float:
+        """Среднее время поиска, миллисекунды."""
+        started_at = perf_counter()
+        for email in emails:
+            lookup(email)
+        reset_queries()
+        return (perf_counter() - started_at) * 1000 / len(emails)
@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from users.constants import PROVISION_FORMATS
+from users.provisioning import (
+    get_input_format,
+    provision_users,
+    read_records,
+)
+
+
+class Command(BaseCommand):
+    """
+    Массовое создание пользователей с кошельками из CSV или NDJSON.
+
+    После каждой пачки прогресс сохраняется в файл контрольной точки, повторный запуск
+    с тем же файлом продолжает с первой необработанной записи.
+    """
+
+    help = 'Create users and their wallets in bulk from a CSV or NDJSON file'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры загрузки."""
+        parser.add_argument('path', help='file with email, password, first_name, last_name')
+        parser.add_argument(
+            '--input-format',
+            choices=PROVISION_FORMATS,
+            help='file format, by default inferred from the extension',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.USER_PROVISION_WORKERS,
+            help='password hashing processes',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.USER_PROVISION_CHUNK_SIZE,
+            help='users per database transaction',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='progress file to resume from, <path>.checkpoint by default',
+        )
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Создание пользователей из файла."""
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be positive')
+        path = options['path']
+        input_format = options['input_format'] or get_input_format(path)
+
+        def report(progress):
+            self.stdout.write(
+                f'{progress["records"]} records: '
+                f'{progress["created"]} created, {progress["skipped"]} skipped',
+            )
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                result = provision_users(
+                    read_records(stream, input_format),
+                    chunk_size=options['chunk_size'],
+                    workers=options['workers'],
+                    checkpoint=options['checkpoint'] or f'{path}.checkpoint',
+                    on_chunk=report,
+                )
+        except OSError as error:
+            raise CommandError(str(error))
+        except ValueError as error:
+            raise CommandError(f'invalid input: {error}')
+
+        self.stdout.write(
+            f'{result["created"]} users created, {result["skipped"]} skipped '
+            f'in {result["elapsed"]:.1f} s ({result["users_per_second"]:.0f} users/s)',
+        )
@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 18:12
+"""
+Индекс по LOWER(email) для входа и проверки уникальности email без учёта регистра.
+
+Индекс строится с CONCURRENTLY: таблица users не блокируется на запись, поэтому
+миграцию можно запускать на большой таблице без окна обслуживания. CONCURRENTLY
+не работает внутри транзакции, поэтому миграция не атомарная.
+"""
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='user',
+            index=models.Index(
+                django.db.models.functions.text.Lower('email'),
+                name='users_email_lower_idx',
+            ),
+        ),
+    ]
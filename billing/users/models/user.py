@@ -1,6 +1,9 @@
 from logging import getLogger
 # Django import
-from typing import Optional
+from typing import (
+    Dict,
+    Optional,
+)
 
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -9,6 +12,7 @@ from django.contrib.auth.models import (
 )
 from django.core.mail import send_mail
 from django.db import models
+from django.db.models.functions import Lower
 
 
 logger = getLogger(__name__)
@@ -17,10 +21,33 @@ logger = getLogger(__name__)
 class UserQuerySet(models.query.QuerySet):
     """Переопределение QuerySet для модели User."""
 
+    def with_email_lower(self) -> 'UserQuerySet':
+        """
+        Выборка с полем email_lower для поиска по email без учёта регистра.
+
+        Условие на email_lower даёт LOWER("email") = ..., что читается по индексу
+        users_email_lower_idx (iexact даёт UPPER и индекс не использует).
+        """
+        return self.alias(email_lower=Lower('email'))
+
+    def deactivate(self, batch_size: int = 0) -> Dict:
+        """
+        Деактивация пользователей выборки с заморозкой их кошельков пачками UPDATE.
+
+        Пользователи с ненулевым балансом не деактивируются (см. users/deactivation.py).
+
+        :param batch_size: пользователей в пачке, по умолчанию USER_DEACTIVATION_BATCH_SIZE
+        :return: deactivated - число деактивированных, refused - id пользователей
+                 с ненулевым балансом, batches - число пачек
+        """
+        # wallet.models импортирует users.models
+        from users.deactivation import deactivate_users
+
+        return deactivate_users(self, batch_size=batch_size)
+
     def delete(self):
-        """Вместо удаления вызываем метод для мягкой очистки базы."""
-        for user in self:
-            user.delete()
+        """Вместо удаления деактивируем пользователей (мягкая очистка базы)."""
+        return self.deactivate()
 
 
 class UserManager(BaseUserManager.from_queryset(UserQuerySet)):  # type: ignore  # noqa: Z454
@@ -28,10 +55,10 @@ class UserManager(BaseUserManager.from_queryset(UserQuerySet)):  # type: ignore
 
     def get_by_natural_key(self, username):
         """Для получения пользователя по полю USERNAME_FIELD модели."""
-        # Запрос не должен учитывать регистр
-        case_insensitive_username_field = f'{self.model.USERNAME_FIELD}__iexact'
-        user = self.filter(
-            **{case_insensitive_username_field: username},
+        # Запрос не должен учитывать регистр: iexact (UPPER(email)) не попадает в индексы,
+        # поэтому сравниваем по lower, для которого есть индекс
+        user = self.with_email_lower().filter(
+            email_lower=username.lower(),
         ).first()
         if not user:
             raise User.DoesNotExist
@@ -104,6 +131,10 @@ class User(AbstractBaseUser, PermissionsMixin):  # type: ignore
     class Meta:
         db_table = 'users'
         ordering = ('-created_at',)
+        indexes = (
+            # поиск без учёта регистра при входе и регистрации
+            models.Index(Lower('email'), name='users_email_lower_idx'),
+        )
         verbose_name = 'User'
         verbose_name_plural = 'Users'
 
@@ -0,0 +1,195 @@
+"""
+Хэширование и проверка паролей входа и регистрации в отдельном пуле процессов.
+
+PBKDF2 занимает процессор на десятки миллисекунд, и при всплеске входов воркеры
+gunicorn заняты только им, а переводы ждут в очереди. С PASSWORD_POOL['ENABLED']
+хэширование идёт в пуле из PASSWORD_POOL['WORKERS'] процессов на воркер с пониженным
+приоритетом (PASSWORD_POOL['NICE']), поэтому процессор в первую очередь получают воркеры.
+Одновременно во всём сервисе хэшируется не больше PASSWORD_POOL['MAX_PENDING'] паролей
+(счётчик в редисе, общий для всех воркеров): запрос сверх лимита сразу получает 503
+с Retry-After и не занимает воркер. Если редис недоступен, лимит не проверяется.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from logging import getLogger
+from time import time as current_time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    Optional,
+)
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.crypto import get_random_string
+from redis import RedisError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from billing.redis_pool import get_redis_client
+from users.models import User
+
+
+logger = getLogger(__name__)
+
+# сортированное множество хэширований в работе: токен -> время начала
+SLOTS_KEY = 'password_pool_slots'
+
+# убираем зависшие записи (воркер упал, не освободив место) и занимаем место, если оно есть
+acquire_script = """
+    redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[1])
+    if redis.call('zcard', KEYS[1]) >= tonumber(ARGV[2]) then
+        return 0
+    end
+    redis.call('zadd', KEYS[1], ARGV[3], ARGV[4])
+    return 1
+"""
+
+
+class PasswordPoolBusy(APIException):
+    """Во всём сервисе уже хэшируется PASSWORD_POOL['MAX_PENDING'] паролей."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins in progress, retry later.'
+    default_code = 'password_pool_busy'
+    # обработчик исключений DRF отдаёт его в заголовке Retry-After
+    wait = 1
+
+
+# пул по pid процесса: после fork у воркера будет свой пул, а не копия пула мастера
+_executors: Dict[int, ProcessPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _lower_priority(nice: int):
+    """Понижение приоритета процесса пула относительно воркеров."""
+    os.nice(nice)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Пул процессов текущего процесса, создаётся при первом обращении."""
+    pid = os.getpid()
+    executor = _executors.get(pid)
+    if executor is not None:
+        return executor
+
+    with _executors_lock:
+        if pid not in _executors:
+            _executors.clear()
+            # процессы пула только хэшируют и не трогают унаследованные соединения
+            _executors[pid] = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_POOL['WORKERS'],
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_lower_priority,
+                initargs=(settings.PASSWORD_POOL['NICE'],),
+            )
+        return _executors[pid]
+
+
+@contextmanager
+def _slot() -> Iterator[None]:
+    """
+    Место в общем лимите хэширований.
+
+    :raises PasswordPoolBusy: свободного места нет
+    """
+    redis_client = get_redis_client()
+    token = get_random_string(16)
+    now = current_time()
+    try:
+        acquired = redis_client.register_script(acquire_script)(
+            keys=[SLOTS_KEY],
+            args=[
+                now - settings.PASSWORD_POOL['STALE_AFTER'],
+                settings.PASSWORD_POOL['MAX_PENDING'],
+                now,
+                token,
+            ],
+        )
+    except RedisError:
+        logger.warning('Password pool limit is unavailable', exc_info=True)
+        redis_client = None
+        acquired = True
+    if not acquired:
+        raise PasswordPoolBusy()
+
+    try:
+        yield
+    finally:
+        if redis_client is not None:
+            try:
+                redis_client.zrem(SLOTS_KEY, token)
+            except RedisError:
+                # место освободится само через STALE_AFTER секунд
+                logger.warning('Failed to release password pool slot', exc_info=True)
+
+
+def _run(func: Callable, *args) -> Any:
+    """Вызов функции хэширования в пуле, если он включён, иначе в текущем процессе."""
+    if not settings.PASSWORD_POOL['ENABLED']:
+        return func(*args)
+
+    with _slot():
+        try:
+            return get_executor().submit(func, *args).result()
+        except BrokenProcessPool:
+            # процесс пула убит, следующий вызов создаст новый пул
+            _executors.pop(os.getpid(), None)
+            raise
+
+
+def make_password(password: Optional[str]) -> str:
+    """
+    Хэш пароля для сохранения в пользователе.
+
+    :raises PasswordPoolBusy: лимит хэширований исчерпан
+    """
+    return _run(hashers.make_password, password)
+
+
+def check_password(password: str, encoded: str) -> bool:
+    """
+    Проверка пароля по хэшу.
+
+    :raises PasswordPoolBusy: лимит хэширований исчерпан
+    """
+    return _run(hashers.check_password, password, encoded)
+
+
+def _must_update(encoded: str) -> bool:
+    """Хэш сделан не основным алгоритмом или с устаревшими параметрами (как в check_password)."""
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def authenticate_user(email: str, password: str) -> Optional[User]:
+    """
+    Пользователь по email и паролю, как ModelBackend.authenticate, но с хэшированием в пуле.
+
+    :return: активный пользователь или None, если email или пароль неверные
+    :raises PasswordPoolBusy: лимит хэширований исчерпан
+    """
+    try:
+        user = User.objects.get_by_natural_key(email)
+    except User.DoesNotExist:
+        # хэшируем и для несуществующего пользователя, чтобы по времени ответа
+        # нельзя было узнать, есть ли он
+        make_password(password)
+        return None
+
+    if not check_password(password, user.password) or not user.is_active:
+        return None
+    if _must_update(user.password):
+        user.password = make_password(password)
+        user.save(update_fields=['password'])
+    return user
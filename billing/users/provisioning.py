@@ -0,0 +1,246 @@
+"""
+Массовое создание пользователей с кошельками (онбординг пользователей партнёра).
+
+Пользователи читаются потоком из CSV или NDJSON (поля email, password, first_name,
+last_name) и создаются пачками по chunk_size: пароли пачки хэшируются в пуле процессов
+(PBKDF2 занимает процессор, а не ждёт базу), затем пользователи и их кошельки
+записываются двумя bulk_create в одной транзакции. Пользователи с уже занятым email
+(в том числе занятым регистрацией во время создания пачки) и записи без корректного
+email пропускаются, поэтому повторный запуск на тех же данных ничего не дублирует.
+После коммита каждой пачки число прочитанных записей можно сохранить в файл
+контрольной точки и продолжить с него после падения.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from time import perf_counter
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TextIO,
+)
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import (
+    IntegrityError,
+    transaction,
+)
+from django.db.models.functions import Lower
+
+from users.constants import (
+    PROVISION_FORMAT_CSV,
+    PROVISION_FORMAT_NDJSON,
+)
+from users.models import User
+from wallet.models import Wallet
+
+
+def get_input_format(file_name: str) -> str:
+    """Формат файла по расширению: .ndjson и .jsonl - NDJSON, остальные - CSV."""
+    if os.path.splitext(file_name.lower())[1] in ('.ndjson', '.jsonl'):
+        return PROVISION_FORMAT_NDJSON
+    return PROVISION_FORMAT_CSV
+
+
+def read_records(stream: TextIO, input_format: str) -> Iterator[Dict]:
+    """
+    Записи пользователей из текстового потока без чтения всего файла в память.
+
+    :param stream: CSV с заголовком или NDJSON (объект на строку)
+    :param input_format: PROVISION_FORMAT_CSV или PROVISION_FORMAT_NDJSON
+    :return: записи по одной
+    """
+    if input_format == PROVISION_FORMAT_NDJSON:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+        return
+    yield from csv.DictReader(stream)
+
+
+def _chunks(records: Iterable[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _clean(record: Dict) -> Optional[Dict]:
+    """Запись с email в нижнем регистре (как в create_user) или None, если email некорректный."""
+    email = User.objects.normalize_email((record.get('email') or '').strip().lower())
+    try:
+        validate_email(email)
+    except ValidationError:
+        return None
+    return {
+        'email': email,
+        'password': record.get('password') or None,
+        'first_name': record.get('first_name') or None,
+        'last_name': record.get('last_name') or None,
+    }
+
+
+@contextmanager
+def hashing_pool(workers: int) -> Iterator[Callable[[List[Optional[str]]], List[str]]]:
+    """
+    Хэширование паролей в пуле из workers процессов.
+
+    :param workers: число процессов, 1 - хэширование в текущем процессе
+    :return: функция, хэширующая список паролей (None - пароль, по которому нельзя войти)
+    """
+    if workers <= 1:
+        yield lambda passwords: [make_password(password) for password in passwords]
+        return
+
+    # дочерние процессы только хэшируют и не трогают унаследованное соединение с базой,
+    # а завершаются через os._exit, не закрывая его, поэтому соединение родителя
+    # (и транзакция, в которой он может быть) остаётся рабочим
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('fork'),
+    ) as executor:
+        yield lambda passwords: list(
+            executor.map(
+                make_password,
+                passwords,
+                chunksize=max(len(passwords) // (workers * 4), 1),
+            ),
+        )
+
+
+def _get_existing_emails(emails: Iterable[str]) -> Set[str]:
+    """Уже занятые email из списка (в нижнем регистре)."""
+    # старые пользователи могли быть сохранены с email не в нижнем регистре
+    return set(
+        User.objects.with_email_lower().filter(
+            email_lower__in=emails,
+        ).values_list(
+            Lower('email'),
+            flat=True,
+        ),
+    )
+
+
+def _create_chunk(records: List[Dict], hash_passwords: Callable) -> int:
+    """
+    Создание пользователей пачки и их кошельков одной транзакцией.
+
+    Если email занят между проверкой и вставкой (например, регистрацией), пачка
+    откатывается, занятые email убираются из неё, и она вставляется повторно.
+
+    :return: число созданных пользователей
+    :raises IntegrityError: вставка не прошла не из-за занятого email
+    """
+    unique = {}
+    for record in filter(None, map(_clean, records)):
+        unique.setdefault(record['email'], record)
+    existing = _get_existing_emails(unique.keys())
+    new_records = [record for email, record in unique.items() if email not in existing]
+    if not new_records:
+        return 0
+
+    passwords = dict(zip(
+        [record['email'] for record in new_records],
+        hash_passwords([record['password'] for record in new_records]),
+    ))
+    while new_records:
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        email=record['email'],
+                        password=passwords[record['email']],
+                        first_name=record['first_name'],
+                        last_name=record['last_name'],
+                    )
+                    for record in new_records
+                ])
+                Wallet.objects.bulk_create([Wallet(user=user) for user in users])
+        except IntegrityError:
+            existing = _get_existing_emails(passwords.keys())
+            remaining = [record for record in new_records if record['email'] not in existing]
+            # каждый повтор короче предыдущего, иначе ошибка не из-за занятого email
+            if len(remaining) == len(new_records):
+                raise
+            new_records = remaining
+        else:
+            return len(users)
+    return 0
+
+
+def read_checkpoint(path: Optional[str]) -> int:
+    """Число записей, обработанных предыдущим запуском (0 - контрольной точки нет)."""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path) as checkpoint:
+        return json.load(checkpoint)['records']
+
+
+def write_checkpoint(path: str, progress: Dict):
+    """Атомарная запись контрольной точки: при падении остаётся предыдущая."""
+    with open(f'{path}.tmp', 'w') as checkpoint:
+        json.dump(progress, checkpoint)
+    os.replace(f'{path}.tmp', path)
+
+
+def provision_users(records: Iterable[Dict],
+                    chunk_size: int = 1000,
+                    workers: int = 1,
+                    checkpoint: Optional[str] = None,
+                    on_chunk: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Создание пользователей с кошельками пачками.
+
+    :param records: записи пользователей (см. read_records)
+    :param chunk_size: записей в пачке (одна транзакция базы)
+    :param workers: процессов для хэширования паролей
+    :param checkpoint: файл контрольной точки: записи, обработанные прошлым запуском,
+                       пропускаются, после каждой пачки сохраняется прогресс
+    :param on_chunk: вызывается с прогрессом после каждой пачки
+    :return: records - прочитано записей (с учётом пропущенных по контрольной точке),
+             created - создано пользователей, skipped - пропущено (email занят или
+             некорректный), elapsed - секунды, users_per_second - созданных в секунду
+    """
+    progress = {'records': read_checkpoint(checkpoint), 'created': 0, 'skipped': 0}
+    records = iter(records)
+    for _ in range(progress['records']):
+        next(records, None)
+
+    started_at = perf_counter()
+    with hashing_pool(workers) as hash_passwords:
+        for chunk in _chunks(records, chunk_size):
+            created = _create_chunk(chunk, hash_passwords=hash_passwords)
+            progress['records'] += len(chunk)
+            progress['created'] += created
+            progress['skipped'] += len(chunk) - created
+            if checkpoint:
+                write_checkpoint(checkpoint, progress)
+            if on_chunk is not None:
+                on_chunk(progress)
+
+    elapsed = perf_counter() - started_at
+    return {
+        **progress,
+        'elapsed': round(elapsed, 3),
+        'users_per_second': round(progress['created'] / elapsed, 1) if elapsed else 0,
+    }
+
+
+def open_text(binary: io.BufferedIOBase) -> TextIO:
+    """Текстовый поток поверх загруженного файла (utf-8, BOM из Excel убирается)."""
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
@@ -1,8 +1,10 @@
 from users.serializers.login import UserTokenObtainPairSerializer
+from users.serializers.provision import ProvisionUsersSerializer
 from users.serializers.register import RegisterSerializer
 
 
 __all__ = [
+    'ProvisionUsersSerializer',
     'RegisterSerializer',
     'UserTokenObtainPairSerializer',
 ]
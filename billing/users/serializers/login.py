@@ -1,5 +1,40 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from rest_framework import exceptions
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    login_rule,
+    user_eligible_for_login,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from users.password_pool import authenticate_user
 
 
 class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Сериализатор для получения токена пользователя."""
+
+    def validate(self, attrs):
+        """
+        Проверка email и пароля и выдача пары токенов.
+
+        С PASSWORD_POOL['ENABLED'] пароль проверяется в пуле процессов (users/password_pool.py),
+        иначе - стандартным authenticate в воркере.
+        """
+        if not settings.PASSWORD_POOL['ENABLED']:
+            return super().validate(attrs)
+
+        self.user = authenticate_user(attrs[self.username_field], attrs['password'])
+        if not getattr(login_rule, user_eligible_for_login)(self.user):
+            raise exceptions.AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account',
+            )
+
+        refresh = self.get_token(self.user)
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, self.user)
+        return {
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
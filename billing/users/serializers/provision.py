@@ -0,0 +1,10 @@
+from rest_framework import serializers
+
+from users.constants import PROVISION_FORMATS
+
+
+class ProvisionUsersSerializer(serializers.Serializer):
+    """Файл для массового создания пользователей и его формат (по умолчанию по расширению)."""
+
+    file = serializers.FileField()  # noqa: VNE002
+    input_format = serializers.ChoiceField(choices=PROVISION_FORMATS, required=False)
@@ -1,18 +1,24 @@
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
 from rest_framework import serializers
-from rest_framework.validators import UniqueValidator
 
 from users.models import User
+from users.password_pool import make_password
 from wallet.models import Wallet
 
 
+class LowercaseEmailField(serializers.EmailField):
+    """Email в нижнем регистре, как в UserManager.create_user."""
+
+    def to_internal_value(self, data):
+        """Приведение email к нижнему регистру до проверки уникальности."""
+        return super().to_internal_value(data).lower()
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     """Сериализатор для создания нового пользователя."""
 
-    email = serializers.EmailField(
-        required=True,
-        validators=[UniqueValidator(queryset=User.objects.all())],
-    )
+    email = LowercaseEmailField(required=True)
 
     password = serializers.CharField(
         write_only=True,
@@ -32,6 +38,12 @@ class RegisterSerializer(serializers.ModelSerializer):
             'last_name': {'required': False},
         }
 
+    def validate_email(self, email):
+        """Email уникален без учёта регистра (LOWER(email) по индексу users_email_lower_idx)."""
+        if User.objects.with_email_lower().filter(email_lower=email).exists():
+            raise serializers.ValidationError('This field must be unique.', code='unique')
+        return email
+
     def validate(self, attrs):
         """Проверка параметров, например, паролей на совпадение."""
         if attrs['password'] != attrs['password2']:
@@ -43,18 +55,19 @@ class RegisterSerializer(serializers.ModelSerializer):
         """
         Создание пользователя.
 
-        Создаёт пользователя и кошелёк.
+        Создаёт пользователя и кошелёк одной транзакцией. Пароль хэшируется до неё
+        (в пуле процессов, если он включён), чтобы транзакция не держалась открытой
+        на время PBKDF2.
         """
-        user = User.objects.create(
-            email=validated_data['email'],
-            first_name=validated_data.get('first_name'),
-            last_name=validated_data.get('last_name'),
-        )
-
-        user.set_password(validated_data['password'])
-        user.save()
-
-        Wallet.objects.create(
-            user=user,
-        )
+        password = make_password(validated_data['password'])
+        with transaction.atomic():
+            user = User.objects.create(
+                email=validated_data['email'],
+                password=password,
+                first_name=validated_data.get('first_name'),
+                last_name=validated_data.get('last_name'),
+            )
+            Wallet.objects.create(
+                user=user,
+            )
         return user
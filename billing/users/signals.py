@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# пачка пользователей деактивирована (UserQuerySet.deactivate), отправляется после коммита
+# пачки одним сигналом на всю пачку: sender - модель User, user_ids - id деактивированных
+users_deactivated = Signal()
@@ -1,8 +1,16 @@
+from users.tests.deactivation import DeactivationTestCase
 from users.tests.login import LoginTestCase
+from users.tests.password_pool import PasswordPoolTestCase
+from users.tests.provision import ProvisionUsersTestCase
 from users.tests.register import RegisterTestCase
+from users.tests.user_cache import UserCacheTestCase
 
 
 __all__ = [
+    'DeactivationTestCase',
     'LoginTestCase',
+    'PasswordPoolTestCase',
+    'ProvisionUsersTestCase',
     'RegisterTestCase',
+    'UserCacheTestCase',
 ]
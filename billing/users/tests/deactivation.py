@@ -0,0 +1,130 @@
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import User
+from users.signals import users_deactivated
+from users.user_cache import local_cache
+from wallet.constants import TRANSFER_ENGINES
+from wallet.models import (
+    Wallet,
+    WalletBalanceSlot,
+)
+from wallet.transfer_engine import (
+    TransferError,
+    make_transfer,
+)
+
+
+class DeactivationTestCase(TestCase):
+    """Тесты на массовую деактивацию пользователей с заморозкой кошельков."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.users = [
+            User.objects.create_user(email=f'user{number}@test.test')
+            for number in range(5)
+        ]
+        self.wallets = [Wallet.objects.create(user=user) for user in self.users]
+
+    def tearDown(self):
+        """Очистка кэша в памяти процесса."""
+        local_cache.clear()
+
+    def _deactivate(self, queryset, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return queryset.deactivate(**kwargs)
+
+    def test_deactivate(self):
+        """Проверка деактивации пачками с одним сигналом на пачку."""
+        receiver = mock.Mock()
+        users_deactivated.connect(receiver, sender=User)
+        self.addCleanup(users_deactivated.disconnect, receiver, sender=User)
+
+        result = self._deactivate(User.objects.filter(email__startswith='user'), batch_size=2)
+
+        self.assertEqual(result, {'deactivated': 5, 'refused': [], 'batches': 3})
+        self.assertFalse(User.objects.filter(email__startswith='user', is_active=True).exists())
+        self.assertEqual(Wallet.objects.filter(is_frozen=True).count(), 5)
+        self.assertEqual(receiver.call_count, 3)
+        self.assertEqual(
+            sorted(user_id for call in receiver.call_args_list for user_id in call[1]['user_ids']),
+            sorted(user.pk for user in self.users),
+        )
+        # уже деактивированные пользователи не обрабатываются повторно
+        self.assertEqual(self._deactivate(User.objects.all())['deactivated'], 0)
+
+    def test_query_count(self):
+        """Проверка, что число запросов на пачку не зависит от числа пользователей."""
+        # выборка id, транзакция, кошельки, UPDATE кошельков и пользователей, пустая выборка id
+        with self.assertNumQueries(7):
+            self._deactivate(User.objects.filter(pk__in=[user.pk for user in self.users[:1]]))
+        with self.assertNumQueries(7):
+            self._deactivate(User.objects.filter(pk__in=[user.pk for user in self.users[1:]]))
+
+    def test_refused_balance(self):
+        """Проверка, что пользователи с ненулевым балансом не деактивируются."""
+        Wallet.objects.filter(pk=self.wallets[0].pk).update(balance=10)
+        Wallet.objects.filter(pk=self.wallets[1].pk).update(slot_count=2)
+        WalletBalanceSlot.objects.create(wallet=self.wallets[1], slot=1, balance=5)
+
+        result = self._deactivate(User.objects.filter(email__startswith='user'))
+
+        self.assertEqual(result['deactivated'], 3)
+        self.assertEqual(result['refused'], sorted([self.users[0].pk, self.users[1].pk]))
+        self.assertEqual(
+            set(Wallet.objects.filter(is_frozen=False).values_list('pk', flat=True)),
+            {self.wallets[0].pk, self.wallets[1].pk},
+        )
+        self.assertTrue(User.objects.get(pk=self.users[0].pk).is_active)
+
+    def test_delete(self):
+        """Проверка, что удаление выборки пользователей деактивирует их."""
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.users[0].pk).delete()
+        self.assertFalse(User.objects.get(pk=self.users[0].pk).is_active)
+
+    def test_cached_user(self):
+        """Проверка, что деактивированный пользователь не проходит авторизацию из кэша."""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.users[0])}')
+        path = f'/wallet/{self.wallets[0].pk}/balance/'
+        self.assertEqual(client.get(path).status_code, status.HTTP_200_OK)
+
+        self._deactivate(User.objects.filter(pk=self.users[0].pk))
+        self.assertEqual(client.get(path).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_frozen_wallet(self):
+        """Проверка, что с замороженным кошельком нельзя переводить и пополнять."""
+        sender = Wallet.objects.create(user=self.users[4], balance=10)
+        self._deactivate(User.objects.filter(pk__in=[self.users[0].pk, self.users[1].pk]))
+
+        for engine in TRANSFER_ENGINES:
+            with self.assertRaisesMessage(TransferError, 'payee wallet is frozen'):
+                make_transfer(
+                    user_id=self.users[4].pk,
+                    sender_id=sender.pk,
+                    payee_id=self.wallets[0].pk,
+                    amount=1,
+                    engine=engine,
+                )
+            with self.assertRaisesMessage(TransferError, 'wallet is frozen'):
+                make_transfer(
+                    user_id=self.users[1].pk,
+                    sender_id=self.wallets[1].pk,
+                    payee_id=sender.pk,
+                    amount=0,
+                    engine=engine,
+                )
+
+        client = APIClient()
+        client.force_authenticate(self.users[4])
+        response = client.post(
+            path='/wallet/deposit/',
+            data={'payee': str(self.wallets[0].pk), 'amount': 1},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('payee', response.json())
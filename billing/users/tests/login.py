@@ -1,7 +1,9 @@
+from django.db import connection
 from django.test import (
     Client,
     TestCase,
 )
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 
 from users.models import User
@@ -59,6 +61,29 @@ class LoginTestCase(TestCase):
         self.assertIn('refresh', response.json())
         self.assertIn('access', response.json())
 
+    def test_email_case(self):
+        """Проверка входа с email в другом регистре."""
+        client = Client()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(
+                path='/auth/login/',
+                data={
+                    'email': test_email.upper(),
+                    'password': test_password,
+                },
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('LOWER("users"."email") = ', queries[0]['sql'])
+
+    def test_email_lookup_index(self):
+        """Проверка, что поиск пользователя при входе может читать индекс по LOWER(email)."""
+        query = User.objects.with_email_lower().filter(email_lower=test_email)
+        with connection.cursor() as cursor:
+            # на маленькой таблице планировщик и так выбрал бы полный просмотр
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = query.explain()
+        self.assertIn('users_email_lower_idx', plan)
+
     def test_refresh_token(self):
         """
         Проверка обновление пары ключей.
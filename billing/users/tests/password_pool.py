@@ -0,0 +1,99 @@
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.test import (
+    Client,
+    TestCase,
+    override_settings,
+)
+from rest_framework import status
+
+from billing.redis_pool import get_redis_client
+from users import password_pool
+from users.models import User
+from wallet.tests.secure_transaction import get_unavailable_redis
+
+
+test_email = 'test@test.test'
+test_password = 'Secret!1'  # noqa: S105 для тестов можно
+
+
+def shutdown_executors():
+    """Остановка пулов, чтобы следующий тест создал пул со своими настройками."""
+    for executor in password_pool._executors.values():
+        executor.shutdown()
+    password_pool._executors.clear()
+
+
+@override_settings(
+    PASSWORD_POOL={'ENABLED': True, 'WORKERS': 1, 'MAX_PENDING': 2, 'NICE': 0, 'STALE_AFTER': 30},
+)
+class PasswordPoolTestCase(TestCase):
+    """Тесты на проверку паролей входа и регистрации в пуле процессов."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user = User.objects.create_user(email=test_email, password=test_password)
+        self.client = Client()
+        self.redis = get_redis_client()
+        self.redis.delete(password_pool.SLOTS_KEY)
+        self.addCleanup(self.redis.delete, password_pool.SLOTS_KEY)
+        self.addCleanup(shutdown_executors)
+
+    def _login(self, email: str = test_email, password: str = test_password):
+        return self.client.post(path='/auth/login/', data={'email': email, 'password': password})
+
+    def _fill_slots(self, started_at: float):
+        self.redis.zadd(password_pool.SLOTS_KEY, {'busy_1': started_at, 'busy_2': started_at})
+
+    def test_login(self):
+        """Проверка входа с проверкой пароля в пуле."""
+        response = self._login()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.json())
+        self.assertTrue(password_pool._executors)
+        # место в лимите освобождается
+        self.assertEqual(self.redis.zcard(password_pool.SLOTS_KEY), 0)
+
+        self.assertEqual(self._login(password='wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self._login(email='unknown@test.test')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self._login().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_busy(self):
+        """Проверка, что вход и регистрация сверх лимита сразу получают 503."""
+        self._fill_slots(started_at=password_pool.current_time())
+
+        response = self._login()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+        response = self.client.post(
+            path='/auth/register/',
+            data={'email': 'new@test.test', 'password': test_password, 'password2': test_password},
+        )
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(User.objects.filter(email='new@test.test').exists())
+
+    def test_stale_slots(self):
+        """Проверка, что места упавших воркеров освобождаются."""
+        self._fill_slots(started_at=password_pool.current_time() - 60)
+        self.assertEqual(self._login().status_code, status.HTTP_200_OK)
+
+    def test_rehash(self):
+        """Проверка, что хэш устаревшим алгоритмом заменяется при входе."""
+        User.objects.filter(pk=self.user.pk).update(
+            password=make_password(test_password, hasher='pbkdf2_sha1'),
+        )
+        self.assertEqual(self._login().status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+    def test_redis_unavailable(self):
+        """Проверка, что без редиса вход проходит без лимита."""
+        with mock.patch('users.password_pool.get_redis_client', get_unavailable_redis):
+            with self.assertLogs('users.password_pool', level='WARNING'):
+                self.assertEqual(self._login().status_code, status.HTTP_200_OK)
@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.constants import (
+    PROVISION_FORMAT_CSV,
+    PROVISION_FORMAT_NDJSON,
+)
+from users.models import User
+from users.provisioning import (
+    make_password,
+    provision_users,
+    read_records,
+)
+from wallet.models import Wallet
+
+
+def get_csv(count: int, start: int = 0) -> str:
+    """CSV с count пользователями."""
+    rows = [
+        f'User{number}@Test.Test,secret{number},Name{number},'
+        for number in range(start, start + count)
+    ]
+    return '\n'.join(['email,password,first_name,last_name', *rows]) + '\n'
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    USER_PROVISION_WORKERS=1,
+)
+class ProvisionUsersTestCase(TestCase):
+    """Тесты на массовое создание пользователей с кошельками."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Удаление временных файлов."""
+        self.directory.cleanup()
+
+    def _write(self, name: str, content: str) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as output:
+            output.write(content)
+        return path
+
+    def test_provision(self):
+        """Проверка создания пользователей с кошельками и паролями в пуле процессов."""
+        records = read_records(StringIO(get_csv(5)), PROVISION_FORMAT_CSV)
+        result = provision_users(records, chunk_size=2, workers=2)
+
+        self.assertEqual(result['created'], 5)
+        self.assertEqual(result['skipped'], 0)
+        user = User.objects.get(email='user3@test.test')
+        self.assertTrue(user.check_password('secret3'))
+        self.assertEqual(user.first_name, 'Name3')
+        self.assertIsNone(user.last_name)
+        self.assertEqual(Wallet.objects.filter(user__email__startswith='user').count(), 5)
+
+    def test_skipped(self):
+        """Проверка, что занятые, повторяющиеся и некорректные email пропускаются."""
+        User.objects.create_user(email='user0@test.test')
+        lines = [
+            {'email': 'USER0@test.test', 'password': 'secret'},
+            {'email': 'user1@test.test', 'password': 'secret'},
+            {'email': 'user1@TEST.test', 'password': 'other'},
+            {'email': 'not an email', 'password': 'secret'},
+            {'email': 'user2@test.test'},
+        ]
+        stream = StringIO('\n'.join(json.dumps(line) for line in lines) + '\n\n')
+        result = provision_users(read_records(stream, PROVISION_FORMAT_NDJSON))
+
+        self.assertEqual((result['records'], result['created'], result['skipped']), (5, 2, 3))
+        self.assertTrue(User.objects.get(email='user1@test.test').check_password('secret'))
+        # без пароля войти нельзя
+        self.assertFalse(User.objects.get(email='user2@test.test').has_usable_password())
+
+    def test_registered_during_chunk(self):
+        """Проверка, что email, занятый регистрацией во время создания пачки, пропускается."""
+        def register_while_hashing(password):
+            if not User.objects.filter(email='user1@test.test').exists():
+                User.objects.create_user(email='user1@test.test')
+            return make_password(password)
+
+        records = read_records(StringIO(get_csv(3)), PROVISION_FORMAT_CSV)
+        with mock.patch('users.provisioning.make_password', register_while_hashing):
+            result = provision_users(records)
+
+        self.assertEqual((result['records'], result['created'], result['skipped']), (3, 2, 1))
+        self.assertFalse(User.objects.get(email='user1@test.test').has_usable_password())
+        self.assertEqual(Wallet.objects.filter(user__email__startswith='user').count(), 2)
+
+    def test_command_resume(self):
+        """Проверка, что команда продолжает с контрольной точки."""
+        path = self._write('users.csv', get_csv(3))
+        with open(f'{path}.checkpoint', 'w') as checkpoint:
+            json.dump({'records': 2, 'created': 2, 'skipped': 0}, checkpoint)
+
+        out = StringIO()
+        call_command('provision_users', path, workers=1, chunk_size=2, stdout=out)
+        self.assertIn('1 users created', out.getvalue())
+        self.assertEqual(
+            list(User.objects.filter(email__startswith='user').values_list('email', flat=True)),
+            ['user2@test.test'],
+        )
+        with open(f'{path}.checkpoint') as checkpoint:
+            self.assertEqual(json.load(checkpoint)['records'], 3)
+
+    def test_endpoint(self):
+        """Проверка загрузки файла администратором."""
+        client = APIClient()
+        upload = SimpleUploadedFile('users.csv', get_csv(2).encode())
+        client.force_authenticate(User.objects.create_user(email='user@test.test'))
+        response = client.post('/internal/provision-users/', {'file': upload})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        client.force_authenticate(
+            User.objects.create_superuser(email='admin@test.test', password='secret'),
+        )
+        upload.seek(0)
+        response = client.post('/internal/provision-users/', {'file': upload})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['created'], 2)
+
+        upload = SimpleUploadedFile('users.txt', b'{"email": ')
+        response = client.post(
+            '/internal/provision-users/',
+            {'file': upload, 'input_format': PROVISION_FORMAT_NDJSON},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -106,3 +106,17 @@ class RegisterTestCase(TestCase):
         self.assertEqual(user.first_name, test_first_name)
         self.assertEqual(user.last_name, test_last_name)
         self.assertEqual(user.get_full_name(), f'{test_first_name} {test_last_name}')
+
+    def test_register_email_case(self):
+        """Проверка, что email сохраняется в нижнем регистре и уникален без учёта регистра."""
+        client = Client()
+        test_password = 'Secret!1'  # noqa: S105 для тестов можно
+        data = {'password': test_password, 'password2': test_password}
+
+        response = client.post(path='/auth/register/', data={'email': 'Test@Test.test', **data})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.filter(email='test@test.test').exists())
+
+        response = client.post(path='/auth/register/', data={'email': 'TEST@test.test', **data})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.json())
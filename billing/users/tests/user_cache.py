@@ -0,0 +1,151 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from billing.redis_pool import get_redis_client
+from users.models import User
+from users.user_cache import (
+    LRUCache,
+    build_user,
+    get_cache_key,
+    get_user_data,
+    invalidate_users,
+    load_user_data,
+    local_cache,
+)
+from wallet.models import Wallet
+from wallet.tests.secure_transaction import get_unavailable_redis
+
+
+test_email = 'test@test.test'
+
+
+class UserCacheTestCase(TestCase):
+    """Тесты на JWT авторизацию с кэшем пользователей."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user = User.objects.create_user(email=test_email)
+        self.sender = Wallet.objects.create(user=self.user, balance=100)
+        self.payee = Wallet.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def tearDown(self):
+        """Очистка кэша в памяти процесса."""
+        local_cache.clear()
+
+    def _transfer(self):
+        return self.client.post(
+            path='/wallet/transaction/',
+            data={'sender': str(self.sender.pk), 'payee': str(self.payee.pk), 'amount': 1},
+        )
+
+    def _get_user_queries(self, queries: CaptureQueriesContext):
+        return [query['sql'] for query in queries if 'FROM "users"' in query['sql']]
+
+    def test_transfer_without_user_query(self):
+        """Проверка, что перевод с закэшированным пользователем не читает таблицу users."""
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._transfer().status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self._get_user_queries(queries)), 1)
+
+        # из памяти процесса
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._transfer().status_code, status.HTTP_200_OK)
+        self.assertEqual(self._get_user_queries(queries), [])
+
+        # из редиса
+        local_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._transfer().status_code, status.HTTP_200_OK)
+        self.assertEqual(self._get_user_queries(queries), [])
+
+    def test_deactivated_user(self):
+        """Проверка, что сохранение пользователя сбрасывает кэш."""
+        self.assertEqual(self._transfer().status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+
+        response = self._transfer()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'user_inactive')
+
+    def test_stale_write_after_invalidation(self):
+        """Проверка, что поля, прочитанные до деактивации, не возвращаются в редис."""
+        redis_client = get_redis_client()
+        redis_client.delete(get_cache_key(self.user.pk))
+
+        def load_before_deactivation(user_id):
+            try:
+                return load_user_data(user_id)
+            finally:
+                # деактивация коммитится, пока запрос ещё не записал пользователя в кэш
+                User.objects.filter(pk=user_id).update(is_active=False)
+                invalidate_users([user_id])
+
+        with mock.patch('users.user_cache.load_user_data', load_before_deactivation):
+            self.assertTrue(get_user_data(self.user.pk)['is_active'])
+        self.assertIsNone(redis_client.get(get_cache_key(self.user.pk)))
+
+        local_cache.clear()
+        self.assertFalse(get_user_data(self.user.pk)['is_active'])
+        self.assertIsNotNone(redis_client.get(get_cache_key(self.user.pk)))
+
+    def test_unknown_user(self):
+        """Проверка токена несуществующего пользователя."""
+        token = AccessToken.for_user(self.user)
+        token['user_id'] = self.user.pk + 1000
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        response = self._transfer()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'user_not_found')
+
+    def test_redis_unavailable(self):
+        """Проверка, что без редиса пользователь читается из базы."""
+        with mock.patch('users.user_cache.get_redis_client', get_unavailable_redis):
+            with self.assertLogs('users.user_cache', level='WARNING'):
+                self.assertEqual(self._transfer().status_code, status.HTTP_200_OK)
+
+    def test_build_user(self):
+        """Проверка, что пользователь из кэша сохраняет только закэшированные поля."""
+        user = build_user(get_user_data(self.user.pk))
+        self.assertEqual(user, self.user)
+        self.assertIn('password', user.get_deferred_fields())
+
+        User.objects.filter(pk=self.user.pk).update(first_name='Name')
+        user.is_staff = True
+        user.save()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_staff)
+        self.assertEqual(self.user.first_name, 'Name')
+
+    @override_settings(AUTH_USER_CACHE={'TTL': 60, 'LOCAL_TTL': 60, 'LOCAL_SIZE': 2})
+    def test_lru_eviction(self):
+        """Проверка вытеснения самой давно не читанной записи."""
+        cache = LRUCache()
+        cache.set(1, {'id': 1})
+        cache.set(2, {'id': 2})
+        cache.get(1)
+        cache.set(3, {'id': 3})
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), {'id': 1})
+
+    @override_settings(AUTH_USER_CACHE={'TTL': 60, 'LOCAL_TTL': 0, 'LOCAL_SIZE': 2})
+    def test_local_ttl(self):
+        """Проверка, что устаревшая запись не отдаётся."""
+        cache = LRUCache()
+        cache.set(1, {'id': 1})
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,231 @@
+"""
+Кэш пользователей для авторизации по JWT.
+
+Стандартная JWT авторизация читает строку пользователя из базы на каждый запрос.
+CachedJWTAuthentication берёт id пользователя из токена, а поля, нужные для проверки
+доступа (USER_CACHE_FIELDS), - из кэша в два уровня: LRU в памяти процесса
+(AUTH_USER_CACHE['LOCAL_SIZE'] записей на AUTH_USER_CACHE['LOCAL_TTL'] секунд) и редис
+(AUTH_USER_CACHE['TTL'] секунд, общий для всех воркеров). База читается только при
+промахе обоих уровней или недоступном редисе.
+
+При сохранении и удалении пользователя его запись удаляется из редиса и из памяти
+текущего процесса (сразу и после коммита), а номер сброса пользователя в редисе
+увеличивается. Запрос, прочитавший пользователя из базы до коммита, кладёт его
+в редис, только если номер сброса не изменился с начала чтения, поэтому старые поля
+не возвращаются в редис на TTL. В памяти других воркеров (и воркера такого запроса)
+запись живёт не дольше LOCAL_TTL, поэтому деактивация действует на них с этой задержкой.
+Массовые изменения через QuerySet.update сигналов не шлют и должны вызывать
+invalidate_users сами; массовая деактивация (UserQuerySet.deactivate) сбрасывает
+кэш по сигналу users_deactivated.
+"""
+import json
+import threading
+from collections import OrderedDict
+from logging import getLogger
+from time import monotonic
+from typing import (
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+)
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    transaction,
+)
+from redis import RedisError
+
+from billing.redis_pool import get_redis_client
+from users.models import User
+
+
+logger = getLogger(__name__)
+
+# поля пользователя в кэше: всё, что нужно авторизации и проверкам прав вью
+USER_CACHE_FIELDS = (
+    'id',
+    'email',
+    'is_active',
+    'is_staff',
+    'is_superuser',
+)
+
+
+class LRUCache:
+    """Потокобезопасный LRU кэш в памяти процесса со временем жизни записей."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """Значение по ключу или None, если его нет или оно устарело."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Dict):
+        """Запись значения, самая давно не читанная запись вытесняется при переполнении."""
+        with self._lock:
+            self._entries[key] = (monotonic() + settings.AUTH_USER_CACHE['LOCAL_TTL'], value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_USER_CACHE['LOCAL_SIZE']:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        """Удаление записи."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Удаление всех записей."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        """Число записей, включая устаревшие."""
+        with self._lock:
+            return len(self._entries)
+
+
+local_cache = LRUCache()
+
+
+def get_cache_key(user_id) -> str:
+    """Ключ в редисе с полями пользователя."""
+    return f'auth_user_{user_id}'
+
+
+def get_generation_key(user_id) -> str:
+    """Ключ в редисе с номером сброса записи пользователя."""
+    return f'auth_user_generation_{user_id}'
+
+
+# записываем поля, только если запись не сбрасывали после чтения номера сброса:
+# иначе запрос, прочитавший пользователя до деактивации, вернул бы его в кэш на TTL
+SET_USER_SCRIPT = """
+    if (redis.call('get', KEYS[2]) or '0') ~= ARGV[1] then
+        return 0
+    end
+    redis.call('set', KEYS[1], ARGV[2], 'ex', ARGV[3])
+    return 1
+"""
+
+
+def load_user_data(user_id) -> Optional[Dict]:
+    """Поля пользователя для авторизации из базы."""
+    return User.objects.filter(pk=user_id).values(*USER_CACHE_FIELDS).first()
+
+
+def get_user_data(user_id) -> Optional[Dict]:
+    """
+    Поля пользователя для авторизации: из памяти процесса, из редиса или из базы.
+
+    :param user_id: id пользователя из токена
+    :return: USER_CACHE_FIELDS пользователя или None, если его нет
+    """
+    data = local_cache.get(user_id)
+    if data is not None:
+        return data
+
+    redis_client = get_redis_client()
+    cached = generation = None
+    try:
+        # номер сброса читается до базы: сброс после этого момента отменит запись в кэш
+        cached, generation = redis_client.mget(
+            get_cache_key(user_id),
+            get_generation_key(user_id),
+        )
+    except RedisError:
+        logger.warning('User cache is unavailable', exc_info=True)
+        redis_client = None
+
+    if cached is not None:
+        data = json.loads(cached)
+    else:
+        data = load_user_data(user_id)
+        if data is None:
+            return None
+        if redis_client is not None:
+            try:
+                redis_client.register_script(SET_USER_SCRIPT)(
+                    keys=[get_cache_key(user_id), get_generation_key(user_id)],
+                    args=[generation or '0', json.dumps(data), settings.AUTH_USER_CACHE['TTL']],
+                )
+            except RedisError:
+                logger.warning('Failed to cache user', exc_info=True)
+
+    local_cache.set(user_id, data)
+    return data
+
+
+def build_user(data: Dict) -> User:
+    """
+    Пользователь из закэшированных полей без запроса к базе.
+
+    Остальные поля отложены (deferred): обращение к ним читает базу, а save()
+    записывает только закэшированные поля.
+    """
+    # from_db ждёт значения в порядке полей модели
+    field_names = [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname in data
+    ]
+    return User.from_db(
+        DEFAULT_DB_ALIAS,
+        field_names,
+        [data[field_name] for field_name in field_names],
+    )
+
+
+def invalidate_users(user_ids: Iterable):
+    """
+    Удаление пользователей из кэша в редисе и в памяти текущего процесса.
+
+    Номер сброса увеличивается в одной транзакции редиса с удалением записи и живёт
+    столько же, сколько запись, чтобы запрос, начавший читать базу до сброса,
+    не записал старые поля.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    for user_id in user_ids:
+        local_cache.delete(user_id)
+    try:
+        pipeline = get_redis_client().pipeline()
+        for user_id in user_ids:
+            pipeline.incr(get_generation_key(user_id))
+            pipeline.expire(get_generation_key(user_id), settings.AUTH_USER_CACHE['TTL'])
+        pipeline.delete(*[get_cache_key(user_id) for user_id in user_ids])
+        pipeline.execute()
+    except RedisError:
+        logger.warning('Failed to invalidate cached users', exc_info=True)
+
+
+def invalidate_user_on_change(sender, instance: User, **kwargs):  # noqa: U100
+    """
+    Сброс кэша при сохранении или удалении пользователя.
+
+    Запись удаляется сразу и ещё раз после коммита: запрос, прочитавший пользователя
+    до коммита, мог успеть снова положить в кэш старые поля до первого сброса
+    (после второго сброса номер сброса не даст их записать).
+    """
+    user_id = instance.pk
+    invalidate_users([user_id])
+    transaction.on_commit(lambda: invalidate_users([user_id]))
+
+
+def invalidate_deactivated_users(sender, user_ids: List[int], **kwargs):  # noqa: U100
+    """Сброс кэша пачки пользователей, деактивированных UserQuerySet.deactivate."""
+    invalidate_users(user_ids)
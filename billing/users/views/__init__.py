@@ -1,8 +1,10 @@
 from users.views.auth import UserObtainTokenPairView
+from users.views.provision import ProvisionUsersView
 from users.views.register import RegisterView
 
 
 __all__ = [
+    'ProvisionUsersView',
     'RegisterView',
     'UserObtainTokenPairView',
 ]
@@ -0,0 +1,49 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from users.provisioning import (
+    get_input_format,
+    open_text,
+    provision_users,
+    read_records,
+)
+from users.serializers import ProvisionUsersSerializer
+
+
+class ProvisionUsersView(APIView):
+    """
+    Массовое создание пользователей с кошельками из загруженного CSV или NDJSON.
+
+    Файл обрабатывается в запросе; пользователи с уже занятым email пропускаются,
+    поэтому после обрыва файл можно загрузить повторно. Для сотен тысяч записей
+    удобнее команда provision_users с контрольной точкой.
+    """
+
+    permission_classes = (IsAdminUser,)
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request, *args, **kwargs):  # noqa: U100
+        """Создание пользователей из файла, ответ - отчёт о загрузке."""
+        serializer = ProvisionUsersSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data['file']
+        input_format = (
+            serializer.validated_data.get('input_format')
+            or get_input_format(upload.name)
+        )
+        try:
+            result = provision_users(
+                read_records(open_text(upload), input_format),
+                chunk_size=settings.USER_PROVISION_CHUNK_SIZE,
+                workers=settings.USER_PROVISION_WORKERS,
+            )
+        except ValueError as error:
+            return Response(
+                {'file': [f'Invalid input: {error}']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(result)
@@ -1,4 +1,17 @@
 from django.apps import AppConfig
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_migrate
+
+
+def create_transaction_partitions(using=DEFAULT_DB_ALIAS, **kwargs):  # noqa: U100
+    """Создание секций транзакций на WALLET_TRANSACTION_PARTITIONS_AHEAD месяцев после migrate."""
+    from wallet.partitions import (
+        create_partitions,
+        is_partitioned,
+    )
+
+    if using == DEFAULT_DB_ALIAS and is_partitioned():
+        create_partitions()
 
 
 class WalletConfig(AppConfig):
@@ -6,3 +19,7 @@ class WalletConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wallet'
+
+    def ready(self):
+        """Подключение создания секций транзакций после миграций."""
+        post_migrate.connect(create_transaction_partitions, sender=self)
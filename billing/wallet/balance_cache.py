@@ -0,0 +1,283 @@
+"""
+Кэш балансов кошельков в редисе.
+
+Баланс, версия и время изменения кошелька записываются в кэш после коммита каждой
+операции, меняющей баланс (write-through), а при промахе загружаются из базы.
+Одновременные промахи по одному кошельку загружают баланс из базы один раз:
+остальные запросы ждут, пока первый положит баланс в кэш. Если редис недоступен,
+баланс читается из базы.
+"""
+import random
+import threading
+import uuid
+from decimal import Decimal
+from logging import getLogger
+from time import (
+    perf_counter,
+    sleep,
+)
+from typing import (
+    Dict,
+    Iterable,
+    Optional,
+)
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    transaction,
+)
+from django.utils.dateparse import parse_datetime
+from redis import RedisError
+
+from wallet.balance_slots import get_slot_totals
+from wallet.models import Wallet
+from wallet.secure_transaction import get_redis
+
+
+logger = getLogger(__name__)
+
+# пока лок загрузки взят, остальные промахи ждут баланс в кэше, секунды
+LOAD_LOCK_TIMEOUT = 1
+LOAD_WAIT_TIMEOUT = 0.2
+LOAD_WAIT_DELAY = 0.005
+
+# записываем баланс, только если его версия новее закэшированной:
+# запись после более раннего коммита не затрёт более свежий баланс
+SET_BALANCE_SCRIPT = """
+    local version = redis.call('hget', KEYS[1], 'version')
+    if version and tonumber(version) >= tonumber(ARGV[3]) then
+        return 0
+    end
+    redis.call(
+        'hmset', KEYS[1],
+        'user_id', ARGV[1], 'balance', ARGV[2], 'version', ARGV[3], 'updated_at', ARGV[4]
+    )
+    redis.call('pexpire', KEYS[1], ARGV[5])
+    return 1
+"""
+
+
+def get_cache_key(wallet_id: uuid.UUID) -> str:
+    """Ключ в редисе с балансом кошелька."""
+    return f'wallet_balance_{wallet_id}'
+
+
+def get_load_lock_key(wallet_id: uuid.UUID) -> str:
+    """Ключ лока загрузки баланса кошелька из базы."""
+    return f'wallet_balance_load_{wallet_id}'
+
+
+class BalanceCacheStats:
+    """
+    Счётчики кэша балансов текущего процесса.
+
+    hits - баланс взят из кэша, misses - промахи, coalesced - промахи, дождавшиеся
+    загрузки другим запросом, errors - ошибки редиса (баланс взят из базы).
+    Для доли запросов (WALLET_BALANCE_CACHE_STALENESS_SAMPLE_RATE) закэшированная версия
+    сверяется с базой: stale - сколько раз кэш отставал, max_stale_seconds - наибольшее
+    отставание.
+    """
+
+    counters = (
+        'hits',
+        'misses',
+        'coalesced',
+        'errors',
+        'staleness_checks',
+        'stale',
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Обнуление счётчиков."""
+        with self._lock:
+            self._values = dict.fromkeys(self.counters, 0)
+            self._max_stale_seconds = 0
+
+    def increment(self, counter: str):
+        """Увеличение счётчика на 1."""
+        with self._lock:
+            self._values[counter] += 1
+
+    def record_staleness(self, stale_seconds: Optional[float]):
+        """Результат сверки кэша с базой: None - кэш актуален, иначе отставание в секундах."""
+        with self._lock:
+            self._values['staleness_checks'] += 1
+            if stale_seconds is not None:
+                self._values['stale'] += 1
+                self._max_stale_seconds = max(self._max_stale_seconds, stale_seconds)
+
+    def get(self) -> Dict[str, float]:
+        """Счётчики и доля попаданий в кэш."""
+        with self._lock:
+            stats = dict(self._values)
+            stats['max_stale_seconds'] = self._max_stale_seconds
+        requests = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / requests if requests else 0
+        return stats
+
+
+cache_stats = BalanceCacheStats()
+
+
+def _load_balances(wallet_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, Dict]:
+    """
+    Балансы кошельков из базы одним запросом.
+
+    К балансам шардированных кошельков вторым запросом добавляются суммы их слотов,
+    версия такого кошелька - сумма версий кошелька и слотов.
+    """
+    balances = {
+        wallet['id']: wallet
+        for wallet in Wallet.objects.filter(
+            pk__in=wallet_ids,
+        ).values(
+            'id',
+            'user_id',
+            'balance',
+            'version',
+            'updated_at',
+            'slot_count',
+        )
+    }
+    sharded = [wallet_id for wallet_id, wallet in balances.items() if wallet['slot_count']]
+    if sharded:
+        for wallet_id, slots in get_slot_totals(sharded).items():
+            wallet = balances[wallet_id]
+            wallet['balance'] += slots['balance']
+            wallet['version'] += slots['version']
+            wallet['updated_at'] = max(wallet['updated_at'], slots['updated_at'])
+    return balances
+
+
+def _set_balances(redis_client, balances: Iterable[Dict]):
+    """Запись балансов в кэш одним пакетом команд."""
+    ttl_ms = int(settings.WALLET_BALANCE_CACHE_TTL * 1000)
+    set_balance = redis_client.register_script(SET_BALANCE_SCRIPT)
+    pipeline = redis_client.pipeline(transaction=False)
+    for balance in balances:
+        set_balance(
+            keys=[get_cache_key(wallet_id=balance['id'])],
+            args=[
+                balance['user_id'],
+                str(balance['balance']),
+                balance['version'],
+                balance['updated_at'].isoformat(),
+                ttl_ms,
+            ],
+            client=pipeline,
+        )
+    pipeline.execute()
+
+
+def _parse_cached(wallet_id: uuid.UUID, cached: Dict[str, str]) -> Dict:
+    return {
+        'id': wallet_id,
+        'user_id': int(cached['user_id']),
+        'balance': Decimal(cached['balance']),
+        'version': int(cached['version']),
+        'updated_at': parse_datetime(cached['updated_at']),
+    }
+
+
+def refresh_balances(wallet_ids: Iterable[uuid.UUID]):
+    """
+    Запись в кэш актуальных балансов кошельков.
+
+    Вызывается после коммита операции, изменившей балансы, и перечитывает балансы
+    из базы: это ещё один SELECT (два для шардированных кошельков) на каждую запись.
+    Ошибки базы и редиса не ломают уже закоммиченную операцию: если баланс не прочитан,
+    ключи кошельков удаляются из кэша, чтобы следующее чтение пошло в базу, а если
+    недоступен редис, устаревший баланс пропадёт из кэша через WALLET_BALANCE_CACHE_TTL.
+
+    :param wallet_ids: id кошельков с изменившимся балансом
+    """
+    try:
+        balances = _load_balances(wallet_ids)
+    except DatabaseError:
+        cache_stats.increment('errors')
+        logger.warning('Failed to load wallet balances for the cache', exc_info=True)
+        try:
+            get_redis().delete(*[get_cache_key(wallet_id) for wallet_id in wallet_ids])
+        except RedisError:
+            logger.warning('Failed to invalidate wallet balance cache', exc_info=True)
+        return
+    try:
+        _set_balances(get_redis(), balances.values())
+    except RedisError:
+        cache_stats.increment('errors')
+        logger.warning('Failed to refresh wallet balance cache', exc_info=True)
+
+
+def refresh_balances_on_commit(*wallet_ids):
+    """Обновление кэша балансов после коммита текущей транзакции (или сразу вне транзакции)."""
+    transaction.on_commit(lambda: refresh_balances(wallet_ids))
+
+
+def _check_staleness(cached: Dict):
+    """Сверка закэшированной версии баланса с базой для выборки запросов."""
+    if random.random() >= settings.WALLET_BALANCE_CACHE_STALENESS_SAMPLE_RATE:  # noqa: S311
+        return
+    actual = _load_balances([cached['id']]).get(cached['id'])
+    if actual is None or actual['version'] <= cached['version']:
+        cache_stats.record_staleness(None)
+        return
+    cache_stats.record_staleness((actual['updated_at'] - cached['updated_at']).total_seconds())
+
+
+def _get_cached_balance(redis_client, wallet_id: uuid.UUID) -> Optional[Dict]:
+    cached = redis_client.hgetall(get_cache_key(wallet_id=wallet_id))
+    if not cached:
+        return None
+    return _parse_cached(wallet_id=wallet_id, cached=cached)
+
+
+def _load_and_cache(redis_client, wallet_id: uuid.UUID) -> Optional[Dict]:
+    balance = _load_balances([wallet_id]).get(wallet_id)
+    if balance is not None:
+        _set_balances(redis_client, [balance])
+    return balance
+
+
+def get_balance(wallet_id: uuid.UUID) -> Optional[Dict]:
+    """
+    Баланс кошелька из кэша, при промахе - из базы.
+
+    :param wallet_id: id кошелька
+    :return: id пользователя, баланс, версия и время изменения кошелька или None,
+             если кошелька нет
+    """
+    wallet_id = uuid.UUID(str(wallet_id))
+    try:
+        redis_client = get_redis()
+        cached = _get_cached_balance(redis_client, wallet_id=wallet_id)
+        if cached is not None:
+            cache_stats.increment('hits')
+            _check_staleness(cached)
+            return cached
+
+        cache_stats.increment('misses')
+        load_lock_key = get_load_lock_key(wallet_id=wallet_id)
+        if redis_client.set(load_lock_key, 1, nx=True, ex=LOAD_LOCK_TIMEOUT):
+            try:
+                return _load_and_cache(redis_client, wallet_id=wallet_id)
+            finally:
+                redis_client.delete(load_lock_key)
+
+        # баланс уже загружает другой запрос, ждём его в кэше
+        deadline = perf_counter() + LOAD_WAIT_TIMEOUT
+        while perf_counter() < deadline:
+            sleep(LOAD_WAIT_DELAY)
+            cached = _get_cached_balance(redis_client, wallet_id=wallet_id)
+            if cached is not None:
+                cache_stats.increment('coalesced')
+                return cached
+    except RedisError:
+        cache_stats.increment('errors')
+        logger.warning('Wallet balance cache is unavailable', exc_info=True)
+
+    return _load_balances([wallet_id]).get(wallet_id)
@@ -0,0 +1,183 @@
+"""
+Шардирование баланса горячих кошельков по слотам.
+
+Каждое пополнение обновляет строку кошелька, и при сотнях пополнений в секунду
+блокировка этой строки становится узким местом. У шардированного кошелька
+(Wallet.slot_count > 0) пополнение обновляет случайный слот (WalletBalanceSlot),
+так что N слотов принимают до N пополнений одновременно. Списания идут со строки
+кошелька: если её баланса не хватает, балансы слотов сначала переносятся в неё.
+
+Блокировки берутся в одном порядке: строка кошелька, затем слоты, - поэтому
+перенос слотов не взаимоблокируется с переводами и пополнениями.
+"""
+import random
+import uuid
+from decimal import Decimal
+from typing import (
+    Dict,
+    Iterable,
+)
+
+from django.db import transaction
+from django.db.models import (
+    F,
+    Max,
+    Sum,
+)
+from django.utils import timezone
+
+from wallet.models import (
+    Wallet,
+    WalletBalanceSlot,
+)
+from wallet.secure_transaction import locked_atomic
+
+
+def credit_wallet(wallet: Wallet, amount: Decimal) -> bool:
+    """
+    Зачисление на кошелёк: в случайный слот шардированного кошелька, иначе в строку кошелька.
+
+    Если слота уже нет (число слотов уменьшили после чтения кошелька),
+    сумма зачисляется в строку кошелька. Замороженный кошелёк не пополняется, но строка
+    кошелька не блокируется, чтобы слоты принимали пополнения одновременно: заморозка
+    (users/deactivation.py) блокирует строку кошелька и слоты, поэтому после обновления
+    слота она либо уже видна, либо увидит зачисление и не состоится. Если зачисление
+    не прошло, транзакцию нужно откатить.
+
+    :param wallet: кошелёк получателя (нужны pk и slot_count)
+    :param amount: сумма зачисления
+    :return: зачислено ли (False - кошелёк заморожен или удалён)
+    """
+    now = timezone.now()
+    if wallet.slot_count:
+        is_credited = WalletBalanceSlot.objects.filter(
+            wallet_id=wallet.pk,
+            slot=random.randrange(wallet.slot_count),  # noqa: S311
+        ).update(
+            balance=F('balance') + amount,
+            version=F('version') + 1,
+            updated_at=now,
+        )
+        if is_credited:
+            return Wallet.objects.filter(pk=wallet.pk, is_frozen=False).exists()
+
+    # postgres перепроверяет условие is_frozen после ожидания блокировки строки
+    return bool(
+        Wallet.objects.filter(
+            pk=wallet.pk,
+            is_frozen=False,
+        ).update(
+            balance=F('balance') + amount,
+            version=F('version') + 1,
+            updated_at=now,
+        ),
+    )
+
+
+def sweep_slots(wallet_id: uuid.UUID, from_slot: int = 0) -> Decimal:
+    """
+    Перенос балансов слотов в строку кошелька.
+
+    Строка кошелька блокируется до слотов, как и при переводах и пополнениях (если она
+    уже заблокирована в текущей транзакции, повторная блокировка ничего не ждёт),
+    вне транзакции открывается своя.
+
+    :param wallet_id: id кошелька
+    :param from_slot: переносить слоты с номером не меньше from_slot
+    :return: перенесённая сумма
+    """
+    with transaction.atomic():
+        if not Wallet.objects.select_for_update().filter(pk=wallet_id).values_list('pk'):
+            return Decimal(0)
+        slots = list(
+            WalletBalanceSlot.objects.select_for_update().filter(
+                wallet_id=wallet_id,
+                slot__gte=from_slot,
+            ).exclude(
+                balance=0,
+            ).order_by(
+                'slot',
+            ).values_list(
+                'pk',
+                'balance',
+            ),
+        )
+        if not slots:
+            return Decimal(0)
+
+        now = timezone.now()
+        amount = sum(balance for _, balance in slots)
+        WalletBalanceSlot.objects.filter(
+            pk__in=[pk for pk, _ in slots],
+        ).update(
+            balance=0,
+            version=F('version') + 1,
+            updated_at=now,
+        )
+        Wallet.objects.filter(
+            pk=wallet_id,
+        ).update(
+            balance=F('balance') + amount,
+            version=F('version') + 1,
+            updated_at=now,
+        )
+    return amount
+
+
+def get_slot_totals(wallet_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, Dict]:
+    """
+    Сумма балансов, версий и последнее изменение слотов кошельков одним запросом.
+
+    :param wallet_ids: id шардированных кошельков
+    :return: по id кошелька balance, version и updated_at его слотов
+    """
+    return {
+        totals.pop('wallet_id'): totals
+        for totals in WalletBalanceSlot.objects.filter(
+            wallet_id__in=wallet_ids,
+        ).order_by().values(
+            'wallet_id',
+        ).annotate(
+            balance=Sum('balance'),
+            version=Sum('version'),
+            updated_at=Max('updated_at'),
+        )
+    }
+
+
+def set_slot_count(wallet_id: uuid.UUID, slot_count: int):
+    """
+    Изменение числа слотов кошелька, 0 - перенос всего баланса в строку кошелька.
+
+    Балансы удаляемых слотов переносятся в строку кошелька, баланс кошелька не меняется.
+    Версия баланса в кэше - сумма версий кошелька и слотов, поэтому версии удаляемых слотов
+    добавляются к версии кошелька: иначе она уменьшится, и кэш перестанет принимать
+    новые балансы кошелька до истечения WALLET_BALANCE_CACHE_TTL.
+
+    :param wallet_id: id кошелька
+    :param slot_count: новое число слотов
+    """
+    with locked_atomic(wallet_id):
+        wallet = Wallet.objects.select_for_update().only('pk', 'slot_count').get(pk=wallet_id)
+        removed_version = 0
+        if slot_count < wallet.slot_count:
+            removed = WalletBalanceSlot.objects.filter(wallet_id=wallet_id, slot__gte=slot_count)
+            # блокируем и пустые слоты: зачисление в них до удаления пропало бы
+            list(removed.select_for_update().order_by('slot').values_list('pk'))
+            sweep_slots(wallet_id=wallet_id, from_slot=slot_count)
+            removed_version = removed.aggregate(version=Sum('version'))['version'] or 0
+            removed.delete()
+        else:
+            WalletBalanceSlot.objects.bulk_create(
+                [
+                    WalletBalanceSlot(wallet_id=wallet_id, slot=slot)
+                    for slot in range(wallet.slot_count, slot_count)
+                ],
+                ignore_conflicts=True,
+            )
+        Wallet.objects.filter(
+            pk=wallet_id,
+        ).update(
+            slot_count=slot_count,
+            version=F('version') + removed_version,
+        )
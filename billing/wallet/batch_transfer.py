@@ -0,0 +1,145 @@
+from collections import defaultdict
+from decimal import Decimal
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+from users.models import User
+from wallet.balance_slots import sweep_slots
+from wallet.constants import BATCH_MODE_ATOMIC
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.secure_transaction import (
+    locked_atomic,
+    retry_on_conflict,
+)
+from wallet.transfer_engine import apply_balance_deltas
+
+
+# статусы переводов в ответе пакетного апи
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+# перевод корректен, но не проведён, так как в режиме atomic упал другой перевод пакета
+STATUS_SKIPPED = 'skipped'
+
+# сколько строк транзакций вставлять одним INSERT
+BULK_CREATE_BATCH_SIZE = 500
+
+
+def _check_item(item: dict, user: User, wallets: Dict, balances: Dict) -> str:
+    """
+    Проверка одного перевода пакета.
+
+    :param item: провалидированный перевод
+    :param user: пользователь, от имени которого проводится пакет
+    :param wallets: кошельки пакета по id
+    :param balances: текущие (с учётом уже принятых переводов пакета) балансы кошельков
+    :return: текст ошибки или пустая строка, если перевод можно провести
+    """
+    sender = wallets.get(item['sender'])
+    if sender is None or sender.user_id != user.pk:
+        return 'wallet not found'
+
+    if item['payee'] not in wallets:
+        return 'payee not found'
+
+    if sender.is_frozen:
+        return 'wallet is frozen'
+
+    if wallets[item['payee']].is_frozen:
+        return 'payee wallet is frozen'
+
+    if balances[sender.pk] < item['amount']:
+        return 'insufficient funds'
+
+    return ''
+
+
+@retry_on_conflict
+def make_batch_transfer(user: User, items: List[dict], mode: str) -> Tuple[bool, List[dict]]:
+    """
+    Проведение пакета переводов.
+
+    Все кошельки пакета блокируются и загружаются одним запросом в фиксированном порядке
+    (по возрастанию id), чтобы два пакета со встречными переводами не ждали друг друга
+    бесконечно. Транзакции пишутся через bulk_create, а итоговое изменение
+    баланса каждого кошелька применяется одним UPDATE.
+
+    :param user: пользователь, от имени которого проводится пакет
+    :param items: провалидированные переводы
+    :param mode: atomic - если хотя бы один перевод не прошёл, не проводим ни одного;
+                 best_effort - проводим все корректные переводы
+    :return: признак того, что пакет проведён, и результат по каждому переводу
+    """
+    wallet_ids = {item['sender'] for item in items} | {item['payee'] for item in items}
+
+    # Для невозможности параллельных переводов с участием кошельков пакета
+    with locked_atomic(*wallet_ids):
+        wallets = {
+            wallet.pk: wallet
+            for wallet in Wallet.objects.select_for_update().filter(
+                pk__in=wallet_ids,
+            ).order_by(
+                'pk',
+            ).only(
+                'pk',
+                'user_id',
+                'balance',
+                'slot_count',
+                'is_frozen',
+            )
+        }
+        # части балансов горячих кошельков-отправителей переносим из слотов в строки кошельков
+        senders = {item['sender'] for item in items}
+        for wallet_id, wallet in wallets.items():
+            if wallet.slot_count and wallet_id in senders:
+                wallet.balance += sweep_slots(wallet_id=wallet_id)
+        balances = {wallet_id: wallet.balance for wallet_id, wallet in wallets.items()}
+        deltas = defaultdict(Decimal)
+        transactions = []
+        results = []
+
+        for index, item in enumerate(items):
+            error = _check_item(item=item, user=user, wallets=wallets, balances=balances)
+            if error:
+                results.append({'index': index, 'status': STATUS_ERROR, 'error': error})
+                continue
+
+            amount = Decimal(item['amount'])
+            balances[item['sender']] -= amount
+            balances[item['payee']] += amount
+            deltas[item['sender']] -= amount
+            deltas[item['payee']] += amount
+
+            new_transaction = Transaction(
+                sender_id=item['sender'],
+                payee_id=item['payee'],
+                amount=amount,
+                is_anonymous=item['is_anonymous'],
+                comment=item['comment'],
+            )
+            transactions.append(new_transaction)
+            results.append({
+                'index': index,
+                'status': STATUS_OK,
+                'transaction': str(new_transaction.pk),
+            })
+
+        if mode == BATCH_MODE_ATOMIC and len(transactions) != len(items):
+            for result in results:
+                if result['status'] == STATUS_OK:
+                    result['status'] = STATUS_SKIPPED
+                    del result['transaction']
+            return False, results
+
+        Transaction.objects.bulk_create(
+            transactions,
+            batch_size=BULK_CREATE_BATCH_SIZE,
+        )
+        apply_balance_deltas(deltas=deltas)
+
+    return True, results
@@ -1,4 +1,62 @@
 # минимальная сумма пополнения кошелька
 MIN_DEPOSIT_AMOUNT = 0.01
+# максимальная сумма пополнения: сумма транзакции хранится в 10 знаках, 2 из них - центы
+MAX_DEPOSIT_AMOUNT = 99_999_999
 # минимальная сумма перевода с кошелька на кошелёк
 MIN_TRANSACTION_AMOUNT = 0.01
+# максимальное количество переводов в одном пакетном запросе
+MAX_BATCH_TRANSACTIONS = 1000
+# режимы пакетного перевода: всё или ничего / проводим всё, что можем
+BATCH_MODE_ATOMIC = 'atomic'
+BATCH_MODE_BEST_EFFORT = 'best_effort'
+BATCH_MODES = (
+    BATCH_MODE_ATOMIC,
+    BATCH_MODE_BEST_EFFORT,
+)
+# способы проведения перевода (настройка WALLET_TRANSFER_ENGINE):
+# проверка баланса и обновления под локом в редисе
+TRANSFER_ENGINE_LOCKING = 'locking'
+# один запрос с условным списанием, только PostgreSQL
+TRANSFER_ENGINE_CONDITIONAL = 'conditional'
+TRANSFER_ENGINES = (
+    TRANSFER_ENGINE_LOCKING,
+    TRANSFER_ENGINE_CONDITIONAL,
+)
+# направления транзакций в истории кошелька: входящие / исходящие
+TRANSACTION_DIRECTION_IN = 'in'
+TRANSACTION_DIRECTION_OUT = 'out'
+TRANSACTION_DIRECTIONS = (
+    TRANSACTION_DIRECTION_IN,
+    TRANSACTION_DIRECTION_OUT,
+)
+# форматы выгрузки выписки по кошельку
+STATEMENT_FORMAT_CSV = 'csv'
+STATEMENT_FORMAT_NDJSON = 'ndjson'
+STATEMENT_FORMATS = (
+    STATEMENT_FORMAT_CSV,
+    STATEMENT_FORMAT_NDJSON,
+)
+# максимальная длина заголовка Idempotency-Key
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+# метрики горячих кошельков за скользящее окно, по которым можно сортировать:
+# суммарное ожидание лока, число переводов, число таймаутов лока
+HOT_WALLETS_ORDER_WAIT_MS = 'wait_ms'
+HOT_WALLETS_ORDER_TRANSFERS = 'transfers'
+HOT_WALLETS_ORDER_TIMEOUTS = 'timeouts'
+HOT_WALLETS_ORDERINGS = (
+    HOT_WALLETS_ORDER_WAIT_MS,
+    HOT_WALLETS_ORDER_TRANSFERS,
+    HOT_WALLETS_ORDER_TIMEOUTS,
+)
+# максимальное число горячих кошельков в ответе
+HOT_WALLETS_MAX_LIMIT = 100
+# максимальное число слотов баланса шардированного кошелька
+MAX_BALANCE_SLOTS = 64
+# способы проведения пополнений (настройка WALLET_DEPOSIT_MODE):
+# транзакция базы на каждое пополнение / приём в поток редиса и пакетное проведение воркером
+DEPOSIT_MODE_SYNC = 'sync'
+DEPOSIT_MODE_STREAM = 'stream'
+DEPOSIT_MODES = (
+    DEPOSIT_MODE_SYNC,
+    DEPOSIT_MODE_STREAM,
+)
@@ -0,0 +1,443 @@
+"""
+Пакетное проведение пополнений через поток в редисе (WALLET_DEPOSIT_MODE=stream).
+
+Пополнения от платёжных систем приходят пачками, а синхронное пополнение - это
+отдельная транзакция базы с INSERT и UPDATE на каждый запрос. В режиме stream
+эндпоинт пополнения только проверяет запрос и добавляет его в поток редиса
+(XADD, поток хранится на диске вместе с остальными данными редиса) и отвечает 202.
+
+Воркеры (команда deposit_worker) читают поток группой потребителей пачками до
+WALLET_DEPOSIT_BATCH_SIZE пополнений, собирая пачку не дольше
+WALLET_DEPOSIT_BATCH_LATENCY секунд, и проводят всю пачку одной транзакцией базы:
+один INSERT транзакций и один UPDATE балансов с суммой пополнений каждого кошелька.
+Сообщения подтверждаются (XACK) и удаляются из потока только после коммита.
+
+Сообщение упавшего воркера остаётся неподтверждённым и через WALLET_DEPOSIT_CLAIM_IDLE
+секунд забирается другим воркером (XCLAIM). id транзакции выдаётся при приёме
+пополнения, поэтому уже проведённое сообщение повторно не проводится, а повтор
+с тем же Idempotency-Key отсекается таблицей TransactionIdempotencyKey.
+
+Сообщение, которое не проводится (например, с некорректной суммой), не держит
+остальные сообщения пачки, а после WALLET_DEPOSIT_MAX_DELIVERIES попыток переносится
+в поток недоставленных WALLET_DEPOSIT_DEAD_LETTER_STREAM для разбора вручную.
+"""
+import os
+import socket
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+from http import HTTPStatus
+from logging import getLogger
+from time import perf_counter
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from django.conf import settings
+from django.db import (
+    InterfaceError,
+    OperationalError,
+    connection,
+    transaction,
+)
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from redis import (
+    Redis,
+    RedisError,
+    ResponseError,
+)
+
+from wallet.balance_cache import refresh_balances_on_commit
+from wallet.models import (
+    Transaction,
+    TransactionIdempotencyKey,
+    Wallet,
+)
+from wallet.secure_transaction import get_redis
+from wallet.transfer_engine import apply_balance_deltas
+
+
+logger = getLogger(__name__)
+
+# сколько ждать первое сообщение пустого потока, секунды (меньше REDIS_SOCKET_TIMEOUT)
+IDLE_BLOCK = 0.5
+
+# Сообщение потока: id сообщения и поля пополнения
+Entry = Tuple[str, Dict[str, str]]
+
+
+def get_consumer_name() -> str:
+    """Имя потребителя в группе: хост и pid воркера."""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def ensure_group(redis_client: Redis):
+    """Создание потока и группы потребителей, если их ещё нет."""
+    try:
+        redis_client.xgroup_create(
+            settings.WALLET_DEPOSIT_STREAM,
+            settings.WALLET_DEPOSIT_STREAM_GROUP,
+            id='0',
+            mkstream=True,
+        )
+    except ResponseError as exc:
+        if 'BUSYGROUP' not in str(exc):
+            raise
+
+
+def enqueue_deposit(payee_id: uuid.UUID,
+                    amount: Decimal,
+                    is_anonymous: bool = False,
+                    comment: str = '',
+                    idempotency_key: Optional[str] = None) -> uuid.UUID:
+    """
+    Приём пополнения в поток.
+
+    :param payee_id: id кошелька получателя
+    :param amount: сумма пополнения
+    :param is_anonymous: анонимное пополнение
+    :param comment: комментарий
+    :param idempotency_key: ключ идемпотентности запроса
+    :return: id будущей транзакции
+    :raises RedisError: редис недоступен
+    """
+    transaction_id = uuid.uuid4()
+    get_redis().xadd(
+        settings.WALLET_DEPOSIT_STREAM,
+        {
+            'id': str(transaction_id),
+            'payee': str(payee_id),
+            'amount': str(amount),
+            'is_anonymous': int(is_anonymous),
+            'comment': comment,
+            'idempotency_key': idempotency_key or '',
+            'accepted_at': timezone.now().isoformat(),
+        },
+    )
+    return transaction_id
+
+
+def _read(redis_client: Redis, consumer: str, count: int, block: float) -> List[Entry]:
+    """Новые сообщения группы, не больше count, ожидание не дольше block секунд."""
+    response = redis_client.xreadgroup(
+        settings.WALLET_DEPOSIT_STREAM_GROUP,
+        consumer,
+        {settings.WALLET_DEPOSIT_STREAM: '>'},
+        count=count,
+        # BLOCK 0 ждёт бесконечно
+        block=max(int(block * 1000), 1),
+    )
+    return response[0][1] if response else []
+
+
+def claim_stale(redis_client: Redis, consumer: str, count: int) -> List[Entry]:
+    """
+    Неподтверждённые сообщения упавших воркеров.
+
+    :param redis_client: клиент редиса
+    :param consumer: имя текущего потребителя
+    :param count: сколько сообщений забрать
+    :return: забранные сообщения
+    """
+    idle_ms = int(settings.WALLET_DEPOSIT_CLAIM_IDLE * 1000)
+    message_ids = [
+        pending['message_id']
+        for pending in redis_client.xpending_range(
+            settings.WALLET_DEPOSIT_STREAM,
+            settings.WALLET_DEPOSIT_STREAM_GROUP,
+            min='-',
+            max='+',
+            count=count,
+        )
+        if pending['time_since_delivered'] >= idle_ms
+    ]
+    if not message_ids:
+        return []
+    entries = redis_client.xclaim(
+        settings.WALLET_DEPOSIT_STREAM,
+        settings.WALLET_DEPOSIT_STREAM_GROUP,
+        consumer,
+        min_idle_time=idle_ms,
+        message_ids=message_ids,
+    )
+    # удалённые из потока сообщения приходят без полей
+    return [(message_id, fields) for message_id, fields in entries if fields]
+
+
+def read_batch(redis_client: Redis,
+               consumer: str,
+               batch_size: Optional[int] = None,
+               latency: Optional[float] = None) -> List[Entry]:
+    """
+    Пачка сообщений для проведения.
+
+    Сначала забираются зависшие сообщения упавших воркеров, затем новые. После первого
+    сообщения пачка добирается до batch_size не дольше latency секунд.
+
+    :param redis_client: клиент редиса
+    :param consumer: имя текущего потребителя
+    :param batch_size: максимум сообщений (по умолчанию WALLET_DEPOSIT_BATCH_SIZE)
+    :param latency: сколько собирать пачку (по умолчанию WALLET_DEPOSIT_BATCH_LATENCY)
+    :return: сообщения пачки
+    """
+    batch_size = batch_size or settings.WALLET_DEPOSIT_BATCH_SIZE
+    latency = settings.WALLET_DEPOSIT_BATCH_LATENCY if latency is None else latency
+
+    entries = claim_stale(redis_client, consumer=consumer, count=batch_size)
+    if not entries:
+        entries = _read(redis_client, consumer=consumer, count=batch_size, block=IDLE_BLOCK)
+    deadline = perf_counter() + latency
+    while entries and len(entries) < batch_size:
+        remaining = deadline - perf_counter()
+        if remaining <= 0:
+            break
+        more = _read(
+            redis_client,
+            consumer=consumer,
+            count=batch_size - len(entries),
+            block=remaining,
+        )
+        if not more:
+            break
+        entries.extend(more)
+    return entries
+
+
+def _register_keys(deposits: List[Transaction]) -> Set[uuid.UUID]:
+    """
+    Сохранение ключей идемпотентности пачки одним INSERT.
+
+    :param deposits: транзакции пачки с ключами
+    :return: id транзакций, чьи ключи сохранены (остальные транзакции - повторы ключа,
+             в том числе внутри пачки)
+    """
+    if not deposits:
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TransactionIdempotencyKey._meta.db_table} '  # noqa: S608
+            '(key, transaction_id, response_status, created_at) VALUES '
+            + ', '.join(['(%s, %s, %s, %s)'] * len(deposits))
+            + ' ON CONFLICT (key) DO NOTHING RETURNING transaction_id',
+            [
+                value
+                for deposit in deposits
+                for value in (
+                    deposit.idempotency_key,
+                    deposit.pk,
+                    # эндпоинт ответил на пополнение 202, повтор отдаст то же
+                    HTTPStatus.ACCEPTED,
+                    deposit.created_at,
+                )
+            ],
+        )
+        return {transaction_id for transaction_id, in cursor.fetchall()}
+
+
+def apply_deposits(entries: List[Entry]) -> int:
+    """
+    Проведение пачки пополнений одной транзакцией базы.
+
+    Пропускаются уже проведённые сообщения и повторы сообщения внутри пачки (по id
+    транзакции) и повторы ключа идемпотентности. Пополнения удалённых и замороженных
+    кошельков (кошелёк заморозили, пока пополнение ждало в потоке) после коммита
+    переносятся в поток недоставленных, чтобы принятые с 202 деньги не терялись.
+
+    :param entries: сообщения потока
+    :return: число проведённых пополнений
+    """
+    if not entries:
+        return 0
+
+    now = timezone.now()
+    deposits = {}
+    messages = {}
+    for entry in entries:
+        fields = entry[1]
+        # повторно доставленное сообщение может попасть в одну пачку с оригиналом
+        if fields['id'] in deposits:
+            continue
+        messages[fields['id']] = entry
+        accepted_at = parse_datetime(fields['accepted_at'])
+        deposits[fields['id']] = Transaction(
+            id=uuid.UUID(fields['id']),
+            sender=None,
+            payee_id=uuid.UUID(fields['payee']),
+            amount=Decimal(fields['amount']),
+            is_anonymous=bool(int(fields['is_anonymous'])),
+            comment=fields['comment'],
+            idempotency_key=fields['idempotency_key'] or None,
+            # часы воркера могут отставать от часов API, транзакция не может
+            # оказаться раньше приёма, иначе её не найдёт проверка ниже
+            created_at=max(now, accepted_at),
+        )
+    deposits = list(deposits.values())
+    accepted_since = min(parse_datetime(fields['accepted_at']) for _, fields in entries)
+
+    with transaction.atomic():
+        # строки кошельков блокируются в порядке id, как и при переводах
+        is_frozen = dict(
+            Wallet.objects.select_for_update().filter(
+                pk__in={deposit.payee_id for deposit in deposits},
+            ).order_by(
+                'pk',
+            ).values_list(
+                'pk',
+                'is_frozen',
+            ),
+        )
+        # транзакции создаются не раньше приёма пополнения, условие отсекает старые секции
+        applied = set(
+            Transaction.objects.filter(
+                pk__in=[deposit.pk for deposit in deposits],
+                created_at__gte=accepted_since,
+            ).values_list(
+                'pk',
+                flat=True,
+            ),
+        )
+        deposits = [deposit for deposit in deposits if deposit.pk not in applied]
+        rejected = defaultdict(list)
+        for deposit in deposits:
+            if deposit.payee_id not in is_frozen:
+                rejected['wallet does not exist'].append(messages[str(deposit.pk)])
+            elif is_frozen[deposit.payee_id]:
+                rejected['wallet is frozen'].append(messages[str(deposit.pk)])
+        deposits = [deposit for deposit in deposits if is_frozen.get(deposit.payee_id) is False]
+        registered = _register_keys([deposit for deposit in deposits if deposit.idempotency_key])
+        deposits = [
+            deposit
+            for deposit in deposits
+            if not deposit.idempotency_key or deposit.pk in registered
+        ]
+
+        Transaction.objects.bulk_create(deposits)
+        deltas = defaultdict(Decimal)
+        for deposit in deposits:
+            deltas[deposit.payee_id] += deposit.amount
+        apply_balance_deltas(deltas=deltas)
+        refresh_balances_on_commit(*deltas.keys())
+        for reason, rejected_entries in rejected.items():
+            transaction.on_commit(partial(dead_letter, get_redis(), rejected_entries, reason))
+
+    skipped = len(entries) - len(deposits) - sum(map(len, rejected.values()))
+    if skipped:
+        logger.warning('Skipped %s duplicate deposits', skipped)
+    return len(deposits)
+
+
+def _delivery_count(redis_client: Redis, message_id: str) -> int:
+    """Сколько раз сообщение выдавалось воркерам (0 - сообщение уже подтверждено)."""
+    pending = redis_client.xpending_range(
+        settings.WALLET_DEPOSIT_STREAM,
+        settings.WALLET_DEPOSIT_STREAM_GROUP,
+        min=message_id,
+        max=message_id,
+        count=1,
+    )
+    return pending[0]['times_delivered'] if pending else 0
+
+
+def dead_letter(redis_client: Redis, entries: List[Entry], reason: str):
+    """
+    Перенос сообщений в поток WALLET_DEPOSIT_DEAD_LETTER_STREAM для разбора вручную.
+
+    Сообщение добавляется туда с исходными полями, id исходного сообщения и причиной,
+    подтверждается и удаляется из потока пополнений в одной транзакции редиса.
+
+    :param redis_client: клиент редиса
+    :param entries: сообщения потока
+    :param reason: причина, по которой пополнение не проведено
+    """
+    if not entries:
+        return
+    stream = settings.WALLET_DEPOSIT_STREAM
+    message_ids = [message_id for message_id, _ in entries]
+    pipeline = redis_client.pipeline()
+    for message_id, fields in entries:
+        pipeline.xadd(
+            settings.WALLET_DEPOSIT_DEAD_LETTER_STREAM,
+            {**fields, 'message_id': message_id, 'reason': reason},
+        )
+    pipeline.xack(stream, settings.WALLET_DEPOSIT_STREAM_GROUP, *message_ids)
+    pipeline.xdel(stream, *message_ids)
+    pipeline.execute()
+    logger.error('Moved %s deposits to the dead letter stream: %s', len(entries), reason)
+
+
+def _apply_one_by_one(redis_client: Redis, entries: List[Entry]) -> List[Entry]:
+    """
+    Проведение сообщений упавшей пачки по одному, чтобы одно плохое не держало остальные.
+
+    Сообщение, которое не проводится и выдавалось уже WALLET_DEPOSIT_MAX_DELIVERIES раз,
+    переносится в поток недоставленных, остальные упавшие остаются неподтверждёнными
+    и будут забраны повторно.
+
+    :param redis_client: клиент редиса
+    :param entries: сообщения пачки
+    :return: проведённые сообщения
+    :raises OperationalError: база недоступна, повторять по одному бессмысленно
+    :raises RedisError: редис недоступен
+    """
+    applied = []
+    for entry in entries:
+        try:
+            apply_deposits([entry])
+        except (OperationalError, InterfaceError, RedisError):
+            raise
+        except Exception as exc:
+            message_id = entry[0]
+            logger.exception('Failed to apply deposit message %s', message_id)
+            delivered = _delivery_count(redis_client, message_id)
+            if delivered >= settings.WALLET_DEPOSIT_MAX_DELIVERIES:
+                dead_letter(redis_client, [entry], reason=repr(exc))
+        else:
+            applied.append(entry)
+    return applied
+
+
+def process_batch(redis_client: Redis,
+                  consumer: str,
+                  batch_size: Optional[int] = None,
+                  latency: Optional[float] = None) -> int:
+    """
+    Чтение, проведение и подтверждение одной пачки пополнений.
+
+    Если пачка не проводится из-за одного из сообщений (например, некорректной суммы),
+    её сообщения проводятся по одному (см. _apply_one_by_one). Если недоступна база,
+    или редис, сообщения остаются неподтверждёнными и будут забраны повторно через
+    WALLET_DEPOSIT_CLAIM_IDLE секунд.
+
+    :param redis_client: клиент редиса
+    :param consumer: имя текущего потребителя
+    :param batch_size: максимум сообщений в пачке
+    :param latency: сколько собирать пачку
+    :return: число сообщений в пачке
+    """
+    entries = read_batch(redis_client, consumer=consumer, batch_size=batch_size, latency=latency)
+    if not entries:
+        return 0
+
+    try:
+        apply_deposits(entries)
+        applied = entries
+    except (OperationalError, InterfaceError, RedisError):
+        raise
+    except Exception:
+        logger.exception('Failed to apply deposit batch, applying deposits one by one')
+        applied = _apply_one_by_one(redis_client, entries)
+
+    if applied:
+        message_ids = [message_id for message_id, _ in applied]
+        stream = settings.WALLET_DEPOSIT_STREAM
+        pipeline = redis_client.pipeline()
+        pipeline.xack(stream, settings.WALLET_DEPOSIT_STREAM_GROUP, *message_ids)
+        pipeline.xdel(stream, *message_ids)
+        pipeline.execute()
+    return len(entries)
@@ -0,0 +1,102 @@
+"""
+Поиск горячих кошельков по статистике локов за скользящее окно.
+
+Перевод держит лок на кошельки отправителя и получателя, поэтому переводы одного
+кошелька идут строго по очереди, и несколько популярных кошельков ограничивают
+пропускную способность всего сервиса. Статистика пишется в WalletLockStats
+по интервалам WALLET_CONTENTION_BUCKET секунд, окно - сумма последних интервалов.
+"""
+import math
+import uuid
+from time import time as current_time
+from typing import (
+    Dict,
+    List,
+)
+
+from django.conf import settings
+
+from wallet.constants import (
+    HOT_WALLETS_ORDER_WAIT_MS,
+    HOT_WALLETS_ORDERINGS,
+)
+from wallet.secure_transaction import (
+    get_current_bucket,
+    get_redis,
+    get_window_key,
+)
+
+
+# временный ключ с суммой интервалов удаляется сам, если запрос оборвался
+UNION_TTL = 10
+
+
+def clamp_window(window: int) -> int:
+    """Окно, за которое есть статистика: не больше WALLET_CONTENTION_MAX_WINDOW секунд."""
+    return min(window, settings.WALLET_CONTENTION_MAX_WINDOW)
+
+
+def get_hot_wallets(limit: int,
+                    window: int,
+                    order_by: str = HOT_WALLETS_ORDER_WAIT_MS) -> List[Dict]:
+    """
+    Самые горячие кошельки за последние window секунд.
+
+    Средняя длина очереди к локу кошелька считается по закону Литтла: суммарное время
+    ожидания за окно, делённое на длину окна, - среднее число переводов, ждущих лок.
+
+    :param limit: сколько кошельков вернуть
+    :param window: длина окна в секундах (не больше WALLET_CONTENTION_MAX_WINDOW)
+    :param order_by: метрика для сортировки (HOT_WALLETS_ORDERINGS)
+    :return: кошельки с ожиданием лока, переводами, таймаутами, частотой переводов в секунду
+        и средней длиной очереди, от самого горячего
+    :raises RedisError: редис недоступен
+    """
+    if order_by not in HOT_WALLETS_ORDERINGS:
+        raise ValueError(f'Unknown hot wallets ordering: {order_by}')
+
+    bucket_size = settings.WALLET_CONTENTION_BUCKET
+    window = clamp_window(window)
+    current_bucket = get_current_bucket()
+    bucket_count = max(math.ceil(window / bucket_size), 1)
+    buckets = range(current_bucket - bucket_count + 1, current_bucket + 1)
+    # текущий интервал ещё не закончился
+    elapsed = (len(buckets) - 1) * bucket_size + current_time() - current_bucket * bucket_size
+
+    union_id = uuid.uuid4().hex
+    union_keys = {
+        metric: f'tr_lock_window_union_{union_id}_{metric}'
+        for metric in HOT_WALLETS_ORDERINGS
+    }
+    redis = get_redis()
+    pipeline = redis.pipeline(transaction=True)
+    for metric, union_key in union_keys.items():
+        pipeline.zunionstore(
+            union_key,
+            [get_window_key(metric=metric, bucket=bucket) for bucket in buckets],
+        )
+        pipeline.expire(union_key, UNION_TTL)
+    pipeline.zrevrange(union_keys[order_by], 0, limit - 1, withscores=True)
+    top = pipeline.execute()[-1]
+
+    pipeline = redis.pipeline(transaction=False)
+    for wallet_id, _ in top:
+        for union_key in union_keys.values():
+            pipeline.zscore(union_key, wallet_id)
+    pipeline.delete(*union_keys.values())
+    scores = iter(pipeline.execute())
+
+    hot_wallets = []
+    for wallet_id, _ in top:
+        metrics = {metric: next(scores) or 0 for metric in union_keys}
+        acquisitions = metrics['transfers'] + metrics['timeouts']
+        hot_wallets.append({
+            'wallet_id': wallet_id,
+            'wait_ms': round(metrics['wait_ms'], 1),
+            'transfers': round(metrics['transfers']),
+            'timeouts': round(metrics['timeouts']),
+            'transfers_per_second': round(metrics['transfers'] / elapsed, 2),
+            'avg_wait_ms': round(metrics['wait_ms'] / acquisitions, 2) if acquisitions else 0,
+            'queue_depth': round(metrics['wait_ms'] / 1000 / elapsed, 2),
+        })
+    return hot_wallets
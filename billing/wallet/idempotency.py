@@ -0,0 +1,233 @@
+"""
+Идемпотентность запросов на перевод и пополнение (заголовок Idempotency-Key).
+
+Ключ сначала проверяется в редисе: первый запрос с ключом ставит отметку, что он
+выполняется, и по завершении сохраняет ответ, а повторы отдают сохранённый ответ одним
+обращением к редису, не трогая кошельки и локи. Повтор, пришедший пока первый запрос ещё
+выполняется, ждёт его ответа не дольше WALLET_IDEMPOTENCY_WAIT_TIMEOUT, затем получает 409.
+
+Если редис недоступен или ответ из него пропал, дубликат отсекает первичный ключ
+TransactionIdempotencyKey (таблица транзакций секционирована и не может держать
+уникальность одного idempotency_key), а ответ восстанавливается по записи ключа.
+"""
+import hashlib
+import json
+import uuid
+from functools import wraps
+from logging import getLogger
+from time import (
+    perf_counter,
+    sleep,
+)
+from typing import (
+    Callable,
+    Optional,
+)
+
+from django.conf import settings
+from django.db import IntegrityError
+from redis import RedisError
+from rest_framework import status
+from rest_framework.response import Response
+
+from wallet.constants import IDEMPOTENCY_KEY_MAX_LENGTH
+from wallet.models import TransactionIdempotencyKey
+from wallet.secure_transaction import get_redis
+
+
+logger = getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+WAIT_DELAY = 0.01
+
+# отдаём сохранённую запись, если она есть, иначе ставим отметку о выполнении запроса
+CLAIM_SCRIPT = """
+    local record = redis.call('get', KEYS[1])
+    if record then
+        return record
+    end
+    redis.call('set', KEYS[1], ARGV[1], 'px', ARGV[2])
+    return false
+"""
+
+# снимаем только свою отметку о выполнении запроса
+RELEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+"""
+
+
+def get_record_key(idempotency_key: str) -> str:
+    """Ключ в редисе с ответом на запрос."""
+    return f'idempotency_{idempotency_key}'
+
+
+def get_fingerprint(request) -> str:
+    """Отпечаток запроса: повтор с тем же ключом должен быть тем же запросом."""
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.path}:{payload}'.encode()).hexdigest()
+
+
+def _replayed(data: dict, status_code: int) -> Response:
+    return Response(
+        data,
+        status=status_code,
+        headers={REPLAYED_HEADER: 'true'},
+    )
+
+
+def _replay_from_db(idempotency_key: str) -> Optional[Response]:
+    """
+    Ответ на повтор по ключу идемпотентности в базе.
+
+    Успешный ответ перевода и синхронного пополнения пустой со статусом 200, пополнение,
+    принятое в поток, отвечает 202 с id транзакции.
+
+    :param idempotency_key: ключ идемпотентности запроса
+    :return: восстановленный ответ или None, если транзакции с ключом ещё нет
+    """
+    stored = TransactionIdempotencyKey.objects.filter(key=idempotency_key).first()
+    if stored is None:
+        return None
+    if stored.response_status == status.HTTP_202_ACCEPTED:
+        return _replayed({'transaction': str(stored.transaction_id)}, stored.response_status)
+    return _replayed({}, stored.response_status)
+
+
+def _is_stored(response: Response) -> bool:
+    """Ответы на занятый кошелёк и ошибки сервера не сохраняем: повтор должен выполниться."""
+    return (
+        response.status_code < status.HTTP_500_INTERNAL_SERVER_ERROR
+        and response.status_code not in (
+            status.HTTP_409_CONFLICT,
+            status.HTTP_429_TOO_MANY_REQUESTS,
+        )
+    )
+
+
+class IdempotencyRecord:
+    """Запись о запросе с ключом идемпотентности в редисе."""
+
+    def __init__(self, idempotency_key: str, fingerprint: str):
+        self.key = get_record_key(idempotency_key=idempotency_key)
+        self.fingerprint = fingerprint
+        self.pending = json.dumps({'fingerprint': fingerprint, 'token': uuid.uuid4().hex})
+        self.redis = None
+
+    def claim(self) -> Optional[dict]:
+        """
+        Отметка о начале выполнения запроса.
+
+        :return: запись повторяемого запроса (без status, если он ещё выполняется)
+                 или None, если запрос выполняется впервые
+        """
+        self.redis = get_redis()
+        claim = self.redis.register_script(CLAIM_SCRIPT)
+        deadline = perf_counter() + settings.WALLET_IDEMPOTENCY_WAIT_TIMEOUT
+        while True:
+            value = claim(
+                keys=[self.key],
+                args=[self.pending, int(settings.WALLET_IDEMPOTENCY_PENDING_TTL * 1000)],
+            )
+            if value is None:
+                return None
+            stored = json.loads(value)
+            # повтор ждёт ответа первого запроса, если тот ещё выполняется;
+            # если первый запрос не сохранил ответ, повтор выполнится заново
+            if 'status' in stored or perf_counter() >= deadline:
+                return stored
+            sleep(WAIT_DELAY)
+
+    def save(self, response: Response):
+        """Сохранение ответа или снятие отметки, если ответ не сохраняется."""
+        if not _is_stored(response):
+            self.release()
+            return
+        try:
+            self.redis.set(
+                self.key,
+                json.dumps({
+                    'fingerprint': self.fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }),
+                ex=settings.WALLET_IDEMPOTENCY_TTL,
+            )
+        except RedisError:
+            logger.warning('Failed to save idempotent response', exc_info=True)
+
+    def release(self):
+        """Снятие отметки о выполнении запроса."""
+        try:
+            self.redis.register_script(RELEASE_SCRIPT)(keys=[self.key], args=[self.pending])
+        except RedisError:
+            logger.warning('Failed to release idempotency key', exc_info=True)
+
+
+def idempotent(create: Callable) -> Callable:
+    """
+    Идемпотентное создание транзакции по заголовку Idempotency-Key.
+
+    Ключ ограничен пользователем и передаётся в create как idempotency_key, create должен
+    сохранить его в Transaction.idempotency_key и TransactionIdempotencyKey. Без заголовка
+    запрос выполняется как обычно.
+    Повтор, найденный только в базе, получает ответ, восстановленный по записи ключа
+    (см. _replay_from_db).
+    """
+    @wraps(create)
+    def wrapper(view, request, *args, **kwargs):
+        header = request.META.get(IDEMPOTENCY_HEADER)
+        if header is None:
+            return create(view, request, *args, **kwargs)
+        if not header or len(header) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response(
+                {'error': 'invalid idempotency key'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        idempotency_key = f'{request.user.pk}:{header}'
+        record = IdempotencyRecord(
+            idempotency_key=idempotency_key,
+            fingerprint=get_fingerprint(request),
+        )
+        try:
+            stored = record.claim()
+        except RedisError:
+            logger.warning('Idempotency cache is unavailable', exc_info=True)
+            record = stored = None
+
+        if stored is not None:
+            if stored['fingerprint'] != record.fingerprint:
+                return Response(
+                    {'error': 'idempotency key is already used for another request'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if 'status' not in stored:
+                return Response(
+                    {'error': 'request with this idempotency key is in progress'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return _replayed(stored['data'], stored['status'])
+
+        response = _replay_from_db(idempotency_key)
+        if response is None:
+            try:
+                response = create(view, request, *args, idempotency_key=idempotency_key, **kwargs)
+            except IntegrityError:
+                # одновременный повтор, пока редис недоступен: транзакцию уже создал первый запрос
+                response = _replay_from_db(idempotency_key)
+                if response is None:
+                    raise
+            except BaseException:
+                if record is not None:
+                    record.release()
+                raise
+
+        if record is not None:
+            record.save(response)
+        return response
+
+    return wrapper
@@ -0,0 +1,60 @@
+from datetime import (
+    datetime,
+    timezone,
+)
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from wallet.partitions import (
+    archive_partition,
+    get_partitions,
+    is_partitioned,
+)
+
+
+class Command(BaseCommand):
+    """
+    Выгрузка транзакций закрытых месяцев в сжатые CSV и удаление их секций.
+
+    Перед выгрузкой снимки балансов кошельков сдвигаются на конец месяца, поэтому
+    сверка балансов после архивации не нуждается в удалённых транзакциях.
+    """
+
+    help = 'Archive monthly transaction partitions before the given month'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры архивации."""
+        parser.add_argument(
+            '--before',
+            required=True,
+            help='archive months before this one, YYYY-MM',
+        )
+        parser.add_argument(
+            '--output-dir',
+            default=settings.WALLET_TRANSACTION_ARCHIVE_DIR,
+            help='directory for <partition>.csv.gz files',
+        )
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Выгрузка секций месяцев до --before."""
+        try:
+            before = datetime.strptime(options['before'], '%Y-%m').replace(tzinfo=timezone.utc)
+        except ValueError:
+            raise CommandError('--before must be YYYY-MM')
+        if not is_partitioned():
+            raise CommandError('transactions table is not partitioned')
+
+        months = [
+            datetime.strptime(name.rsplit('_p', 1)[1], '%Y_%m').replace(tzinfo=timezone.utc)
+            for name in get_partitions()
+        ]
+        for month in sorted(month for month in months if month < before):
+            try:
+                archive = archive_partition(month=month, directory=options['output_dir'])
+            except ValueError as error:
+                raise CommandError(str(error))
+            self.stdout.write(f'{archive.partition}: {archive.rows} rows -> {archive.path}')
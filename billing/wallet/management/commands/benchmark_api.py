@@ -0,0 +1,384 @@
+import json
+import random
+import threading
+import uuid
+from collections import (
+    Counter,
+    defaultdict,
+)
+from time import perf_counter
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Tuple,
+)
+
+import requests
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import connection
+from django.db.models import Q
+from django.test import (
+    Client,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from billing.benchmark import (
+    DISTRIBUTION_UNIFORM,
+    DISTRIBUTIONS,
+    compare_results,
+    format_summary,
+    make_sampler,
+    summarize_latencies,
+)
+from users.models import User
+from wallet.balance_slots import set_slot_count
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.secure_transaction import (
+    get_redis,
+    get_stats_key,
+    lock_stats,
+)
+
+
+SCENARIO_LOGIN = 'login'
+SCENARIO_DEPOSIT = 'deposit'
+SCENARIO_TRANSACTION = 'transaction'
+# входы вперемешку с переводами: видно, как всплеск входов влияет на переводы
+SCENARIO_MIXED = 'mixed'
+SCENARIOS = (
+    SCENARIO_LOGIN,
+    SCENARIO_DEPOSIT,
+    SCENARIO_TRANSACTION,
+    SCENARIO_MIXED,
+)
+# сценарии по умолчанию: mixed запускается только явно
+DEFAULT_SCENARIOS = (
+    SCENARIO_LOGIN,
+    SCENARIO_DEPOSIT,
+    SCENARIO_TRANSACTION,
+)
+PATHS = {
+    SCENARIO_LOGIN: '/auth/login/',
+    SCENARIO_DEPOSIT: '/wallet/deposit/',
+    SCENARIO_TRANSACTION: '/wallet/transaction/',
+}
+BENCHMARK_PASSWORD = 'benchmark-password'  # noqa: S105 пароль временных пользователей замера
+
+
+class Command(BaseCommand):
+    """
+    Нагрузочный замер API: вход, пополнение, перевод и входы вперемешку с переводами.
+
+    Запросы идут через полный стек джанго (middleware, авторизация, DRF) в процессе
+    или по HTTP на --base-url. Кошельки выбираются с равномерной популярностью или по
+    Ципфу (несколько горячих кошельков), баланс кошельков можно разбить на слоты
+    (--balance-slots). По каждому сценарию выводятся пропускная способность, перцентили
+    задержки, коды ответов, ожидание локов кошельков и число запросов к базе на запрос
+    (только в процессе), результат пишется в --output (JSON) и сравнивается с --compare.
+    В сценарии mixed доля входов задаётся --login-share, а сводка считается отдельно
+    для входов (mixed:login) и переводов (mixed:transaction).
+    Создаёт временных пользователей и кошельки и удаляет их после замера.
+    """
+
+    help = 'Load test login, deposit and transaction endpoints'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры замера."""
+        parser.add_argument(
+            '--scenario',
+            dest='scenarios',
+            action='append',
+            choices=SCENARIOS,
+            help='scenario to run, can be repeated (all but mixed by default)',
+        )
+        parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8, help='parallel clients')
+        parser.add_argument('--users', type=int, default=100, help='users with one wallet each')
+        parser.add_argument(
+            '--distribution',
+            choices=DISTRIBUTIONS,
+            default=DISTRIBUTION_UNIFORM,
+            help='wallet popularity distribution',
+        )
+        parser.add_argument('--zipf-s', type=float, default=1.1, help='zipf exponent')
+        parser.add_argument('--seed', type=int, default=0, help='random seed')
+        parser.add_argument(
+            '--base-url',
+            help='send HTTP requests to a running service instead of the in-process client',
+        )
+        parser.add_argument(
+            '--local-locks',
+            action='store_true',
+            help='use in-process wallet locks instead of Redis',
+        )
+        parser.add_argument(
+            '--balance-slots',
+            type=int,
+            default=0,
+            help='split balance of every wallet into N slots (see shard_wallet)',
+        )
+        parser.add_argument(
+            '--login-share',
+            type=float,
+            default=0.5,
+            help='share of logins in the mixed scenario',
+        )
+        parser.add_argument('--output', help='write results to JSON file')
+        parser.add_argument('--compare', help='compare with results JSON of a previous run')
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Запуск замера."""
+        scenarios = options['scenarios'] or DEFAULT_SCENARIOS
+        if options['users'] < 2:
+            raise CommandError('--users must be at least 2')
+
+        users, wallets = self._create_wallets(count=options['users'], balance=options['requests'])
+        tokens = [str(AccessToken.for_user(user)) for user in users]
+        results = {}
+        try:
+            if options['balance_slots']:
+                for wallet in wallets:
+                    set_slot_count(wallet_id=wallet.pk, slot_count=options['balance_slots'])
+            lock_backend = {}
+            if options['local_locks']:
+                lock_backend['WALLET_LOCK_BACKEND'] = 'wallet.secure_transaction.LocalWalletLock'
+            with override_settings(**lock_backend):
+                for scenario in scenarios:
+                    result = self._run(
+                        scenario=scenario,
+                        users=users,
+                        wallets=wallets,
+                        tokens=tokens,
+                        options=options,
+                    )
+                    for name, path_result in result.pop('paths').items():
+                        results[name] = path_result
+                        self._report(name, path_result)
+        finally:
+            self._cleanup(users=users, wallets=wallets)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(
+                    {
+                        'created_at': timezone.now().isoformat(),
+                        'options': {
+                            key: options[key]
+                            for key in (
+                                'requests',
+                                'concurrency',
+                                'users',
+                                'distribution',
+                                'zipf_s',
+                                'seed',
+                                'base_url',
+                                'local_locks',
+                                'balance_slots',
+                                'login_share',
+                            )
+                        },
+                        'scenarios': results,
+                    },
+                    output,
+                    indent=2,
+                )
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                for line in compare_results(json.load(baseline)['scenarios'], results):
+                    self.stdout.write(line)
+
+    def _create_wallets(self, count: int, balance: int) -> Tuple[List[User], List[Wallet]]:
+        """Временные пользователи с одним кошельком каждый, пароль хэшируется один раз."""
+        run_id = uuid.uuid4().hex[:8]
+        password = make_password(BENCHMARK_PASSWORD)
+        users = User.objects.bulk_create([
+            User(email=f'benchmark-{run_id}-{number}@example.com', password=password)
+            for number in range(count)
+        ])
+        if users[0].pk is None:
+            users = list(User.objects.filter(email__startswith=f'benchmark-{run_id}-'))
+        wallets = Wallet.objects.bulk_create([
+            Wallet(user=user, balance=balance)
+            for user in users
+        ])
+        return users, wallets
+
+    def _cleanup(self, users: List[User], wallets: List[Wallet]):
+        wallet_ids = [wallet.pk for wallet in wallets]
+        Transaction.objects.filter(
+            Q(sender_id__in=wallet_ids) | Q(payee_id__in=wallet_ids),
+        ).delete()
+        Wallet.objects.filter(pk__in=wallet_ids).delete()
+        # UserQuerySet.delete только деактивирует пользователей
+        User.objects.filter(pk__in=[user.pk for user in users])._raw_delete(User.objects.db)
+        get_redis().delete(*[get_stats_key(wallet_id=wallet_id) for wallet_id in wallet_ids])
+
+    def _report(self, scenario: str, result: Dict):
+        lock = result['lock']
+        self.stdout.write(
+            f'{format_summary(name=scenario, summary=result)}, '
+            f'status {result["status_codes"]}, '
+            f'lock contended {lock["contended"]} timeouts {lock["timeouts"]} '
+            f'wait {lock["wait_ms"]:.1f} ms, '
+            f'{result["queries_per_request"]} queries per request',
+        )
+
+    def _get_lock_stats(self, wallets: List[Wallet]) -> Dict[str, float]:
+        """Суммарная статистика ожидания локов по кошелькам замера."""
+        total = Counter()
+        for wallet in wallets:
+            total.update(lock_stats.get(wallet_id=wallet.pk))
+        return {
+            'contended': total['contended'],
+            'timeouts': total['timeouts'],
+            'wait_ms': total['wait_ms'],
+        }
+
+    def _make_payloads(self,
+                       scenario: str,
+                       users: List[User],
+                       wallets: List[Wallet],
+                       tokens: List[str],
+                       options: Dict) -> List[Tuple[str, str, Dict]]:
+        """Пути, токены и тела запросов заранее, чтобы выбор кошельков не попадал в замер."""
+        rng = random.Random(f'{options["seed"]}-{scenario}')  # noqa: S311
+        if scenario == SCENARIO_MIXED:
+            logins, transactions = [
+                iter(self._make_payloads(name, users, wallets, tokens, options))
+                for name in (SCENARIO_LOGIN, SCENARIO_TRANSACTION)
+            ]
+            return [
+                next(logins if rng.random() < options['login_share'] else transactions)
+                for _ in range(options['requests'])
+            ]
+
+        sample = make_sampler(
+            size=len(wallets),
+            distribution=options['distribution'],
+            zipf_s=options['zipf_s'],
+            rng=rng,
+        )
+        payloads = []
+        for _ in range(options['requests']):
+            index = sample()
+            if scenario == SCENARIO_LOGIN:
+                data = {'email': users[index].email, 'password': BENCHMARK_PASSWORD}
+                payloads.append((scenario, '', data))
+            elif scenario == SCENARIO_DEPOSIT:
+                data = {'payee': str(wallets[index].pk), 'amount': 1}
+                payloads.append((scenario, tokens[index], data))
+            else:
+                # горячий кошелёк - отправитель, получатель любой другой
+                payee = (index + rng.randrange(1, len(wallets))) % len(wallets)
+                data = {
+                    'sender': str(wallets[index].pk),
+                    'payee': str(wallets[payee].pk),
+                    'amount': 1,
+                }
+                payloads.append((scenario, tokens[index], data))
+        return payloads
+
+    def _make_http_sender(self, base_url: str) -> Callable[[str, str, Dict], Tuple[int, int]]:
+        """Отправка запроса по HTTP: (код ответа, 0 - запросы к базе не видны)."""
+        local = threading.local()
+
+        def send(path: str, token: str, data: Dict) -> Tuple[int, int]:
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            response = local.session.post(f'{base_url}{path}', json=data, headers=headers)
+            return response.status_code, 0
+
+        return send
+
+    def _make_client_sender(self) -> Callable[[str, str, Dict], Tuple[int, int]]:
+        """Отправка запроса в процессе: (код ответа, число запросов к базе)."""
+        local = threading.local()
+
+        def send(path: str, token: str, data: Dict) -> Tuple[int, int]:
+            if not hasattr(local, 'client'):
+                # testserver тестового клиента входит в ALLOWED_HOSTS только в тестах
+                host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+                local.client = Client(SERVER_NAME=host)
+            headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+            with CaptureQueriesContext(connection) as queries:
+                response = local.client.post(
+                    path,
+                    data=data,
+                    content_type='application/json',
+                    **headers,
+                )
+            return response.status_code, len(queries)
+
+        return send
+
+    def _run(self,
+             scenario: str,
+             users: List[User],
+             wallets: List[Wallet],
+             tokens: List[str],
+             options: Dict) -> Dict:
+        """
+        Прогон одного сценария в --concurrency потоков.
+
+        :return: paths - сводка по каждому виду запросов сценария (mixed:login и
+                 mixed:transaction для mixed, иначе по имени сценария)
+        """
+        payloads = self._make_payloads(scenario, users, wallets, tokens, options)
+        if options['base_url']:
+            send = self._make_http_sender(base_url=options['base_url'].rstrip('/'))
+        else:
+            send = self._make_client_sender()
+        concurrency = options['concurrency']
+        latencies = defaultdict(list)
+        status_codes = defaultdict(list)
+        queries = defaultdict(list)
+
+        def worker(worker_number: int):
+            try:
+                for name, token, data in payloads[worker_number::concurrency]:
+                    started_at = perf_counter()
+                    status_code, query_count = send(PATHS[name], token, data)
+                    latencies[name].append(perf_counter() - started_at)
+                    status_codes[name].append(status_code)
+                    queries[name].append(query_count)
+            finally:
+                # у каждого потока своё соединение с базой
+                connection.close()
+
+        lock_before = self._get_lock_stats(wallets)
+        threads = [
+            threading.Thread(target=worker, args=(worker_number,))
+            for worker_number in range(concurrency)
+        ]
+        started_at = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - started_at
+        lock_after = self._get_lock_stats(wallets)
+
+        paths = {}
+        for name in sorted(latencies):
+            result = summarize_latencies(latencies=latencies[name], elapsed=elapsed)
+            result['status_codes'] = {
+                str(code): count
+                for code, count in sorted(Counter(status_codes[name]).items())
+            }
+            result['lock'] = {key: lock_after[key] - lock_before[key] for key in lock_after}
+            result['queries_per_request'] = round(sum(queries[name]) / len(queries[name]), 2)
+            paths[f'{scenario}:{name}' if scenario == SCENARIO_MIXED else name] = result
+        return {'paths': paths}
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import random
+import uuid
+from time import (
+    perf_counter,
+    process_time,
+)
+from typing import (
+    Callable,
+    Dict,
+    List,
+)
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Q
+from django.test.client import (
+    AsyncRequestFactory,
+    RequestFactory,
+)
+from rest_framework_simplejwt.tokens import AccessToken
+
+from billing.benchmark import (
+    format_summary,
+    summarize_latencies,
+)
+from users.models import User
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.views import (
+    CreateTransactionView,
+    create_transaction_async,
+)
+
+
+class Command(BaseCommand):
+    """
+    Замер переводов через синхронную DRF вью и асинхронную вью в одном процессе.
+
+    Синхронная вью обрабатывает запросы по одному, как синхронный воркер gunicorn,
+    асинхронная - до --concurrency запросов одновременно в одном событийном цикле.
+    Кроме пропускной способности выводится число запросов на секунду процессорного
+    времени процесса, то есть оценка запросов в секунду на ядро. Middleware не
+    вызываются ни в одном из вариантов. Создаёт временных пользователя и кошельки
+    и удаляет их после замера.
+    """
+
+    help = 'Compare requests per second of sync and async transfer views'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры замера."""
+        parser.add_argument('--requests', type=int, default=2000, help='requests per view')
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=64,
+            help='requests in flight for the async view',
+        )
+        parser.add_argument('--wallets', type=int, default=50, help='number of wallets')
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Запуск замера."""
+        user = User.objects.create_user(
+            email=f'benchmark-{uuid.uuid4().hex}@example.com',
+        )
+        wallets = [
+            Wallet.objects.create(user=user, balance=options['requests'] * 2)
+            for _ in range(options['wallets'])
+        ]
+        authorization = f'Bearer {AccessToken.for_user(user)}'
+        payloads = [
+            json.dumps({
+                'sender': str(sender.pk),
+                'payee': str(payee.pk),
+                'amount': 1,
+            })
+            for sender, payee in (
+                random.sample(wallets, 2) for _ in range(options['requests'])
+            )
+        ]
+
+        try:
+            self._report('sync', self._run_sync(payloads, authorization))
+            self._report(
+                'async',
+                asyncio.run(self._run_async(payloads, authorization, options['concurrency'])),
+            )
+        finally:
+            wallet_ids = [wallet.pk for wallet in wallets]
+            Transaction.objects.filter(
+                Q(sender_id__in=wallet_ids) | Q(payee_id__in=wallet_ids),
+            ).delete()
+            Wallet.objects.filter(pk__in=wallet_ids).delete()
+            user.delete()
+
+    def _report(self, name: str, result: Dict[str, float]):
+        self.stdout.write(
+            f'{format_summary(name=name, summary=result)}, '
+            f'{result["errors"]} errors, {result["per_cpu_second"]:.1f} ops per CPU second',
+        )
+
+    def _measure(self, latencies: List[float], errors: int, elapsed: float, cpu: float) -> Dict:
+        summary = summarize_latencies(latencies=latencies, elapsed=elapsed)
+        summary['errors'] = errors
+        summary['per_cpu_second'] = len(latencies) / cpu if cpu else 0
+        return summary
+
+    def _run_sync(self, payloads: List[str], authorization: str) -> Dict[str, float]:
+        """Запросы к синхронной вью по одному."""
+        view = CreateTransactionView.as_view({'post': 'create'})
+        factory = RequestFactory()
+        latencies = []
+        errors = 0
+
+        started_at, cpu_started_at = perf_counter(), process_time()
+        for payload in payloads:
+            request_started_at = perf_counter()
+            # соединение с базой закрывается после запроса, как в обработчике WSGI
+            close_old_connections()
+            response = view(
+                factory.post(
+                    '/wallet/transaction/',
+                    data=payload,
+                    content_type='application/json',
+                    HTTP_AUTHORIZATION=authorization,
+                ),
+            )
+            response.render()
+            close_old_connections()
+            errors += response.status_code != 200
+            latencies.append(perf_counter() - request_started_at)
+
+        return self._measure(
+            latencies=latencies,
+            errors=errors,
+            elapsed=perf_counter() - started_at,
+            cpu=process_time() - cpu_started_at,
+        )
+
+    async def _run_async(self,
+                         payloads: List[str],
+                         authorization: str,
+                         concurrency: int) -> Dict[str, float]:
+        """Запросы к асинхронной вью, concurrency запросов одновременно."""
+        view: Callable = create_transaction_async
+        factory = AsyncRequestFactory()
+        queue = iter(payloads)
+        latencies = []
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            for payload in queue:
+                request_started_at = perf_counter()
+                response = await view(
+                    factory.post(
+                        '/wallet/transaction/',
+                        data=payload,
+                        content_type='application/json',
+                        authorization=authorization,
+                    ),
+                )
+                errors += response.status_code != 200
+                latencies.append(perf_counter() - request_started_at)
+
+        started_at, cpu_started_at = perf_counter(), process_time()
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        return self._measure(
+            latencies=latencies,
+            errors=errors,
+            elapsed=perf_counter() - started_at,
+            cpu=process_time() - cpu_started_at,
+        )
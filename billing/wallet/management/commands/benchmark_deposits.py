@@ -0,0 +1,223 @@
+import random
+import threading
+import uuid
+from time import perf_counter
+from typing import (
+    Dict,
+    List,
+)
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import connection
+from django.db.models import Sum
+from django.test import (
+    Client,
+    override_settings,
+)
+from rest_framework_simplejwt.tokens import AccessToken
+
+from billing.benchmark import (
+    DISTRIBUTION_UNIFORM,
+    DISTRIBUTIONS,
+    format_summary,
+    make_sampler,
+    summarize_latencies,
+)
+from users.models import User
+from wallet.constants import (
+    DEPOSIT_MODE_STREAM,
+    DEPOSIT_MODES,
+)
+from wallet.deposit_stream import (
+    ensure_group,
+    process_batch,
+)
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.secure_transaction import get_redis
+
+
+class Command(BaseCommand):
+    """
+    Замер пропускной способности пополнений: синхронно и через поток редиса.
+
+    Пополнения идут через эндпоинт /wallet/deposit/ в --concurrency потоков.
+    В режиме stream эндпоинт только принимает пополнение в отдельный поток редиса,
+    а --workers потоков параллельно проводят его пачками, как deposit_worker.
+    Для stream выводятся задержка приёма и сквозная пропускная способность - до
+    проведения последнего пополнения. Создаёт временных пользователя и кошельки
+    и удаляет их после замера.
+    """
+
+    help = 'Compare synchronous and batched stream deposits'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры замера."""
+        parser.add_argument('--deposits', type=int, default=2000, help='deposits per mode')
+        parser.add_argument('--concurrency', type=int, default=8, help='parallel clients')
+        parser.add_argument('--wallets', type=int, default=10, help='number of payee wallets')
+        parser.add_argument(
+            '--distribution',
+            choices=DISTRIBUTIONS,
+            default=DISTRIBUTION_UNIFORM,
+            help='wallet popularity distribution',
+        )
+        parser.add_argument('--zipf-s', type=float, default=1.1, help='zipf exponent')
+        parser.add_argument('--workers', type=int, default=2, help='stream worker threads')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.WALLET_DEPOSIT_BATCH_SIZE,
+            help='max deposits per batch',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=settings.WALLET_DEPOSIT_BATCH_LATENCY,
+            help='max seconds to wait for a batch to fill',
+        )
+        parser.add_argument(
+            '--mode',
+            dest='modes',
+            action='append',
+            choices=DEPOSIT_MODES,
+            help='mode to measure, can be repeated (all modes by default)',
+        )
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Запуск замера."""
+        if options['wallets'] < 1 or options['workers'] < 1:
+            raise CommandError('--wallets and --workers must be positive')
+
+        user = User.objects.create_user(email=f'benchmark-{uuid.uuid4().hex}@example.com')
+        wallets = Wallet.objects.bulk_create([
+            Wallet(user=user)
+            for _ in range(options['wallets'])
+        ])
+        token = str(AccessToken.for_user(user))
+        sample = make_sampler(
+            size=len(wallets),
+            distribution=options['distribution'],
+            zipf_s=options['zipf_s'],
+            rng=random.Random(0),  # noqa: S311
+        )
+        payloads = [
+            {'payee': str(wallets[sample()].pk), 'amount': 1}
+            for _ in range(options['deposits'])
+        ]
+        stream = f'benchmark_deposits_{uuid.uuid4().hex}'
+
+        try:
+            for mode in options['modes'] or DEPOSIT_MODES:
+                with override_settings(WALLET_DEPOSIT_MODE=mode, WALLET_DEPOSIT_STREAM=stream):
+                    balance_before = self._get_total_balance(wallets)
+                    summary = self._run(
+                        mode=mode,
+                        token=token,
+                        payloads=payloads,
+                        options=options,
+                    )
+                    applied = self._get_total_balance(wallets) - balance_before
+                self.stdout.write(format_summary(name=mode, summary=summary))
+                if mode == DEPOSIT_MODE_STREAM:
+                    self.stdout.write(
+                        f'{mode}: {summary["applied_throughput"]:.1f} deposits/s applied, '
+                        f'{summary["batches"]} batches, '
+                        f'{summary["count"] / summary["batches"] if summary["batches"] else 0:.1f}'
+                        f' deposits per batch',
+                    )
+                if applied != len(payloads):
+                    self.stderr.write(f'{mode}: {applied} of {len(payloads)} deposits applied')
+        finally:
+            get_redis().delete(stream)
+            Transaction.objects.filter(payee__in=wallets).delete()
+            Wallet.objects.filter(pk__in=[wallet.pk for wallet in wallets]).delete()
+            user.delete()
+
+    def _get_total_balance(self, wallets: List[Wallet]) -> int:
+        return Wallet.objects.filter(
+            pk__in=[wallet.pk for wallet in wallets],
+        ).aggregate(
+            total=Sum('balance'),
+        )['total'] or 0
+
+    def _run(self, mode: str, token: str, payloads: List[Dict], options: Dict) -> Dict:
+        """Прогон пополнений одним способом, для stream - вместе с проведением пачек."""
+        concurrency = options['concurrency']
+        latencies = []
+        accepting = threading.Event()
+        accepting.set()
+        batches = []
+        applied_at = []
+
+        def client_worker(worker_number: int):
+            # testserver тестового клиента входит в ALLOWED_HOSTS только в тестах
+            host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+            client = Client(SERVER_NAME=host)
+            try:
+                for data in payloads[worker_number::concurrency]:
+                    started_at = perf_counter()
+                    client.post(
+                        '/wallet/deposit/',
+                        data=data,
+                        content_type='application/json',
+                        HTTP_AUTHORIZATION=f'Bearer {token}',
+                    )
+                    latencies.append(perf_counter() - started_at)
+            finally:
+                # у каждого потока своё соединение с базой
+                connection.close()
+
+        def stream_worker(worker_number: int):
+            redis_client = get_redis()
+            try:
+                while True:
+                    count = process_batch(
+                        redis_client,
+                        consumer=f'benchmark-{worker_number}',
+                        batch_size=options['batch_size'],
+                        latency=options['latency'],
+                    )
+                    if count:
+                        batches.append(count)
+                        applied_at.append(perf_counter())
+                    elif not accepting.is_set():
+                        break
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=client_worker, args=(worker_number,))
+            for worker_number in range(concurrency)
+        ]
+        workers = []
+        if mode == DEPOSIT_MODE_STREAM:
+            ensure_group(get_redis())
+            workers = [
+                threading.Thread(target=stream_worker, args=(worker_number,))
+                for worker_number in range(options['workers'])
+            ]
+        started_at = perf_counter()
+        for thread in threads + workers:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - started_at
+        accepting.clear()
+        for thread in workers:
+            thread.join()
+
+        summary = summarize_latencies(latencies=latencies, elapsed=elapsed)
+        if mode == DEPOSIT_MODE_STREAM:
+            applied_elapsed = max(applied_at, default=started_at) - started_at
+            summary['batches'] = len(batches)
+            summary['applied_throughput'] = (
+                sum(batches) / applied_elapsed if applied_elapsed else 0
+            )
+        return summary
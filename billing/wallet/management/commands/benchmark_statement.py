@@ -0,0 +1,97 @@
+import uuid
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import reset_queries
+
+from billing.benchmark import get_peak_rss_mb
+from users.models import User
+from wallet.constants import STATEMENT_FORMATS
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.statement import (
+    get_statement_rows,
+    stream_statement,
+)
+
+
+class Command(BaseCommand):
+    """
+    Замер потоковой выгрузки выписки: строк в секунду и пиковая память процесса.
+
+    Создаёт временный кошелёк с --rows транзакциями, выгружает по нему выписку во всех
+    форматах (без записи на диск) и удаляет данные после замера. Если пиковый RSS
+    не растёт с --rows, память выгрузки не зависит от размера выписки.
+    """
+
+    help = 'Measure statement export throughput and peak RSS'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры замера."""
+        parser.add_argument('--rows', type=int, default=100000, help='transactions in statement')
+        parser.add_argument('--gzip', action='store_true', help='compress statement')
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Запуск замера."""
+        user = User.objects.create_user(
+            email=f'benchmark-{uuid.uuid4().hex}@example.com',
+        )
+        wallet = Wallet.objects.create(user=user)
+        other_wallet = Wallet.objects.create(user=user)
+
+        try:
+            self._create_transactions(
+                wallet=wallet,
+                other_wallet=other_wallet,
+                rows=options['rows'],
+            )
+            self.stdout.write(f'rss before export: {get_peak_rss_mb():.1f} MB')
+            for export_format in STATEMENT_FORMATS:
+                self._run(wallet=wallet, export_format=export_format, compress=options['gzip'])
+        finally:
+            Transaction.objects.filter(payee__user=user).delete()
+            Wallet.objects.filter(user=user).delete()
+            user.delete()
+
+    def _create_transactions(self, wallet: Wallet, other_wallet: Wallet, rows: int):
+        """Транзакции кошелька пачками, чтобы создание не раздуло память до замера."""
+        batch_size = 2000
+        for offset in range(0, rows, batch_size):
+            Transaction.objects.bulk_create([
+                Transaction(
+                    sender=other_wallet if number % 2 else wallet,
+                    payee=wallet if number % 2 else other_wallet,
+                    amount=1,
+                    comment=f'benchmark {number}',
+                )
+                for number in range(offset, min(offset + batch_size, rows))
+            ])
+            # при DEBUG запросы копятся в connection.queries
+            reset_queries()
+
+    def _run(self, wallet: Wallet, export_format: str, compress: bool):
+        """Выгрузка выписки в одном формате."""
+        rows = 0
+        size = 0
+
+        def count_rows(statement_rows):
+            nonlocal rows
+            for row in statement_rows:
+                rows += 1
+                yield row
+
+        started_at = perf_counter()
+        for chunk in stream_statement(
+            rows=count_rows(get_statement_rows(wallet_id=wallet.pk)),
+            export_format=export_format,
+            compress=compress,
+        ):
+            size += len(chunk)
+        elapsed = perf_counter() - started_at
+
+        self.stdout.write(
+            f'{export_format}: {rows} rows, {size / 1024 / 1024:.1f} MB in {elapsed:.2f} s, '
+            f'{rows / elapsed if elapsed else 0:.0f} rows/s, peak rss {get_peak_rss_mb():.1f} MB',
+        )
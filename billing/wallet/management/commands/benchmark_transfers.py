@@ -0,0 +1,127 @@
+import threading
+import uuid
+from time import perf_counter
+from typing import (
+    Dict,
+    List,
+)
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from billing.benchmark import (
+    format_summary,
+    summarize_latencies,
+)
+from users.models import User
+from wallet.constants import TRANSFER_ENGINES
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.secure_transaction import WalletLockTimeout
+from wallet.transfer_engine import (
+    TransferError,
+    make_transfer,
+)
+
+
+class Command(BaseCommand):
+    """
+    Замер способов проведения перевода при конкуренции за один кошелёк.
+
+    Все потоки переводят с одного "горячего" кошелька отправителя на несколько получателей,
+    для каждого способа выводятся пропускная способность и перцентили задержки.
+    Создаёт временных пользователя и кошельки и удаляет их после замера.
+    """
+
+    help = 'Compare transfer engines under contention on a hot sender wallet'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры замера."""
+        parser.add_argument('--transfers', type=int, default=1000, help='transfers per engine')
+        parser.add_argument('--concurrency', type=int, default=16, help='parallel threads')
+        parser.add_argument('--payees', type=int, default=10, help='number of payee wallets')
+        parser.add_argument(
+            '--engine',
+            dest='engines',
+            action='append',
+            choices=TRANSFER_ENGINES,
+            help='engine to measure, can be repeated (all engines by default)',
+        )
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Запуск замера."""
+        engines = options['engines'] or TRANSFER_ENGINES
+        transfers = options['transfers']
+
+        user = User.objects.create_user(
+            email=f'benchmark-{uuid.uuid4().hex}@example.com',
+        )
+        sender = Wallet.objects.create(user=user, balance=transfers * len(engines))
+        payees = [Wallet.objects.create(user=user) for _ in range(options['payees'])]
+
+        try:
+            for engine in engines:
+                summary = self._run(
+                    engine=engine,
+                    user=user,
+                    sender=sender,
+                    payees=payees,
+                    transfers=transfers,
+                    concurrency=options['concurrency'],
+                )
+                self.stdout.write(format_summary(name=engine, summary=summary))
+        finally:
+            wallet_ids = [sender.pk] + [payee.pk for payee in payees]
+            Transaction.objects.filter(
+                Q(sender_id__in=wallet_ids) | Q(payee_id__in=wallet_ids),
+            ).delete()
+            Wallet.objects.filter(pk__in=wallet_ids).delete()
+            user.delete()
+
+    def _run(self,
+             engine: str,
+             user: User,
+             sender: Wallet,
+             payees: List[Wallet],
+             transfers: int,
+             concurrency: int) -> Dict[str, float]:
+        """Прогон переводов одним способом в concurrency потоков."""
+        latencies = []
+        errors = []
+
+        def worker(worker_number: int):
+            try:
+                for transfer_number in range(worker_number, transfers, concurrency):
+                    started_at = perf_counter()
+                    try:
+                        make_transfer(
+                            user_id=user.pk,
+                            sender_id=sender.pk,
+                            payee_id=payees[transfer_number % len(payees)].pk,
+                            amount=1,
+                            engine=engine,
+                        )
+                    except (TransferError, WalletLockTimeout) as exc:
+                        errors.append(exc)
+                    latencies.append(perf_counter() - started_at)
+            finally:
+                # у каждого потока своё соединение с базой
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(worker_number,))
+            for worker_number in range(concurrency)
+        ]
+        started_at = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - started_at
+
+        if errors:
+            self.stderr.write(f'{engine}: {len(errors)} transfers failed, e.g. {errors[0]}')
+        return summarize_latencies(latencies=latencies, elapsed=elapsed)
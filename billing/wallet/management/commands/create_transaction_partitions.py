@@ -0,0 +1,40 @@
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from wallet.partitions import (
+    create_partitions,
+    is_partitioned,
+)
+
+
+class Command(BaseCommand):
+    """
+    Создание секций таблицы транзакций на несколько месяцев вперёд.
+
+    Секции создаются и после каждого migrate, команда нужна для запуска по расписанию,
+    чтобы новые транзакции не копились в секции по умолчанию.
+    """
+
+    help = 'Create monthly transaction partitions ahead of time'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры создания секций."""
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=None,
+            help='how many months after the current one, WALLET_TRANSACTION_PARTITIONS_AHEAD '
+                 'by default',
+        )
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Создание недостающих секций."""
+        if options['months_ahead'] is not None and options['months_ahead'] < 0:
+            raise CommandError('--months-ahead must not be negative')
+        if not is_partitioned():
+            raise CommandError('transactions table is not partitioned')
+
+        for name in create_partitions(months_ahead=options['months_ahead']):
+            self.stdout.write(f'created {name}')
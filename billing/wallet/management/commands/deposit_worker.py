@@ -0,0 +1,124 @@
+import multiprocessing
+import signal
+import threading
+from logging import getLogger
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import connections
+
+from wallet.deposit_stream import (
+    ensure_group,
+    get_consumer_name,
+    process_batch,
+)
+from wallet.secure_transaction import get_redis
+
+
+logger = getLogger(__name__)
+
+# пауза после ошибки пачки (база или редис недоступны), секунды
+ERROR_DELAY = 1
+
+
+class Command(BaseCommand):
+    """
+    Воркеры пакетного проведения пополнений из потока редиса (WALLET_DEPOSIT_MODE=stream).
+
+    Каждый процесс - отдельный потребитель группы WALLET_DEPOSIT_STREAM_GROUP со своими
+    соединениями с базой и редисом. SIGTERM и SIGINT дают доделать текущую пачку.
+    """
+
+    help = 'Apply queued deposits from the Redis stream in batches'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры воркеров."""
+        parser.add_argument('--workers', type=int, default=1, help='worker processes')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.WALLET_DEPOSIT_BATCH_SIZE,
+            help='max deposits per database transaction',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=settings.WALLET_DEPOSIT_BATCH_LATENCY,
+            help='max seconds to wait for a batch to fill',
+        )
+        parser.add_argument(
+            '--exit-when-empty',
+            action='store_true',
+            help='stop once the stream is drained',
+        )
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Запуск воркеров."""
+        if options['workers'] < 1 or options['batch_size'] < 1 or options['latency'] < 0:
+            raise CommandError('--workers and --batch-size must be positive, --latency >= 0')
+        ensure_group(get_redis())
+
+        kwargs = {
+            'batch_size': options['batch_size'],
+            'latency': options['latency'],
+            'exit_when_empty': options['exit_when_empty'],
+        }
+        if options['workers'] == 1:
+            self._work(**kwargs)
+            return
+
+        # дочерние процессы не должны унаследовать открытое соединение родителя
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=self._work, kwargs=kwargs)
+            for _ in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        # родитель только ждёт воркеров, сигнал остановки получают и они
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for process in processes:
+            process.join()
+
+    def _work(self, batch_size: int, latency: float, exit_when_empty: bool):
+        """Цикл одного воркера: пачка за пачкой до сигнала остановки."""
+        stop = threading.Event()
+        handlers = {
+            signal_number: signal.signal(signal_number, lambda *args: stop.set())  # noqa: U100
+            for signal_number in (signal.SIGTERM, signal.SIGINT)
+        }
+
+        consumer = get_consumer_name()
+        redis_client = get_redis()
+        applied = 0
+        started_at = perf_counter()
+        while not stop.is_set():
+            try:
+                count = process_batch(
+                    redis_client,
+                    consumer=consumer,
+                    batch_size=batch_size,
+                    latency=latency,
+                )
+            except Exception:
+                # воркер не должен останавливаться из-за ошибки одной пачки
+                logger.exception('Failed to apply deposit batch')
+                stop.wait(ERROR_DELAY)
+                continue
+            applied += count
+            if not count and exit_when_empty:
+                break
+        for signal_number, handler in handlers.items():
+            signal.signal(signal_number, handler)
+
+        elapsed = perf_counter() - started_at
+        self.stdout.write(
+            f'{consumer}: {applied} deposits in {elapsed:.1f} s '
+            f'({applied / elapsed if elapsed else 0:.0f} deposits/s)',
+        )
@@ -0,0 +1,85 @@
+import sys
+from time import perf_counter
+
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.utils.dateparse import parse_datetime
+
+from billing.benchmark import get_peak_rss_mb
+from wallet.constants import (
+    STATEMENT_FORMAT_CSV,
+    STATEMENT_FORMATS,
+)
+from wallet.models import Wallet
+from wallet.statement import (
+    get_statement_rows,
+    stream_statement,
+)
+
+
+class Command(BaseCommand):
+    """
+    Выгрузка выписки по кошельку в файл или stdout.
+
+    Выписка пишется по мере чтения из базы, в stderr выводятся строки в секунду и пиковая
+    память процесса.
+    """
+
+    help = 'Export wallet statement as CSV or NDJSON'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры выгрузки."""
+        parser.add_argument('wallet_id', help='wallet id')
+        parser.add_argument('--output', default='-', help='output file, - for stdout')
+        parser.add_argument(
+            '--export-format',
+            choices=STATEMENT_FORMATS,
+            default=STATEMENT_FORMAT_CSV,
+            help='statement format',
+        )
+        parser.add_argument('--gzip', action='store_true', help='compress statement')
+        parser.add_argument('--date-from', type=parse_datetime, help='ISO 8601 datetime')
+        parser.add_argument('--date-to', type=parse_datetime, help='ISO 8601 datetime')
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Запуск выгрузки."""
+        if not Wallet.objects.filter(pk=options['wallet_id']).exists():
+            raise CommandError(f'Wallet {options["wallet_id"]} not found')
+
+        rows = 0
+
+        def count_rows(statement_rows):
+            nonlocal rows
+            for row in statement_rows:
+                rows += 1
+                yield row
+
+        chunks = stream_statement(
+            rows=count_rows(
+                get_statement_rows(
+                    wallet_id=options['wallet_id'],
+                    date_from=options['date_from'],
+                    date_to=options['date_to'],
+                ),
+            ),
+            export_format=options['export_format'],
+            compress=options['gzip'],
+        )
+
+        started_at = perf_counter()
+        if options['output'] == '-':
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+        else:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        elapsed = perf_counter() - started_at
+
+        self.stderr.write(
+            f'{rows} rows in {elapsed:.2f} s, {rows / elapsed if elapsed else 0:.0f} rows/s, '
+            f'peak rss {get_peak_rss_mb():.1f} MB',
+        )
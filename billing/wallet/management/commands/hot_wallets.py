@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wallet.constants import (
+    HOT_WALLETS_ORDER_WAIT_MS,
+    HOT_WALLETS_ORDERINGS,
+)
+from wallet.hot_wallets import get_hot_wallets
+from wallet.models import Wallet
+
+
+class Command(BaseCommand):
+    """
+    Самые горячие кошельки за скользящее окно.
+
+    По каждому кошельку выводятся владелец, суммарное и среднее ожидание лока, число
+    переводов и таймаутов лока, переводы в секунду и средняя длина очереди к локу.
+    """
+
+    help = 'Show wallets with the most lock contention'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры выборки."""
+        parser.add_argument('--limit', type=int, default=10, help='number of wallets')
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=5 * 60,
+            help=f'window in seconds, at most {settings.WALLET_CONTENTION_MAX_WINDOW}',
+        )
+        parser.add_argument(
+            '--order-by',
+            choices=HOT_WALLETS_ORDERINGS,
+            default=HOT_WALLETS_ORDER_WAIT_MS,
+            help='metric to sort by',
+        )
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Вывод горячих кошельков."""
+        hot_wallets = get_hot_wallets(
+            limit=options['limit'],
+            window=options['window'],
+            order_by=options['order_by'],
+        )
+        owners = {
+            str(wallet_id): email
+            for wallet_id, email in Wallet.objects.filter(
+                pk__in=[hot_wallet['wallet_id'] for hot_wallet in hot_wallets],
+            ).values_list(
+                'pk',
+                'user__email',
+            )
+        }
+        for hot_wallet in hot_wallets:
+            wallet_id = hot_wallet['wallet_id']
+            self.stdout.write(
+                f'{wallet_id} ({owners.get(wallet_id, "deleted")}): '
+                f'wait {hot_wallet["wait_ms"]} ms (avg {hot_wallet["avg_wait_ms"]} ms), '
+                f'{hot_wallet["transfers"]} transfers ({hot_wallet["transfers_per_second"]}/s), '
+                f'{hot_wallet["timeouts"]} timeouts, queue depth {hot_wallet["queue_depth"]}',
+            )
+        if not hot_wallets:
+            self.stdout.write('no lock activity in the window')
@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    as_completed,
+)
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from wallet.reconciliation import (
+    get_partitions,
+    reconcile_partition,
+)
+
+
+class Command(BaseCommand):
+    """
+    Сверка балансов всех кошельков с суммами транзакций.
+
+    Все id кошельков делятся на диапазоны, каждый диапазон сверяется одним запросом
+    с GROUP BY в пуле процессов (у каждого процесса своё соединение с базой).
+    """
+
+    help = 'Reconcile balances of all wallets with the transaction ledger'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры сверки."""
+        parser.add_argument('--partitions', type=int, default=32, help='number of id ranges')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='worker processes, 1 - reconcile in the current process',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='rows per fetch/update')
+        parser.add_argument(
+            '--report-limit',
+            type=int,
+            default=20,
+            help='mismatches to print per partition',
+        )
+        parser.add_argument('--fix', action='store_true', help='fix mismatched balances')
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Запуск сверки."""
+        partitions = get_partitions(options['partitions'])
+        kwargs = {
+            'fix': options['fix'],
+            'batch_size': options['batch_size'],
+            'report_limit': options['report_limit'],
+        }
+        totals = {'checked': 0, 'mismatches': 0, 'fixed': 0}
+
+        started_at = perf_counter()
+        for result in self._run(partitions=partitions, workers=options['workers'], **kwargs):
+            for key in totals:
+                totals[key] += result[key]
+            for sample in result['samples']:
+                self.stdout.write(
+                    f'{sample["wallet"]}: balance {sample["balance"]}, '
+                    f'transactions {sample["transactions_sum"]}',
+                )
+        elapsed = perf_counter() - started_at
+
+        self.stdout.write(
+            f'checked {totals["checked"]} wallets in {elapsed:.1f} s '
+            f'({totals["checked"] / elapsed if elapsed else 0:.0f} rows/s), '
+            f'{totals["mismatches"]} mismatches, {totals["fixed"]} fixed',
+        )
+
+    def _run(self, partitions, workers: int, **kwargs):
+        """Результаты сверки диапазонов по мере готовности."""
+        if workers <= 1:
+            for lower, upper in partitions:
+                yield reconcile_partition(lower=lower, upper=upper, **kwargs)
+            return
+
+        # дочерние процессы не должны унаследовать открытое соединение родителя
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+        ) as executor:
+            futures = [
+                executor.submit(reconcile_partition, lower=lower, upper=upper, **kwargs)
+                for lower, upper in partitions
+            ]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,47 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from wallet.balance_cache import refresh_balances
+from wallet.balance_slots import set_slot_count
+from wallet.constants import MAX_BALANCE_SLOTS
+from wallet.models import Wallet
+
+
+class Command(BaseCommand):
+    """
+    Включение, изменение и отключение шардирования баланса горячего кошелька.
+
+    Пополнения кошелька с N слотами распределяются по N строкам, при уменьшении числа
+    слотов балансы удаляемых слотов переносятся в строку кошелька.
+    """
+
+    help = 'Split wallet balance into N slots to spread incoming payments'  # noqa: VNE003
+
+    def add_arguments(self, parser):
+        """Параметры шардирования."""
+        parser.add_argument('wallet_id', help='wallet id')
+        parser.add_argument(
+            '--slots',
+            type=int,
+            required=True,
+            help=f'number of balance slots, 0 disables sharding, at most {MAX_BALANCE_SLOTS}',
+        )
+
+    def handle(self, *args, **options):  # noqa: U100
+        """Изменение числа слотов."""
+        slot_count = options['slots']
+        if not 0 <= slot_count <= MAX_BALANCE_SLOTS:
+            raise CommandError(f'--slots must be between 0 and {MAX_BALANCE_SLOTS}')
+        try:
+            set_slot_count(wallet_id=options['wallet_id'], slot_count=slot_count)
+        except (Wallet.DoesNotExist, ValidationError):
+            raise CommandError('wallet not found')
+        refresh_balances([options['wallet_id']])
+
+        wallet = Wallet.objects.get(pk=options['wallet_id'])
+        self.stdout.write(
+            f'{wallet.pk}: {wallet.slot_count} slots, balance {wallet.get_total_balance()}',
+        )
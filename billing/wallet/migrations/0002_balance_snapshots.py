@@ -0,0 +1,46 @@
+# Generated by Django 3.2 on 2026-10-18 15:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletBalanceSnapshot',
+            fields=[
+                ('wallet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance_snapshot', serialize=False, to='wallet.wallet')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cutoff', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'wallet_balance_snapshots',
+            },
+        ),
+        # сначала составные индексы, затем удаляем заменённые ими индексы внешних ключей
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['payee', 'created_at'], name='transactions_payee_created'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['sender', 'created_at'], name='transactions_sender_created'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='payee',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='received_payments', to='wallet.wallet'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='sender',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sent_payments', to='wallet.wallet'),
+        ),
+    ]
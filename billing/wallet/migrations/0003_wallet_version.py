@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 16:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0002_balance_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
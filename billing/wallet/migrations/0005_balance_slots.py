@@ -0,0 +1,37 @@
+# Generated by Django 3.2 on 2026-10-18 16:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0004_transaction_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='slot_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='WalletBalanceSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_slots', to='wallet.wallet')),
+            ],
+            options={
+                'db_table': 'wallet_balance_slots',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='walletbalanceslot',
+            constraint=models.UniqueConstraint(fields=('wallet', 'slot'), name='wallet_balance_slots_wallet_slot'),
+        ),
+    ]
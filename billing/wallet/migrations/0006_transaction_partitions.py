@@ -0,0 +1,137 @@
+# Generated by Django 3.2 on 2026-10-18 16:48
+"""
+Секционирование таблицы транзакций по месяцам created_at (только PostgreSQL).
+
+Таблица пересоздаётся секционированной, и строки копируются в неё одной транзакцией,
+поэтому на большой таблице миграцию стоит запускать в окно обслуживания.
+Первичный ключ секционированной таблицы обязан включать created_at, а уникальность
+ключа идемпотентности переносится в таблицу transaction_idempotency_keys.
+"""
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+TABLE = 'transactions'
+
+
+def _add_months(month, count):
+    months = month.year * 12 + month.month - 1 + count
+    return month.replace(year=months // 12, month=months % 12 + 1)
+
+
+def _create_indexes(schema_editor, primary_key):
+    schema_editor.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({primary_key})',
+    )
+    for column in ('payee', 'sender'):
+        schema_editor.execute(
+            f'CREATE INDEX {TABLE}_{column}_created ON {TABLE} ({column}_id, created_at)',
+        )
+        schema_editor.execute(
+            f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_{column}_id_fk_wallets_id '
+            f'FOREIGN KEY ({column}_id) REFERENCES wallets (id) DEFERRABLE INITIALLY DEFERRED',
+        )
+
+
+def _drop_indexes(schema_editor, table):
+    schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {TABLE}_pkey')
+    for column in ('payee', 'sender'):
+        schema_editor.execute(f'DROP INDEX {TABLE}_{column}_created')
+
+
+def partition_transactions(apps, schema_editor):
+    schema_editor.execute(
+        'INSERT INTO transaction_idempotency_keys (key, transaction_id, created_at) '
+        f'SELECT idempotency_key, id, created_at FROM {TABLE} WHERE idempotency_key IS NOT NULL',
+    )
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy')
+    _drop_indexes(schema_editor, f'{TABLE}_legacy')
+    schema_editor.execute(
+        f'CREATE TABLE {TABLE} (LIKE {TABLE}_legacy INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE (created_at)',
+    )
+    _create_indexes(schema_editor, primary_key='id, created_at')
+    schema_editor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(created_at) FROM {TABLE}_legacy')
+        first_created_at = cursor.fetchone()[0]
+    now = timezone.now()
+    month = (first_created_at or now).astimezone(dt_timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0,
+    )
+    last_month = _add_months(
+        now.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+        settings.WALLET_TRANSACTION_PARTITIONS_AHEAD,
+    )
+    while month <= last_month:
+        schema_editor.execute(
+            f'CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} '
+            'FOR VALUES FROM (%s) TO (%s)',
+            [month, _add_months(month, 1)],
+        )
+        month = _add_months(month, 1)
+
+    schema_editor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_legacy')
+    schema_editor.execute(f'DROP TABLE {TABLE}_legacy')
+
+
+def unpartition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned')
+    _drop_indexes(schema_editor, f'{TABLE}_partitioned')
+    schema_editor.execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING DEFAULTS)')
+    _create_indexes(schema_editor, primary_key='id')
+    schema_editor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_partitioned')
+    schema_editor.execute(f'DROP TABLE {TABLE}_partitioned')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0005_balance_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('partition', models.CharField(max_length=63, unique=True)),
+                ('lower', models.DateTimeField()),
+                ('upper', models.DateTimeField()),
+                ('path', models.CharField(max_length=1000)),
+                ('rows', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'transaction_archives',
+                'ordering': ('lower',),
+            },
+        ),
+        migrations.CreateModel(
+            name='TransactionIdempotencyKey',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('transaction_id', models.UUIDField()),
+                ('created_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'transaction_idempotency_keys',
+            },
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(partition_transactions, unpartition_transactions),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0006_transaction_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wallet',
+            name='is_frozen',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-18 18:11
+
+from django.db import migrations, models
+import http
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0008_transaction_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionidempotencykey',
+            name='response_status',
+            field=models.PositiveSmallIntegerField(default=http.HTTPStatus['OK']),
+        ),
+    ]
@@ -1,8 +1,16 @@
+from wallet.models.balance_slot import WalletBalanceSlot
+from wallet.models.balance_snapshot import WalletBalanceSnapshot
+from wallet.models.idempotency_key import TransactionIdempotencyKey
 from wallet.models.transaction import Transaction
+from wallet.models.transaction_archive import TransactionArchive
 from wallet.models.wallet import Wallet
 
 
 __all__ = [
     'Transaction',
+    'TransactionArchive',
+    'TransactionIdempotencyKey',
     'Wallet',
+    'WalletBalanceSlot',
+    'WalletBalanceSnapshot',
 ]
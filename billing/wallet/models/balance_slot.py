@@ -0,0 +1,45 @@
+from django.db import models
+
+
+class WalletBalanceSlot(models.Model):
+    """
+    Часть баланса шардированного кошелька (Wallet.slot_count > 0).
+
+    Пополнения горячего кошелька распределяются по случайным слотам, поэтому не ждут
+    друг друга на блокировке одной строки. Баланс кошелька - сумма баланса в строке
+    кошелька и балансов всех его слотов.
+    """
+
+    wallet = models.ForeignKey(
+        'Wallet',
+        on_delete=models.CASCADE,
+        related_name='balance_slots',
+    )
+    # номер слота от 0 до Wallet.slot_count - 1
+    slot = models.PositiveSmallIntegerField()
+
+    balance = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+    )
+    # увеличивается при каждом изменении баланса слота, версия баланса кошелька
+    # складывается из версии кошелька и версий слотов
+    version = models.BigIntegerField(
+        default=0,
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'wallet_balance_slots'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('wallet', 'slot'),
+                name='wallet_balance_slots_wallet_slot',
+            ),
+        )
+
+    def __str__(self):
+        """Отображение в админке."""
+        return f'{self.wallet_id} #{self.slot}: {self.balance}'
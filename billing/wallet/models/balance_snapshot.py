@@ -0,0 +1,85 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+from wallet.models.transaction import Transaction
+
+
+class WalletBalanceSnapshot(models.Model):
+    """
+    Сверенный баланс кошелька на момент cutoff.
+
+    Баланс снимка равен сумме всех транзакций кошелька, созданных не позже cutoff,
+    поэтому при сверке достаточно досуммировать только транзакции после cutoff.
+    """
+
+    wallet = models.OneToOneField(
+        'Wallet',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='balance_snapshot',
+    )
+
+    # сумма транзакций кошелька по cutoff включительно
+    balance = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+    )
+    cutoff = models.DateTimeField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'wallet_balance_snapshots'
+
+    def __str__(self):
+        """Отображение в админке."""
+        return f'{self.wallet_id}: {self.balance} at {self.cutoff}'
+
+    @classmethod
+    def get_transactions_sum(cls, wallet_id) -> Decimal:
+        """
+        Сумма всех транзакций кошелька: баланс снимка плюс транзакции после него.
+
+        Снимок сдвигается вперёд до now - WALLET_BALANCE_SNAPSHOT_LAG. Более свежие транзакции
+        в снимок не попадают: транзакция, начатая раньше, может закоммититься позже
+        с меньшим created_at и не должна выпасть из сверки.
+
+        :param wallet_id: id кошелька
+        :return: сумма всех транзакций (актуальный баланс пользователя)
+        """
+        snapshot = cls.objects.filter(wallet_id=wallet_id).first()
+        since = snapshot.cutoff if snapshot else None
+        settled_balance = snapshot.balance if snapshot else Decimal(0)
+
+        cutoff = timezone.now() - timedelta(seconds=settings.WALLET_BALANCE_SNAPSHOT_LAG)
+        if since is None or cutoff > since:
+            settled_balance += Transaction.get_wallet_transactions_sum(
+                wallet_id=wallet_id,
+                since=since,
+                until=cutoff,
+            )
+            if snapshot is None:
+                # снимок мог создать параллельный запрос
+                cls.objects.update_or_create(
+                    wallet_id=wallet_id,
+                    defaults={
+                        'balance': settled_balance,
+                        'cutoff': cutoff,
+                    },
+                )
+            else:
+                snapshot.balance = settled_balance
+                snapshot.cutoff = cutoff
+                snapshot.save(update_fields=('balance', 'cutoff', 'updated_at'))
+            since = cutoff
+
+        return settled_balance + Transaction.get_wallet_transactions_sum(
+            wallet_id=wallet_id,
+            since=since,
+        )
@@ -0,0 +1,50 @@
+from http import HTTPStatus
+
+from django.db import models
+
+
+class TransactionIdempotencyKey(models.Model):
+    """
+    Ключ идемпотентности, с которым создана транзакция.
+
+    Таблица транзакций секционирована по месяцам, а уникальный индекс секционированной
+    таблицы обязан включать created_at, поэтому уникальность ключа проверяется здесь:
+    повтор запроса с тем же ключом не создаст вторую транзакцию.
+    """
+
+    # id пользователя и заголовок Idempotency-Key
+    key = models.CharField(
+        max_length=100,
+        primary_key=True,
+    )
+    # без внешнего ключа: на секционированную таблицу нельзя сослаться только по id
+    transaction_id = models.UUIDField()
+    # статус успешного ответа: 202 у пополнения, принятого в поток, иначе 200,
+    # по нему повтор, найденный только в базе, отдаёт тот же ответ
+    response_status = models.PositiveSmallIntegerField(default=HTTPStatus.OK)
+
+    created_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'transaction_idempotency_keys'
+
+    def __str__(self):
+        """Отображение в админке."""
+        return f'{self.key}: {self.transaction_id}'
+
+    @classmethod
+    def register(cls, transaction):
+        """
+        Сохранение ключа идемпотентности транзакции, если он есть.
+
+        Вызывается в той же транзакции базы, что и создание транзакции.
+
+        :param transaction: созданная транзакция
+        :raises IntegrityError: транзакция с этим ключом уже есть
+        """
+        if transaction.idempotency_key:
+            cls.objects.create(
+                key=transaction.idempotency_key,
+                transaction_id=transaction.pk,
+                created_at=transaction.created_at,
+            )
@@ -1,18 +1,27 @@
 import uuid
+from datetime import datetime
 from decimal import Decimal
+from typing import Optional
 
 from django.db import models
 from django.db.models import (
     Case,
     DecimalField,
     F,
+    Q,
     Sum,
     When,
 )
+from django.utils import timezone
 
 
 class Transaction(models.Model):
-    """Транзакции между пользователями."""
+    """
+    Транзакции между пользователями.
+
+    В PostgreSQL таблица секционирована по месяцам created_at (wallet.partitions),
+    первичный ключ в базе - (id, created_at).
+    """
 
     id = models.UUIDField(  # noqa:VNE003
         primary_key=True,
@@ -27,12 +36,16 @@ class Transaction(models.Model):
         related_name='sent_payments',
         blank=True,
         null=True,
+        # вместо отдельного индекса используется индекс (sender, created_at)
+        db_index=False,
     )
     # получатель средств
     payee = models.ForeignKey(
         'Wallet',
         on_delete=models.PROTECT,
         related_name='received_payments',
+        # вместо отдельного индекса используется индекс (payee, created_at)
+        db_index=False,
     )
 
     # сумма транзакции с точностью до цента и менее 100_000_000
@@ -51,7 +64,17 @@ class Transaction(models.Model):
         blank=True,
     )
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    # ключ идемпотентности запроса (id пользователя и заголовок Idempotency-Key),
+    # уникальность проверяется в TransactionIdempotencyKey
+    idempotency_key = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        editable=False,
+    )
+
+    # не auto_now_add: пакетное пополнение задаёт время не раньше приёма в поток
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -59,24 +82,49 @@ class Transaction(models.Model):
         ordering = (
             '-created_at',
         )
+        indexes = (
+            # для выборки транзакций кошелька после снимка баланса и выписки
+            models.Index(
+                fields=('payee', 'created_at'),
+                name='transactions_payee_created',
+            ),
+            models.Index(
+                fields=('sender', 'created_at'),
+                name='transactions_sender_created',
+            ),
+        )
 
     def __str__(self):
         """Отображение в админке."""
         return f'{self.sender} => {self.payee}: {self.amount}'
 
     @classmethod
-    def get_wallet_transactions_sum(cls, wallet_id: int) -> Decimal:
+    def get_wallet_transactions_sum(cls,
+                                    wallet_id: int,
+                                    since: Optional[datetime] = None,
+                                    until: Optional[datetime] = None) -> Decimal:
         """
-        Возвращает сумму всех транзакций на кошельке.
+        Возвращает сумму транзакций на кошельке.
 
-        Нужна для сверки баланса в кошельке с транзакциями.
+        Нужна для сверки баланса в кошельке с транзакциями. Выбираются только транзакции
+        кошелька по индексам (payee, created_at) и (sender, created_at).
 
         :param wallet_id: id кошелька
-        :return: сумма всех транзакций (актуальный баланс пользователя)
+        :param since: учитывать транзакции, созданные позже указанного времени
+        :param until: учитывать транзакции, созданные не позже указанного времени
+        :return: сумма транзакций (без since и until - актуальный баланс пользователя)
         """
+        transactions = cls.objects.filter(
+            Q(payee_id=wallet_id) | Q(sender_id=wallet_id),
+        )
+        if since is not None:
+            transactions = transactions.filter(created_at__gt=since)
+        if until is not None:
+            transactions = transactions.filter(created_at__lte=until)
+
         # из суммы транзакций, где кошелёк указан как получатель (payee) вычитаем
         # сумму транзакций, где этот же кошелёк указан как отправитель (sender)
-        return cls.objects.aggregate(
+        return transactions.aggregate(
             total=Sum(
                 Case(
                     When(payee_id=wallet_id, then=F('amount')),
@@ -0,0 +1,34 @@
+from django.db import models
+
+
+class TransactionArchive(models.Model):
+    """
+    Секция таблицы транзакций за месяц, выгруженная в архив и удалённая из базы.
+
+    Перед выгрузкой снимки балансов (WalletBalanceSnapshot) всех кошельков сдвигаются
+    на конец месяца, поэтому сверка балансов не нуждается в архивных транзакциях.
+    """
+
+    # имя удалённой секции
+    partition = models.CharField(
+        max_length=63,
+        unique=True,
+    )
+    # транзакции с created_at в [lower, upper)
+    lower = models.DateTimeField()
+    upper = models.DateTimeField()
+    # сжатый CSV с транзакциями секции
+    path = models.CharField(max_length=1000)
+    rows = models.BigIntegerField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'transaction_archives'
+        ordering = (
+            'lower',
+        )
+
+    def __str__(self):
+        """Отображение в админке."""
+        return f'{self.partition}: {self.rows} rows in {self.path}'
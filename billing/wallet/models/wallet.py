@@ -2,9 +2,14 @@ import uuid
 from decimal import Decimal
 
 from django.db import models
+from django.db.models import (
+    F,
+    Sum,
+)
+from django.utils import timezone
 
 from users.models import User
-from wallet.models import Transaction
+from wallet.models import WalletBalanceSnapshot
 
 
 class Wallet(models.Model):
@@ -26,6 +31,19 @@ class Wallet(models.Model):
         decimal_places=2,
         default=0,
     )
+    # увеличивается при каждом изменении баланса, по нему видно устаревший кэш баланса
+    version = models.BigIntegerField(
+        default=0,
+    )
+    # число слотов, по которым распределяются пополнения горячего кошелька
+    # (WalletBalanceSlot), 0 - весь баланс в строке кошелька
+    slot_count = models.PositiveSmallIntegerField(
+        default=0,
+    )
+    # замороженный кошелёк (пользователь деактивирован) не участвует в переводах и пополнениях
+    is_frozen = models.BooleanField(
+        default=False,
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -40,22 +58,43 @@ class Wallet(models.Model):
         """Отображение в админке."""
         return f'{self.user}: {self.balance}'
 
+    def get_slot_balance(self) -> Decimal:
+        """Часть баланса шардированного кошелька, лежащая в слотах."""
+        if not self.slot_count:
+            return Decimal(0)
+        return self.balance_slots.aggregate(total=Sum('balance'))['total'] or Decimal(0)
+
+    def get_total_balance(self) -> Decimal:
+        """Баланс кошелька: строка кошелька плюс слоты шардированного кошелька."""
+        return self.balance + self.get_slot_balance()
+
     def check_balance(self, update_balance: bool = False) -> Decimal:
         """
         Сверка баланса с суммой транзакций.
 
-        По опыту считать баланс каждый раз как сумму транзакций очень накладно.
+        По опыту считать баланс каждый раз как сумму транзакций очень накладно,
+        поэтому суммируются только транзакции после последнего снимка баланса
+        (WalletBalanceSnapshot), а снимок после сверки сдвигается вперёд. Баланс
+        шардированного кошелька складывается из строки кошелька и слотов.
         При необходимости метод обновляет баланс кошелька.
 
         :param update_balance: если передано True, то обновляет поле balance значением, полученным
                                из суммы всех транзакций.
         :return: разница между балансом в кошельке и суммой транзакций. Если 0 - суммы совпадают.
         """
-        transaction_balance = Transaction.get_wallet_transactions_sum(
+        transaction_balance = WalletBalanceSnapshot.get_transactions_sum(
             wallet_id=self.pk,
         )
-        diff_amount = self.balance - transaction_balance
+        slot_balance = self.get_slot_balance()
+        diff_amount = self.balance + slot_balance - transaction_balance
         if diff_amount and update_balance:
-            self.balance = transaction_balance
-            self.save()
+            # слоты не меняются, исправляется баланс в строке кошелька
+            self.balance = transaction_balance - slot_balance
+            Wallet.objects.filter(
+                pk=self.pk,
+            ).update(
+                balance=self.balance,
+                version=F('version') + 1,
+                updated_at=timezone.now(),
+            )
         return diff_amount
@@ -0,0 +1,136 @@
+"""Постраничная выдача по ключу (created_at, id) без OFFSET и COUNT(*)."""
+import base64
+import binascii
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import (
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from django.db.models import (
+    Q,
+    QuerySet,
+)
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Выдача по курсору: следующая страница начинается после последней строки предыдущей.
+
+    Строки упорядочены по (created_at, id) по убыванию, курсор хранит ключ последней строки
+    страницы. Страница выбирается условием на ключ по индексу, поэтому глубокие страницы
+    стоят столько же, сколько первая, а общее количество строк не считается.
+
+    Можно передать несколько querysets (например, входящие и исходящие транзакции, каждая
+    по своему индексу): каждый ограничивается размером страницы, а результаты сливаются
+    через UNION ALL.
+    """
+
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self,
+                          queryset: Union[QuerySet, Sequence[QuerySet]],
+                          request,
+                          view=None) -> List:  # noqa: U100
+        """
+        Строки одной страницы.
+
+        :param queryset: queryset или несколько querysets одной модели без пересечений
+        :param request: запрос с параметрами cursor и limit
+        :param view: представление (не используется)
+        :return: строки страницы
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        querysets = [queryset] if isinstance(queryset, QuerySet) else list(queryset)
+        if position is not None:
+            querysets = [
+                branch.filter(self.get_position_filter(position))
+                for branch in querysets
+            ]
+        # лишняя строка показывает, есть ли следующая страница
+        querysets = [branch.order_by(*self.ordering)[:page_size + 1] for branch in querysets]
+        if len(querysets) > 1:
+            page_queryset = querysets[0].union(*querysets[1:], all=True)
+            rows = list(page_queryset.order_by(*self.ordering)[:page_size + 1])
+        else:
+            rows = list(querysets[0])
+
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    @staticmethod
+    def get_position_filter(position: Tuple[datetime, uuid.UUID]) -> Q:
+        """
+        Строки после курсора в порядке (created_at, id) по убыванию.
+
+        Условие created_at <= курсора дублирует первую часть сравнения, чтобы
+        база начала чтение индекса (кошелёк, created_at) сразу с позиции курсора.
+        """
+        created_at, row_id = position
+        return Q(created_at__lte=created_at) & (
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id)
+        )
+
+    def get_page_size(self, request) -> int:
+        """Размер страницы из параметра limit, но не больше max_page_size."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request) -> Optional[Tuple[datetime, uuid.UUID]]:
+        """Ключ последней строки предыдущей страницы из параметра cursor."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created_at, row_id = base64.urlsafe_b64decode(
+                encoded.encode('ascii'),
+            ).decode('ascii').split('|')
+            return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+    @staticmethod
+    def encode_cursor(row) -> str:
+        """Курсор на строку."""
+        return base64.urlsafe_b64encode(
+            f'{row.created_at.isoformat()}|{row.id}'.encode('ascii'),
+        ).decode('ascii')
+
+    def get_next_link(self) -> Optional[str]:
+        """Ссылка на следующую страницу."""
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1]),
+        )
+
+    def get_paginated_response(self, data) -> Response:
+        """Ответ со строками страницы и ссылкой на следующую."""
+        return Response(OrderedDict((
+            ('next', self.get_next_link()),
+            ('results', data),
+        )))
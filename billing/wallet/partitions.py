@@ -0,0 +1,263 @@
+"""
+Секционирование таблицы транзакций по месяцам created_at (только PostgreSQL).
+
+Каждый месяц хранится в своей секции transactions_pYYYY_MM, поэтому индексы и автовакуум
+работают с одним месяцем, а запросы с условием на created_at (история кошелька, выписка,
+сверка после снимков балансов) читают только секции нужных месяцев. Строки без секции
+своего месяца попадают в секцию по умолчанию и переносятся в секцию месяца при её
+создании. Секции создаются заранее на WALLET_TRANSACTION_PARTITIONS_AHEAD месяцев
+после каждого migrate и командой create_transaction_partitions (по расписанию).
+
+Старые месяцы выгружаются в сжатые CSV командой archive_transactions: секция выгружается,
+затем снимки балансов кошельков сдвигаются на конец месяца, секция отсоединяется и удаляется.
+"""
+import gzip
+import os
+from datetime import (
+    datetime,
+    timedelta,
+)
+from datetime import timezone as dt_timezone
+from typing import (
+    List,
+    Optional,
+)
+
+from django.conf import settings
+from django.db import (
+    connection,
+    transaction,
+)
+from django.db.models import Max
+from django.utils import timezone
+
+from wallet.models import (
+    Transaction,
+    TransactionArchive,
+    TransactionIdempotencyKey,
+    WalletBalanceSnapshot,
+)
+
+
+TABLE = Transaction._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+# нижняя граница created_at, если архивов ещё нет
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Сдвиг существующих снимков балансов на until: к балансу снимка добавляются транзакции
+# кошелька после cutoff снимка и не позже until (по индексам (payee, created_at)
+# и (sender, created_at)).
+ADVANCE_SNAPSHOTS_SQL = f"""
+UPDATE {WalletBalanceSnapshot._meta.db_table} AS snapshot
+SET balance = snapshot.balance
+        + COALESCE((
+            SELECT SUM(amount) FROM {TABLE}
+            WHERE payee_id = snapshot.wallet_id
+                AND created_at > snapshot.cutoff AND created_at <= %(until)s
+        ), 0)
+        - COALESCE((
+            SELECT SUM(amount) FROM {TABLE}
+            WHERE sender_id = snapshot.wallet_id
+                AND created_at > snapshot.cutoff AND created_at <= %(until)s
+        ), 0),
+    cutoff = %(until)s,
+    updated_at = %(now)s
+WHERE snapshot.cutoff < %(until)s
+"""  # noqa: S608 имена таблиц берутся из моделей, значения передаются параметрами
+
+# Снимки на until для кошельков с транзакциями не позже until и без снимка.
+# Снимок, созданный параллельной сверкой, уже не раньше until и остаётся как есть.
+CREATE_SNAPSHOTS_SQL = f"""
+INSERT INTO {WalletBalanceSnapshot._meta.db_table} (
+    wallet_id, balance, cutoff, created_at, updated_at
+)
+SELECT moves.wallet_id, SUM(moves.amount), %(until)s, %(now)s, %(now)s
+FROM (
+    SELECT payee_id AS wallet_id, amount
+    FROM {TABLE}
+    WHERE created_at <= %(until)s
+    UNION ALL
+    SELECT sender_id, -amount
+    FROM {TABLE}
+    WHERE created_at <= %(until)s AND sender_id IS NOT NULL
+) AS moves
+WHERE NOT EXISTS (
+    SELECT 1 FROM {WalletBalanceSnapshot._meta.db_table} AS snapshot
+    WHERE snapshot.wallet_id = moves.wallet_id
+)
+GROUP BY moves.wallet_id
+ON CONFLICT (wallet_id) DO NOTHING
+"""  # noqa: S608 имена таблиц берутся из моделей, значения передаются параметрами
+
+
+def get_month(value: datetime) -> datetime:
+    """Начало месяца (UTC), в который попадает момент времени."""
+    value = value.astimezone(dt_timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    """Начало месяца через count месяцев после month."""
+    months = month.year * 12 + month.month - 1 + count
+    return month.replace(year=months // 12, month=months % 12 + 1)
+
+
+def get_partition_name(month: datetime) -> str:
+    """Имя секции транзакций месяца."""
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def is_partitioned() -> bool:
+    """Таблица транзакций секционирована (после миграции на PostgreSQL)."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def get_partitions() -> List[str]:
+    """Имена секций месяцев по возрастанию, без секции по умолчанию."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s) AND child.relname <> %s
+            ORDER BY child.relname
+            """,
+            [TABLE, DEFAULT_PARTITION],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def create_partition(month: datetime) -> bool:
+    """
+    Создание секции месяца.
+
+    Строки месяца из секции по умолчанию переносятся в новую секцию, иначе postgres
+    не даст её присоединить.
+
+    :param month: начало месяца
+    :return: секция создана (False - уже была)
+    """
+    name = get_partition_name(month)
+    bounds = [month, add_months(month, 1)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} '  # noqa: S608
+            'WHERE created_at >= %s AND created_at < %s)',
+            bounds,
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                bounds,
+            )
+            return True
+
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '  # noqa: S608
+            'WHERE created_at >= %s AND created_at < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            bounds,
+        )
+        cursor.execute(
+            f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)',
+            bounds,
+        )
+    return True
+
+
+def create_partitions(months_ahead: Optional[int] = None,
+                      since: Optional[datetime] = None) -> List[str]:
+    """
+    Создание недостающих секций от месяца since до текущего месяца + months_ahead.
+
+    :param months_ahead: на сколько месяцев вперёд, по умолчанию
+                         WALLET_TRANSACTION_PARTITIONS_AHEAD
+    :param since: первый месяц, по умолчанию текущий
+    :return: имена созданных секций
+    """
+    if months_ahead is None:
+        months_ahead = settings.WALLET_TRANSACTION_PARTITIONS_AHEAD
+    month = get_month(since or timezone.now())
+    last_month = add_months(get_month(timezone.now()), months_ahead)
+    created = []
+    while month <= last_month:
+        if create_partition(month):
+            created.append(get_partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def advance_snapshots(until: datetime):
+    """
+    Сдвиг снимков балансов всех кошельков с транзакциями не позже until на until.
+
+    После этого сверка балансов не читает транзакции раньше until.
+    """
+    params = {'until': until, 'now': timezone.now()}
+    with connection.cursor() as cursor:
+        cursor.execute(ADVANCE_SNAPSHOTS_SQL, params)
+        cursor.execute(CREATE_SNAPSHOTS_SQL, params)
+
+
+def get_archived_until() -> datetime:
+    """Конец последнего выгруженного в архив месяца: раньше него транзакций в базе нет."""
+    return TransactionArchive.objects.aggregate(upper=Max('upper'))['upper'] or EPOCH
+
+
+def archive_partition(month: datetime, directory: str) -> TransactionArchive:
+    """
+    Выгрузка секции месяца в сжатый CSV и её удаление из базы.
+
+    Секция выгружается в directory/<секция>.csv.gz до любых блокировок: месяц закрыт,
+    новых строк в нём не будет, а COPY берёт только ACCESS SHARE и не мешает переводам.
+    Затем одной короткой транзакцией снимки балансов сдвигаются на конец месяца,
+    удаляются ключи идемпотентности транзакций до конца месяца, секция отсоединяется
+    и удаляется. ACCESS EXCLUSIVE на таблице транзакций держится только от DETACH
+    до коммита. При ошибке секция остаётся, а повторный запуск перезапишет файл.
+
+    :param month: начало месяца
+    :param directory: каталог архива
+    :return: запись об архиве
+    :raises ValueError: месяц ещё может получить транзакции
+    """
+    lower, upper = month, add_months(month, 1)
+    if upper > timezone.now() - timedelta(seconds=settings.WALLET_BALANCE_SNAPSHOT_LAG):
+        raise ValueError(f'{month:%Y-%m} is not closed yet')
+
+    name = get_partition_name(month)
+    path = os.path.join(directory, f'{name}.csv.gz')
+    os.makedirs(directory, exist_ok=True)
+    # строки месяца из секции по умолчанию тоже попадут в архив
+    create_partition(month)
+    with connection.cursor() as cursor:
+        with gzip.open(f'{path}.tmp', 'wt') as archive:
+            cursor.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', archive)
+        rows = cursor.rowcount
+    os.replace(f'{path}.tmp', path)
+
+    # DETACH CONCURRENTLY (PostgreSQL 14+) нельзя выполнить в транзакции, а без неё
+    # при ошибке осталась бы отсоединённая, но не удалённая секция
+    with transaction.atomic():
+        advance_snapshots(until=upper)
+        TransactionIdempotencyKey.objects.filter(created_at__lt=upper).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            cursor.execute(f'DROP TABLE {name}')
+        return TransactionArchive.objects.create(
+            partition=name,
+            lower=lower,
+            upper=upper,
+            path=path,
+            rows=rows,
+        )
@@ -0,0 +1,165 @@
+"""Сверка балансов всех кошельков с суммами транзакций."""
+import uuid
+from decimal import Decimal
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+from django.db import (
+    connection,
+    transaction,
+)
+
+from wallet.balance_cache import refresh_balances_on_commit
+from wallet.models import (
+    Transaction,
+    Wallet,
+    WalletBalanceSlot,
+    WalletBalanceSnapshot,
+)
+from wallet.partitions import get_archived_until
+from wallet.transfer_engine import apply_balance_deltas
+
+
+# Кошельки диапазона id, у которых баланс не совпадает с суммой транзакций.
+# Сумма транзакций кошелька - баланс его снимка (WalletBalanceSnapshot) плюс транзакции
+# после cutoff снимка. Зачисления и списания всех кошельков диапазона суммируются одним
+# GROUP BY, оба поиска по диапазону id идут по индексам (payee, created_at)
+# и (sender, created_at), а условие created_at > %(since)s (конец выгруженных в архив
+# месяцев) отсекает секции таблицы транзакций, целиком покрытые снимками.
+# К балансу шардированного кошелька добавляется сумма его слотов.
+# Балансы и транзакции читаются в одном снимке базы, поэтому параллельные переводы
+# не дают ложных расхождений.
+RECONCILE_SQL = f"""
+SELECT
+    wallet.id,
+    wallet.balance + COALESCE(slots.total, 0),
+    COALESCE(snapshot.balance, 0) + COALESCE(ledger.total, 0)
+FROM {Wallet._meta.db_table} AS wallet
+LEFT JOIN {WalletBalanceSnapshot._meta.db_table} AS snapshot ON snapshot.wallet_id = wallet.id
+LEFT JOIN (
+    SELECT wallet_id, SUM(balance) AS total
+    FROM {WalletBalanceSlot._meta.db_table}
+    WHERE wallet_id BETWEEN %(lower)s AND %(upper)s
+    GROUP BY wallet_id
+) AS slots ON slots.wallet_id = wallet.id
+LEFT JOIN (
+    SELECT moves.wallet_id, SUM(moves.amount) AS total
+    FROM (
+        SELECT payee_id AS wallet_id, amount, created_at
+        FROM {Transaction._meta.db_table}
+        WHERE payee_id BETWEEN %(lower)s AND %(upper)s AND created_at > %(since)s
+        UNION ALL
+        SELECT sender_id, -amount, created_at
+        FROM {Transaction._meta.db_table}
+        WHERE sender_id BETWEEN %(lower)s AND %(upper)s AND created_at > %(since)s
+    ) AS moves
+    LEFT JOIN {WalletBalanceSnapshot._meta.db_table} AS snapshot
+        ON snapshot.wallet_id = moves.wallet_id
+    WHERE snapshot.cutoff IS NULL OR moves.created_at > snapshot.cutoff
+    GROUP BY moves.wallet_id
+) AS ledger ON ledger.wallet_id = wallet.id
+WHERE wallet.id BETWEEN %(lower)s AND %(upper)s
+    AND wallet.balance + COALESCE(slots.total, 0)
+        <> COALESCE(snapshot.balance, 0) + COALESCE(ledger.total, 0)
+"""  # noqa: S608 имена таблиц берутся из моделей, значения передаются параметрами
+
+
+def get_partitions(count: int) -> List[Tuple[uuid.UUID, uuid.UUID]]:
+    """
+    Разбиение всех id кошельков на равные диапазоны.
+
+    id кошельков - случайные uuid4, поэтому диапазоны равной ширины содержат примерно
+    одинаковое число кошельков, как при разбиении по хешу, но ищутся по индексам.
+
+    :param count: число диапазонов
+    :return: границы диапазонов включительно
+    """
+    max_id = 2 ** 128
+    return [
+        (
+            uuid.UUID(int=max_id * number // count),
+            uuid.UUID(int=max_id * (number + 1) // count - 1),
+        )
+        for number in range(count)
+    ]
+
+
+def fix_balances(deltas: Dict[uuid.UUID, Decimal]) -> int:
+    """
+    Исправление балансов на величину расхождения.
+
+    Баланс сдвигается на расхождение, а не записывается целиком: перевод, прошедший
+    после сверки, меняет и баланс, и сумму транзакций, и не будет затёрт.
+
+    :param deltas: на сколько изменить баланс по id кошелька
+    :return: число исправленных кошельков
+    """
+    with transaction.atomic():
+        # строки блокируются в порядке id, как и при переводах
+        wallet_ids = list(
+            Wallet.objects.select_for_update().filter(
+                pk__in=deltas.keys(),
+            ).order_by(
+                'pk',
+            ).values_list(
+                'pk',
+                flat=True,
+            ),
+        )
+        apply_balance_deltas(deltas={wallet_id: deltas[wallet_id] for wallet_id in wallet_ids})
+        refresh_balances_on_commit(*wallet_ids)
+    return len(wallet_ids)
+
+
+def reconcile_partition(lower: uuid.UUID,
+                        upper: uuid.UUID,
+                        fix: bool = False,
+                        batch_size: int = 1000,
+                        report_limit: int = 20) -> Dict:
+    """
+    Сверка кошельков из диапазона id.
+
+    Расхождения читаются серверным курсором пачками по batch_size, поэтому память
+    не зависит от числа кошельков. При fix каждая пачка исправляется одним UPDATE.
+
+    :param lower: начало диапазона id включительно
+    :param upper: конец диапазона id включительно
+    :param fix: исправить балансы по сумме транзакций
+    :param batch_size: размер пачки при чтении и исправлении
+    :param report_limit: сколько расхождений вернуть для отчёта
+    :return: число проверенных кошельков, расхождений, исправленных кошельков и примеры расхождений
+    """
+    result = {
+        'checked': Wallet.objects.filter(pk__range=(lower, upper)).count(),
+        'mismatches': 0,
+        'fixed': 0,
+        'samples': [],
+    }
+
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(
+            RECONCILE_SQL,
+            {'lower': lower, 'upper': upper, 'since': get_archived_until()},
+        )
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            result['mismatches'] += len(rows)
+            for wallet_id, balance, ledger_balance in rows[:report_limit - len(result['samples'])]:
+                result['samples'].append({
+                    'wallet': str(wallet_id),
+                    'balance': str(balance),
+                    'transactions_sum': str(ledger_balance),
+                })
+            if fix:
+                result['fixed'] += fix_balances(
+                    deltas={
+                        wallet_id: ledger_balance - balance
+                        for wallet_id, balance, ledger_balance in rows
+                    },
+                )
+            rows = cursor.fetchmany(batch_size)
+
+    return result
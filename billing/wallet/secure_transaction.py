@@ -1,21 +1,56 @@
 import os
+import random
 import string
+import threading
+import uuid
+from contextlib import (
+    ExitStack,
+    contextmanager,
+)
+from functools import wraps
+from logging import getLogger
+from time import (
+    perf_counter,
+    sleep,
+)
 from time import time as current_time
+from typing import (
+    Callable,
+    ContextManager,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+)
 
+from django.conf import settings
+from django.db import (
+    OperationalError,
+    connection,
+    transaction,
+)
 from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
 from redis import (
     Redis,
-    StrictRedis,
+    RedisError,
 )
 
+from billing.metrics import (
+    STAGE_LOCK_WAIT,
+    STAGE_TRANSACTION,
+    observe_stage,
+    stage_timer,
+)
+from billing.redis_pool import get_redis_client
+
+
+logger = getLogger(__name__)
+
 
 def get_redis() -> Redis:
-    """Получаем объект редиса с конфигурациями из окружения."""
-    return StrictRedis(
-        host=os.getenv('REDIS_HOST'),
-        port=os.getenv('REDIS_PORT', 6389),
-        decode_responses=True,
-    )
+    """Получаем клиент редиса поверх общего для процесса пула соединений."""
+    return get_redis_client()
 
 
 def generate_unique_value() -> str:
@@ -41,3 +76,514 @@ def get_full_key(wallet_id: int) -> str:
     :return: полный ключ для редиса
     """
     return f'tr_lock_{wallet_id}'
+
+
+class LockBackendUnavailable(Exception):
+    """Хранилище локов недоступно, можно попробовать запасной бэкенд."""
+
+
+class WalletLockTimeout(Exception):
+    """Кошельки заняты дольше WALLET_LOCK_ACQUIRE_TIMEOUT секунд."""
+
+    def __init__(self, wallet_ids: List[uuid.UUID]):
+        super().__init__('wallet is busy')
+        self.wallet_ids = wallet_ids
+        # через сколько секунд клиенту стоит повторить запрос
+        self.retry_after = settings.WALLET_LOCK_RETRY_AFTER
+
+
+def get_stats_key(wallet_id: uuid.UUID) -> str:
+    """Ключ в редисе со статистикой ожидания лока кошелька."""
+    return f'tr_lock_stats_{wallet_id}'
+
+
+def get_window_key(metric: str, bucket: int) -> str:
+    """
+    Ключ в редисе с метрикой всех кошельков за интервал WALLET_CONTENTION_BUCKET секунд.
+
+    :param metric: wait_ms, transfers или timeouts
+    :param bucket: номер интервала от начала эпохи
+    :return: ключ сортированного множества id кошелька -> значение метрики
+    """
+    return f'tr_lock_window_{metric}_{bucket}'
+
+
+def get_current_bucket() -> int:
+    """Номер текущего интервала скользящего окна статистики локов."""
+    return int(current_time() // settings.WALLET_CONTENTION_BUCKET)
+
+
+class WalletLockStats:
+    """
+    Статистика ожидания локов по кошелькам: по ней видно, какие кошельки горячие.
+
+    Накопленная статистика кошелька (get) пишется только для ожиданий дольше
+    WALLET_LOCK_CONTENTION_THRESHOLD и таймаутов. Для поиска горячих кошельков
+    (wallet.hot_wallets) ожидания, таймауты и число переводов дополнительно пишутся
+    в сортированные множества по интервалам времени, из которых складывается скользящее
+    окно. Переводы со свободными кошельками записываются только с вероятностью
+    WALLET_CONTENTION_SAMPLE_RATE и с весом 1 / WALLET_CONTENTION_SAMPLE_RATE, чтобы
+    не делать лишний запрос в редис на каждый перевод.
+    Статистика не должна ломать переводы: ошибки редиса только логируются,
+    а запись после ошибки приостанавливается на pause секунд.
+    """
+
+    # статистика кошелька удаляется через сутки после последнего ожидания
+    ttl = 24 * 60 * 60
+    pause = 30
+
+    def __init__(self):
+        self._paused_until = 0
+
+    def record(self, wallet_ids: List[uuid.UUID], wait_time: float, is_timeout: bool = False):
+        """
+        Запись ожидания лока.
+
+        :param wallet_ids: id кошельков, лок на которые ждали
+        :param wait_time: время ожидания в секундах
+        :param is_timeout: лок так и не был получен
+        """
+        is_contended = is_timeout or wait_time >= settings.WALLET_LOCK_CONTENTION_THRESHOLD
+        weight = 1
+        if not is_contended:
+            sample_rate = settings.WALLET_CONTENTION_SAMPLE_RATE
+            if random.random() >= sample_rate:  # noqa: S311
+                return
+            weight = 1 / sample_rate
+        if current_time() < self._paused_until:
+            return
+
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            if is_contended:
+                for wallet_id in wallet_ids:
+                    key = get_stats_key(wallet_id=wallet_id)
+                    pipeline.hincrby(key, 'contended', 1)
+                    pipeline.hincrbyfloat(key, 'wait_ms', wait_time * 1000)
+                    if is_timeout:
+                        pipeline.hincrby(key, 'timeouts', 1)
+                    pipeline.expire(key, self.ttl)
+            self._record_window(
+                pipeline=pipeline,
+                wallet_ids=wallet_ids,
+                wait_time=wait_time,
+                is_timeout=is_timeout,
+                weight=weight,
+            )
+            pipeline.execute()
+        except RedisError:
+            self._paused_until = current_time() + self.pause
+            logger.warning('Failed to record wallet lock stats', exc_info=True)
+
+    @staticmethod
+    def _record_window(pipeline,
+                       wallet_ids: List[uuid.UUID],
+                       wait_time: float,
+                       is_timeout: bool,
+                       weight: float):
+        """Запись в текущий интервал скользящего окна."""
+        bucket = get_current_bucket()
+        # интервал нужен, пока входит в самое длинное окно
+        ttl = settings.WALLET_CONTENTION_MAX_WINDOW + settings.WALLET_CONTENTION_BUCKET
+        metrics = {'wait_ms': wait_time * 1000 * weight}
+        metrics['timeouts' if is_timeout else 'transfers'] = weight
+        for metric, amount in metrics.items():
+            key = get_window_key(metric=metric, bucket=bucket)
+            for wallet_id in wallet_ids:
+                pipeline.zincrby(key, amount, str(wallet_id))
+            pipeline.expire(key, int(ttl))
+
+    def get(self, wallet_id: uuid.UUID) -> Dict[str, float]:
+        """
+        Статистика ожидания лока кошелька.
+
+        :param wallet_id: id кошелька
+        :return: число ожиданий, таймаутов и суммарное время ожидания в миллисекундах
+        """
+        stats = get_redis().hgetall(get_stats_key(wallet_id=wallet_id))
+        return {
+            'contended': int(stats.get('contended', 0)),
+            'timeouts': int(stats.get('timeouts', 0)),
+            'wait_ms': float(stats.get('wait_ms', 0)),
+        }
+
+
+lock_stats = WalletLockStats()
+
+
+class LeaseRenewer:
+    """
+    Продление локов в редисе, пока их владелец проводит перевод.
+
+    Один фоновый поток на процесс раз в WALLET_LOCK_RENEW_INTERVAL секунд продлевает
+    все взятые процессом локи. Перевод обычно короче интервала, поэтому продление почти
+    не добавляет запросов в редис, а лок упавшего воркера истекает через WALLET_LOCK_LEASE.
+    """
+
+    # продлеваем только свои ключи: истёкший лок мог уже взять другой перевод
+    renew_script = """
+        local renewed = 0
+        for _, key in ipairs(KEYS) do
+            if redis.call('get', key) == ARGV[1] then
+                renewed = renewed + redis.call('pexpire', key, ARGV[2])
+            end
+        end
+        return renewed
+    """
+
+    def __init__(self):
+        self._leases: Dict[str, List[str]] = {}
+        self._guard = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+
+    def add(self, token: str, keys: List[str]):
+        """Начать продление лока."""
+        with self._guard:
+            if self._pid != os.getpid():
+                # после fork локи родителя продлевает родитель, а поток не копируется
+                self._pid = os.getpid()
+                self._leases = {}
+                self._thread = None
+            self._leases[token] = keys
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='wallet-lock-renewer',
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def remove(self, token: str):
+        """Закончить продление лока."""
+        with self._guard:
+            self._leases.pop(token, None)
+
+    def renew_all(self):
+        """Продление всех взятых процессом локов на WALLET_LOCK_LEASE."""
+        with self._guard:
+            leases = list(self._leases.items())
+        if not leases:
+            return
+
+        lease_ms = int(settings.WALLET_LOCK_LEASE * 1000)
+        renew = get_redis().register_script(self.renew_script)
+        for token, keys in leases:
+            try:
+                renewed = renew(keys=keys, args=[token, lease_ms])
+            except RedisError:
+                logger.warning('Failed to renew wallet lock', exc_info=True)
+                continue
+            if renewed < len(keys) and token in self._leases:
+                logger.error('Wallet lock lease expired before renewal', extra={'keys': keys})
+
+    def _run(self):
+        while True:
+            sleep(settings.WALLET_LOCK_RENEW_INTERVAL)
+            self.renew_all()
+
+
+lease_renewer = LeaseRenewer()
+
+
+class BaseWalletLock:
+    """
+    Базовый бэкенд блокировки кошельков.
+
+    Лок нужен, чтобы с кошелька не прошло двух параллельных списаний. Кошельки всегда
+    блокируются в одном порядке (по возрастанию id), чтобы встречные переводы не ждали
+    друг друга бесконечно. Занятые кошельки ждём не дольше WALLET_LOCK_ACQUIRE_TIMEOUT,
+    чтобы запросы к горячему кошельку не занимали все воркеры.
+    """
+
+    def atomic(self, *wallet_ids) -> ContextManager:
+        """
+        Транзакция в базе под локом кошельков.
+
+        Лок берётся до начала транзакции и отпускается после её коммита, чтобы следующий
+        перевод с кошелька увидел уже обновлённый баланс.
+
+        :param wallet_ids: id блокируемых кошельков
+        :raises WalletLockTimeout: кошельки не освободились за WALLET_LOCK_ACQUIRE_TIMEOUT
+        """
+        return self._atomic(self.sort_wallet_ids(wallet_ids))
+
+    @staticmethod
+    def sort_wallet_ids(wallet_ids) -> List[uuid.UUID]:
+        """Уникальные id кошельков в порядке взятия локов."""
+        return sorted(set(wallet_ids), key=str)
+
+    @contextmanager
+    def _atomic(self, wallet_ids: List[uuid.UUID]) -> Iterator[None]:
+        with self._lock(wallet_ids):
+            with stage_timer(STAGE_TRANSACTION), transaction.atomic():
+                yield
+
+    @contextmanager
+    def _lock(self, wallet_ids: List[uuid.UUID]) -> Iterator[None]:
+        """Лок на кошельки в переданном порядке с записью времени ожидания."""
+        started_at = perf_counter()
+        try:
+            release = self._acquire(wallet_ids, timeout=settings.WALLET_LOCK_ACQUIRE_TIMEOUT)
+        except WalletLockTimeout:
+            logger.warning('Wallet lock timeout', extra={'wallet_ids': wallet_ids})
+            lock_stats.record(wallet_ids, perf_counter() - started_at, is_timeout=True)
+            observe_stage(STAGE_LOCK_WAIT, perf_counter() - started_at)
+            raise
+        lock_stats.record(wallet_ids, perf_counter() - started_at)
+        observe_stage(STAGE_LOCK_WAIT, perf_counter() - started_at)
+
+        try:
+            yield
+        finally:
+            release()
+
+    def _acquire(self,
+                 wallet_ids: List[uuid.UUID],  # noqa: U100
+                 timeout: float) -> Callable[[], None]:  # noqa: U100
+        """
+        Захват локов на кошельки.
+
+        :param wallet_ids: id кошельков в порядке взятия локов
+        :param timeout: сколько секунд ждать занятые кошельки
+        :return: функция освобождения локов
+        :raises WalletLockTimeout: кошельки не освободились за timeout секунд
+        """
+        raise NotImplementedError
+
+
+class RedisWalletLock(BaseWalletLock):
+    """
+    Лок в редисе, общий для всех воркеров и серверов.
+
+    Все кошельки блокируются одним lua скриптом: либо берутся все ключи, либо ни одного,
+    поэтому два перевода не могут захватить по одному кошельку и ждать друг друга.
+    Пока кошельки заняты, попытка повторяется с небольшой растущей паузой.
+    Ключи ставятся с временем жизни и продлеваются, пока идёт перевод (LeaseRenewer).
+    """
+
+    # все ключи свободны - ставим их все со значением-токеном владельца и временем жизни
+    acquire_script = """
+        for _, key in ipairs(KEYS) do
+            if redis.call('exists', key) == 1 then
+                return 0
+            end
+        end
+        for _, key in ipairs(KEYS) do
+            redis.call('set', key, ARGV[1], 'PX', ARGV[2])
+        end
+        return 1
+    """
+    # удаляем только свои ключи, чтобы не снять чужой лок
+    release_script = """
+        local released = 0
+        for _, key in ipairs(KEYS) do
+            if redis.call('get', key) == ARGV[1] then
+                released = released + redis.call('del', key)
+            end
+        end
+        return released
+    """
+
+    # пауза между попытками взять лок, секунды
+    retry_delay = 0.001
+    max_retry_delay = 0.02
+
+    def _acquire(self, wallet_ids: List[uuid.UUID], timeout: float) -> Callable[[], None]:
+        redis_client = get_redis()
+        keys = [get_full_key(wallet_id=wallet_id) for wallet_id in wallet_ids]
+        token = generate_unique_value()
+        lease_ms = int(settings.WALLET_LOCK_LEASE * 1000)
+        deadline = perf_counter() + timeout
+
+        delay = self.retry_delay
+        try:
+            acquire = redis_client.register_script(self.acquire_script)
+            while not acquire(keys=keys, args=[token, lease_ms]):
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    raise WalletLockTimeout(wallet_ids)
+                sleep(min(delay * random.uniform(0.5, 1.5), remaining))  # noqa: S311
+                delay = min(delay * 2, self.max_retry_delay)
+        except RedisError as exc:
+            raise LockBackendUnavailable(str(exc)) from exc
+        lease_renewer.add(token, keys)
+
+        def release():
+            lease_renewer.remove(token)
+            try:
+                redis_client.register_script(self.release_script)(keys=keys, args=[token])
+            except RedisError:
+                # перевод уже закоммичен, лок освободится сам по истечении времени жизни
+                logger.warning('Failed to release wallet lock', exc_info=True)
+
+        return release
+
+
+# lock_not_available: не дождались лока за lock_timeout
+LOCK_NOT_AVAILABLE_PGCODE = '55P03'
+
+
+class AdvisoryWalletLock(BaseWalletLock):
+    """
+    Транзакционный advisory лок в PostgreSQL.
+
+    Не нужен отдельный сервис и лишний сетевой запрос в редис, а лок живёт ровно столько,
+    сколько транзакция, и отпускается базой при коммите или откате, даже если воркер упал.
+    """
+
+    @staticmethod
+    def get_lock_key(wallet_id: uuid.UUID) -> int:
+        """Ключ advisory лока: первые 64 бита uuid кошелька."""
+        return int.from_bytes(uuid.UUID(str(wallet_id)).bytes[:8], 'big', signed=True)
+
+    @contextmanager
+    def _atomic(self, wallet_ids: List[uuid.UUID]) -> Iterator[None]:
+        # ожидание лока здесь входит и во время транзакции
+        with stage_timer(STAGE_TRANSACTION), transaction.atomic():
+            with self._lock(wallet_ids):
+                yield
+
+    def _acquire(self, wallet_ids: List[uuid.UUID], timeout: float) -> Callable[[], None]:
+        if not connection.in_atomic_block:
+            raise RuntimeError('Advisory wallet lock must be taken inside transaction.atomic()')
+        try:
+            with connection.cursor() as cursor:
+                # lock_timeout действует до конца транзакции, ожидание строк тоже ограничено
+                cursor.execute(
+                    "SELECT set_config('lock_timeout', %s, true)",
+                    [f'{max(int(timeout * 1000), 1)}ms'],
+                )
+                # unnest отдаёт ключи в порядке массива, поэтому локи берутся в том же порядке
+                cursor.execute(
+                    'SELECT pg_advisory_xact_lock(lock_key) FROM unnest(%s::bigint[]) AS lock_key',
+                    [[self.get_lock_key(wallet_id) for wallet_id in wallet_ids]],
+                )
+        except OperationalError as exc:
+            if getattr(exc.__cause__, 'pgcode', None) != LOCK_NOT_AVAILABLE_PGCODE:
+                raise
+            raise WalletLockTimeout(wallet_ids) from exc
+        # лок отпустит база при завершении транзакции
+        return lambda: None
+
+
+class LocalWalletLock(BaseWalletLock):
+    """
+    Лок внутри процесса, для тестов и локальной разработки без редиса.
+
+    Лок кошелька живёт, пока его держат или ждут: у записи есть счётчик ссылок,
+    и последний отпустивший удаляет её, поэтому словарь не растёт с числом кошельков.
+    """
+
+    # id кошелька -> [лок, сколько потоков держат или ждут его]
+    _locks: Dict[str, List] = {}
+    _locks_guard = threading.Lock()
+
+    @classmethod
+    def _release_all(cls, keys: List[str], acquired: List[threading.Lock]):
+        for wallet_lock in reversed(acquired):
+            wallet_lock.release()
+        with cls._locks_guard:
+            for key in keys:
+                entry = cls._locks[key]
+                entry[1] -= 1
+                if not entry[1]:
+                    del cls._locks[key]
+
+    def _acquire(self, wallet_ids: List[uuid.UUID], timeout: float) -> Callable[[], None]:
+        keys = [str(wallet_id) for wallet_id in wallet_ids]
+        with self._locks_guard:
+            entries = [self._locks.setdefault(key, [threading.Lock(), 0]) for key in keys]
+            for entry in entries:
+                entry[1] += 1
+        deadline = perf_counter() + timeout
+
+        acquired = []
+        for wallet_lock, _ in entries:
+            if not wallet_lock.acquire(timeout=max(deadline - perf_counter(), 0)):
+                self._release_all(keys, acquired)
+                raise WalletLockTimeout(wallet_ids)
+            acquired.append(wallet_lock)
+        return lambda: self._release_all(keys, acquired)
+
+
+def _get_backend(path: str) -> BaseWalletLock:
+    return import_string(path)()
+
+
+def get_lock_backend() -> BaseWalletLock:
+    """Бэкенд локов из настройки WALLET_LOCK_BACKEND."""
+    return _get_backend(settings.WALLET_LOCK_BACKEND)
+
+
+def get_fallback_lock_backend() -> Optional[BaseWalletLock]:
+    """Запасной бэкенд локов из настройки WALLET_LOCK_FALLBACK_BACKEND."""
+    if not settings.WALLET_LOCK_FALLBACK_BACKEND:
+        return None
+    return _get_backend(settings.WALLET_LOCK_FALLBACK_BACKEND)
+
+
+def locked_atomic(*wallet_ids) -> ExitStack:
+    """
+    Транзакция в базе под локом кошельков.
+
+    Если хранилище локов недоступно (например, лежит редис), используется запасной бэкенд.
+
+    :param wallet_ids: id блокируемых кошельков
+    :return: контекстный менеджер, внутри которого кошельки заблокированы
+    """
+    stack = ExitStack()
+    try:
+        stack.enter_context(get_lock_backend().atomic(*wallet_ids))
+    except LockBackendUnavailable:
+        fallback_backend = get_fallback_lock_backend()
+        if fallback_backend is None:
+            raise
+        logger.warning(
+            'Wallet lock backend is unavailable, using fallback',
+            extra={'fallback': fallback_backend.__class__.__name__},
+            exc_info=True,
+        )
+        stack.enter_context(fallback_backend.atomic(*wallet_ids))
+    return stack
+
+
+# deadlock_detected и serialization_failure: транзакцию можно безопасно повторить
+RETRYABLE_PGCODES = frozenset(('40P01', '40001'))
+
+
+def is_retryable_error(exc: OperationalError) -> bool:
+    """Ошибка из-за конкуренции транзакций, после которой транзакцию можно повторить."""
+    return getattr(exc.__cause__, 'pgcode', None) in RETRYABLE_PGCODES
+
+
+def retry_on_conflict(func: Callable) -> Callable:
+    """
+    Повтор транзакции при deadlock или ошибке сериализации в базе.
+
+    Между попытками ждём со случайным разбросом, чтобы конкурирующие транзакции разошлись.
+    Повтор возможен только для внешней транзакции: если функция вызвана внутри
+    transaction.atomic(), ошибка пробрасывается дальше.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if (
+                    connection.in_atomic_block
+                    or attempt >= settings.WALLET_TRANSFER_RETRY_ATTEMPTS
+                    or not is_retryable_error(exc)
+                ):
+                    raise
+                logger.warning(
+                    'Transaction conflict, retrying',
+                    extra={'attempt': attempt, 'function': func.__name__},
+                )
+            jitter = random.uniform(0.5, 1.5)  # noqa: S311
+            sleep(settings.WALLET_TRANSFER_RETRY_BACKOFF * attempt * jitter)
+            attempt += 1
+
+    return wrapper
@@ -1,6 +1,18 @@
+from wallet.serializers.batch_transaction import CreateBatchTransactionSerializer
+from wallet.serializers.hot_wallets import HotWalletsFilterSerializer
+from wallet.serializers.statement import StatementFilterSerializer
 from wallet.serializers.transaction import CreateTransactionSerializer
+from wallet.serializers.transaction_history import (
+    TransactionHistoryFilterSerializer,
+    TransactionHistorySerializer,
+)
 
 
 __all__ = [
+    'CreateBatchTransactionSerializer',
     'CreateTransactionSerializer',
+    'HotWalletsFilterSerializer',
+    'StatementFilterSerializer',
+    'TransactionHistoryFilterSerializer',
+    'TransactionHistorySerializer',
 ]
@@ -0,0 +1,49 @@
+from rest_framework import serializers
+
+from wallet.constants import (
+    BATCH_MODE_ATOMIC,
+    BATCH_MODES,
+    MAX_BATCH_TRANSACTIONS,
+    MIN_TRANSACTION_AMOUNT,
+)
+from wallet.models import Transaction
+
+
+class BatchTransactionItemSerializer(serializers.Serializer):
+    """
+    Один перевод из пакета.
+
+    Кошельки здесь не запрашиваются из базы (в отличие от ModelSerializer),
+    их наличие и принадлежность проверяются одним запросом на весь пакет.
+    """
+
+    sender = serializers.UUIDField()
+    payee = serializers.UUIDField()
+    amount = serializers.IntegerField(min_value=MIN_TRANSACTION_AMOUNT)
+    is_anonymous = serializers.BooleanField(default=False)
+    comment = serializers.CharField(
+        max_length=Transaction._meta.get_field('comment').max_length,
+        default='',
+        allow_blank=True,
+    )
+
+
+class CreateBatchTransactionSerializer(serializers.Serializer):
+    """Сериализатор для пакета переводов между кошельками."""
+
+    mode = serializers.ChoiceField(
+        choices=BATCH_MODES,
+        default=BATCH_MODE_ATOMIC,
+    )
+    transactions = BatchTransactionItemSerializer(
+        many=True,
+        allow_empty=False,
+    )
+
+    def validate_transactions(self, value):
+        """Ограничиваем размер пакета."""
+        if len(value) > MAX_BATCH_TRANSACTIONS:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {MAX_BATCH_TRANSACTIONS} elements.',
+            )
+        return value
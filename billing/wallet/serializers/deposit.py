@@ -1,14 +1,20 @@
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 
-from wallet.constants import MIN_DEPOSIT_AMOUNT
+from wallet.constants import (
+    MAX_DEPOSIT_AMOUNT,
+    MIN_DEPOSIT_AMOUNT,
+)
 from wallet.models import Transaction
 
 
 class CreateDepositSerializer(ModelSerializer):
     """Сериализатор для пополнения средств."""
 
-    amount = serializers.IntegerField(min_value=MIN_DEPOSIT_AMOUNT)
+    amount = serializers.IntegerField(
+        min_value=MIN_DEPOSIT_AMOUNT,
+        max_value=MAX_DEPOSIT_AMOUNT,
+    )
 
     class Meta:
         model = Transaction
@@ -22,3 +28,9 @@ class CreateDepositSerializer(ModelSerializer):
             'payee': {'required': True},
             'amount': {'required': True},
         }
+
+    def validate_payee(self, payee):
+        """Пополнять замороженный кошелёк нельзя."""
+        if payee.is_frozen:
+            raise serializers.ValidationError('wallet is frozen')
+        return payee
@@ -0,0 +1,23 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from wallet.constants import (
+    HOT_WALLETS_MAX_LIMIT,
+    HOT_WALLETS_ORDER_WAIT_MS,
+    HOT_WALLETS_ORDERINGS,
+)
+
+
+class HotWalletsFilterSerializer(serializers.Serializer):
+    """Параметры запроса горячих кошельков: сколько, за какое окно и по какой метрике."""
+
+    limit = serializers.IntegerField(min_value=1, max_value=HOT_WALLETS_MAX_LIMIT, default=10)
+    window = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.WALLET_CONTENTION_MAX_WINDOW,
+        default=5 * 60,
+    )
+    order_by = serializers.ChoiceField(
+        choices=HOT_WALLETS_ORDERINGS,
+        default=HOT_WALLETS_ORDER_WAIT_MS,
+    )
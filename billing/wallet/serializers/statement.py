@@ -0,0 +1,22 @@
+from rest_framework import serializers
+
+from wallet.constants import (
+    STATEMENT_FORMAT_CSV,
+    STATEMENT_FORMATS,
+)
+
+
+class StatementFilterSerializer(serializers.Serializer):
+    """
+    Параметры выгрузки выписки (параметры запроса).
+
+    Формат передаётся в export_format: параметр format DRF использует для выбора рендерера.
+    """
+
+    export_format = serializers.ChoiceField(
+        choices=STATEMENT_FORMATS,
+        default=STATEMENT_FORMAT_CSV,
+    )
+    gzip = serializers.BooleanField(default=False)
+    date_from = serializers.DateTimeField(required=False)
+    date_to = serializers.DateTimeField(required=False)
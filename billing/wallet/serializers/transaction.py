@@ -1,26 +1,24 @@
 from rest_framework import serializers
-from rest_framework.serializers import ModelSerializer
 
 from wallet.constants import MIN_TRANSACTION_AMOUNT
 from wallet.models import Transaction
 
 
-class CreateTransactionSerializer(ModelSerializer):
-    """Сериализатор для транзакции между двумя кошельками."""
+class CreateTransactionSerializer(serializers.Serializer):
+    """
+    Сериализатор для транзакции между двумя кошельками.
 
-    amount = serializers.IntegerField(min_value=MIN_TRANSACTION_AMOUNT)
+    Проверяет только формат запроса: кошельки не запрашиваются из базы (в отличие
+    от ModelSerializer с PrimaryKeyRelatedField), их наличие и принадлежность
+    отправителя пользователю проверяет сам перевод тем же запросом, что и баланс.
+    """
 
-    class Meta:
-        model = Transaction
-        fields = (
-            'sender',
-            'payee',
-            'amount',
-            'is_anonymous',
-            'comment',
-        )
-        extra_kwargs = {
-            'sender': {'required': True},
-            'payee': {'required': True},
-            'amount': {'required': True},
-        }
+    sender = serializers.UUIDField()
+    payee = serializers.UUIDField()
+    amount = serializers.IntegerField(min_value=MIN_TRANSACTION_AMOUNT)
+    is_anonymous = serializers.BooleanField(default=False)
+    comment = serializers.CharField(
+        max_length=Transaction._meta.get_field('comment').max_length,
+        default='',
+        allow_blank=True,
+    )
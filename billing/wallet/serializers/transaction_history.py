@@ -0,0 +1,46 @@
+from rest_framework import serializers
+from rest_framework.serializers import ModelSerializer
+
+from wallet.constants import TRANSACTION_DIRECTIONS
+from wallet.models import Transaction
+
+
+class TransactionHistoryFilterSerializer(serializers.Serializer):
+    """Фильтры истории транзакций кошелька (параметры запроса)."""
+
+    direction = serializers.ChoiceField(
+        choices=TRANSACTION_DIRECTIONS,
+        required=False,
+    )
+    amount_min = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    amount_max = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    date_from = serializers.DateTimeField(required=False)
+    date_to = serializers.DateTimeField(required=False)
+
+
+class TransactionHistorySerializer(ModelSerializer):
+    """
+    Транзакция в истории кошелька.
+
+    Отправитель анонимной транзакции скрывается, если кошелёк из истории её получатель.
+    В context должен быть передан wallet_id - id кошелька, историю которого смотрят.
+    """
+
+    class Meta:
+        model = Transaction
+        fields = (
+            'id',
+            'sender',
+            'payee',
+            'amount',
+            'is_anonymous',
+            'comment',
+            'created_at',
+        )
+
+    def to_representation(self, instance):
+        """Скрываем отправителя анонимной транзакции."""
+        data = super().to_representation(instance)
+        if instance.is_anonymous and instance.sender_id != self.context['wallet_id']:
+            data['sender'] = None
+        return data
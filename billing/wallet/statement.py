@@ -0,0 +1,155 @@
+"""
+Потоковая выгрузка выписки по кошельку.
+
+Строки читаются из базы серверным курсором пачками по chunk_size и сразу отдаются
+генератором, поэтому память воркера не зависит от размера выписки.
+"""
+import csv
+import io
+import json
+import uuid
+import zlib
+from datetime import datetime
+from typing import (
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+from django.db import transaction
+
+from wallet.constants import (
+    STATEMENT_FORMAT_CSV,
+    TRANSACTION_DIRECTION_IN,
+    TRANSACTION_DIRECTION_OUT,
+)
+from wallet.models import Transaction
+
+
+STATEMENT_COLUMNS = (
+    'created_at',
+    'id',
+    'direction',
+    'sender',
+    'payee',
+    'amount',
+    'is_anonymous',
+    'comment',
+)
+# сколько строк читать из курсора за раз
+STATEMENT_CHUNK_SIZE = 2000
+# примерный размер куска ответа в байтах: не отдаём каждую строку отдельным write
+STATEMENT_BUFFER_SIZE = 64 * 1024
+
+
+def get_statement_rows(wallet_id: uuid.UUID,
+                       date_from: Optional[datetime] = None,
+                       date_to: Optional[datetime] = None,
+                       chunk_size: int = STATEMENT_CHUNK_SIZE) -> Iterator[Tuple]:
+    """
+    Строки выписки по кошельку от старых транзакций к новым.
+
+    Входящие и исходящие транзакции читаются каждая по своему индексу и сливаются
+    через UNION ALL без сортировки всей выписки. Курсор читается внутри транзакции:
+    вне её postgres сначала материализует весь результат (WITH HOLD).
+
+    :param wallet_id: id кошелька
+    :param date_from: транзакции, созданные не раньше указанного времени
+    :param date_to: транзакции, созданные не позже указанного времени
+    :param chunk_size: сколько строк читать из курсора за раз
+    :return: строки в порядке STATEMENT_COLUMNS
+    """
+    wallet_id = uuid.UUID(str(wallet_id))
+    transactions = Transaction.objects.all()
+    if date_from is not None:
+        transactions = transactions.filter(created_at__gte=date_from)
+    if date_to is not None:
+        transactions = transactions.filter(created_at__lte=date_to)
+
+    fields = ('created_at', 'id', 'sender_id', 'payee_id', 'amount', 'is_anonymous', 'comment')
+    incoming = transactions.filter(payee_id=wallet_id).values_list(*fields)
+    # перевод самому себе уже попал во входящие
+    outgoing = transactions.filter(
+        sender_id=wallet_id,
+    ).exclude(
+        payee_id=wallet_id,
+    ).values_list(
+        *fields,
+    )
+    rows = incoming.union(outgoing, all=True).order_by('created_at', 'id')
+
+    with transaction.atomic():
+        for created_at, row_id, sender_id, payee_id, amount, is_anonymous, comment in rows.iterator(
+            chunk_size=chunk_size,
+        ):
+            is_incoming = payee_id == wallet_id
+            if is_anonymous and is_incoming and sender_id != wallet_id:
+                # отправитель анонимного перевода не показывается получателю
+                sender_id = None
+            yield (
+                created_at.isoformat(),
+                str(row_id),
+                TRANSACTION_DIRECTION_IN if is_incoming else TRANSACTION_DIRECTION_OUT,
+                str(sender_id) if sender_id else None,
+                str(payee_id),
+                str(amount),
+                is_anonymous,
+                comment,
+            )
+
+
+def render_csv(rows: Iterable[Tuple]) -> Iterator[bytes]:
+    """Выписка в CSV с заголовком, кусками около STATEMENT_BUFFER_SIZE байт."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(STATEMENT_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= STATEMENT_BUFFER_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def render_ndjson(rows: Iterable[Tuple]) -> Iterator[bytes]:
+    """Выписка в NDJSON (объект на строку), кусками около STATEMENT_BUFFER_SIZE байт."""
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(STATEMENT_COLUMNS, row)), ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= STATEMENT_BUFFER_SIZE:
+            yield ''.join(lines).encode()
+            lines = []
+            size = 0
+    yield ''.join(lines).encode()
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Сжатие потока в gzip по мере генерации."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_statement(rows: Iterable[Tuple],
+                     export_format: str = STATEMENT_FORMAT_CSV,
+                     compress: bool = False) -> Iterator[bytes]:
+    """
+    Выписка в нужном формате.
+
+    :param rows: строки выписки (get_statement_rows)
+    :param export_format: csv или ndjson
+    :param compress: сжать выписку в gzip
+    :return: куски выписки для StreamingHttpResponse или записи в файл
+    """
+    chunks = render_csv(rows) if export_format == STATEMENT_FORMAT_CSV else render_ndjson(rows)
+    if compress:
+        return gzip_chunks(chunks)
+    return chunks
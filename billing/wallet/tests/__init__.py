@@ -1,8 +1,62 @@
+from wallet.tests.async_create import AsyncCreateTestCase
+from wallet.tests.balance_cache import BalanceCacheTestCase
+from wallet.tests.balance_slots import (
+    BalanceSlotsConcurrencyTestCase,
+    BalanceSlotsTestCase,
+)
+from wallet.tests.balance_snapshot import BalanceSnapshotTestCase
+from wallet.tests.batch_transaction import BatchTransactionTestCase
+from wallet.tests.benchmark_api import (
+    BenchmarkApiTestCase,
+    BenchmarkHelpersTestCase,
+)
 from wallet.tests.deposit import DepositTestCase
+from wallet.tests.deposit_stream import DepositStreamTestCase
+from wallet.tests.hot_wallets import HotWalletsTestCase
+from wallet.tests.idempotency import IdempotencyTestCase
+from wallet.tests.metrics import MetricsTestCase
+from wallet.tests.partitions import PartitionsTestCase
+from wallet.tests.reconciliation import ReconciliationTestCase
+from wallet.tests.secure_transaction import (
+    RedisPoolTestCase,
+    RetryOnConflictTestCase,
+    WalletLockTestCase,
+)
+from wallet.tests.statement import (
+    StatementASGITestCase,
+    StatementTestCase,
+)
 from wallet.tests.transaction import TransactionTestCase
+from wallet.tests.transaction_history import TransactionHistoryTestCase
+from wallet.tests.transfer_engine import (
+    ConditionalTransferTestCase,
+    SymmetricTransferStressTestCase,
+)
 
 
 __all__ = [
+    'AsyncCreateTestCase',
+    'BalanceCacheTestCase',
+    'BalanceSlotsConcurrencyTestCase',
+    'BalanceSlotsTestCase',
+    'BalanceSnapshotTestCase',
+    'BatchTransactionTestCase',
+    'BenchmarkApiTestCase',
+    'BenchmarkHelpersTestCase',
+    'ConditionalTransferTestCase',
+    'HotWalletsTestCase',
+    'IdempotencyTestCase',
+    'MetricsTestCase',
+    'PartitionsTestCase',
+    'TransactionHistoryTestCase',
     'TransactionTestCase',
     'DepositTestCase',
+    'DepositStreamTestCase',
+    'ReconciliationTestCase',
+    'RedisPoolTestCase',
+    'RetryOnConflictTestCase',
+    'StatementASGITestCase',
+    'StatementTestCase',
+    'SymmetricTransferStressTestCase',
+    'WalletLockTestCase',
 ]
@@ -0,0 +1,150 @@
+import asyncio
+import uuid
+
+from asgiref.sync import async_to_sync
+from django.test import (
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.client import AsyncRequestFactory
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.models import User
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.views import (
+    create_deposit_async,
+    create_transaction_async,
+)
+
+
+test_email = 'test@test.test'
+
+
+class AsyncCreateTestCase(TransactionTestCase):
+    """
+    Тесты на асинхронные вью перевода и пополнения.
+
+    Запросы к базе выполняются в потоках пула со своими соединениями, поэтому данные
+    теста должны быть закоммичены (TransactionTestCase).
+    """
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user = User.objects.create_user(email=test_email)
+        self.wallet_1 = Wallet.objects.create(user=self.user, balance=100)
+        self.wallet_2 = Wallet.objects.create(user=self.user)
+        self.factory = AsyncRequestFactory()
+        self.authorization = f'Bearer {AccessToken.for_user(self.user)}'
+
+    def _post(self, view, path: str, data: dict, **headers):
+        headers.setdefault('authorization', self.authorization)
+        request = self.factory.post(path, data=data, content_type='application/json', **headers)
+        return async_to_sync(view)(request)
+
+    def _get_balances(self):
+        return [
+            Wallet.objects.get(pk=wallet.pk).balance
+            for wallet in (self.wallet_1, self.wallet_2)
+        ]
+
+    def test_transaction(self):
+        """Проверка перевода через асинхронную вью."""
+        response = self._post(
+            create_transaction_async,
+            '/wallet/transaction/',
+            {'sender': str(self.wallet_1.pk), 'payee': str(self.wallet_2.pk), 'amount': 30},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._get_balances(), [70, 30])
+
+        response = self._post(
+            create_transaction_async,
+            '/wallet/transaction/',
+            {'sender': str(self.wallet_1.pk), 'payee': str(self.wallet_2.pk), 'amount': 1000},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'error': 'insufficient funds'})
+
+    def test_deposit_idempotency(self):
+        """Проверка пополнения и заголовка Idempotency-Key через асинхронную вью."""
+        idempotency_key = uuid.uuid4().hex
+        for _ in range(2):
+            response = self._post(
+                create_deposit_async,
+                '/wallet/deposit/',
+                {'payee': str(self.wallet_2.pk), 'amount': 5},
+                idempotency_key=idempotency_key,
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._get_balances(), [100, 5])
+
+    def test_authentication(self):
+        """Проверка ответа 401 без токена и с недействительным токеном."""
+        data = {'payee': str(self.wallet_2.pk), 'amount': 5}
+        response = self._post(create_deposit_async, '/wallet/deposit/', data, authorization='')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+
+        response = self._post(
+            create_deposit_async,
+            '/wallet/deposit/',
+            data,
+            authorization='Bearer invalid',
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_concurrent_transactions(self):
+        """Проверка, что одновременные переводы одного воркера не теряют обновлений."""
+        transfers = 20
+
+        async def run():
+            requests = [
+                self.factory.post(
+                    '/wallet/transaction/',
+                    data={
+                        'sender': str(self.wallet_1.pk),
+                        'payee': str(self.wallet_2.pk),
+                        'amount': 1,
+                    },
+                    content_type='application/json',
+                    authorization=self.authorization,
+                )
+                for _ in range(transfers)
+            ]
+            return await asyncio.gather(
+                *[create_transaction_async(request) for request in requests],
+            )
+
+        responses = async_to_sync(run)()
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [status.HTTP_200_OK] * transfers,
+        )
+        self.assertEqual(self._get_balances(), [80, 20])
+
+    @override_settings(ASYNC_POOL={'THREADS': 2, 'CONCURRENCY': 1, 'QUEUE_TIMEOUT': 0})
+    def test_concurrency_limit(self):
+        """Проверка ответа 503, если воркер уже обрабатывает предельное число запросов."""
+        async def run():
+            requests = [
+                self.factory.post(
+                    '/wallet/deposit/',
+                    data={'payee': str(self.wallet_2.pk), 'amount': 1},
+                    content_type='application/json',
+                    authorization=self.authorization,
+                )
+                for _ in range(2)
+            ]
+            return await asyncio.gather(*[create_deposit_async(request) for request in requests])
+
+        responses = async_to_sync(run)()
+        self.assertEqual(
+            sorted(response.status_code for response in responses),
+            [status.HTTP_200_OK, status.HTTP_503_SERVICE_UNAVAILABLE],
+        )
+        self.assertEqual(self._get_balances(), [100, 1])
@@ -0,0 +1,204 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import OperationalError
+from django.db.models import F
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from wallet.balance_cache import (
+    _set_balances,
+    cache_stats,
+    get_balance,
+    get_cache_key,
+    get_load_lock_key,
+    refresh_balances,
+)
+from wallet.models import Wallet
+from wallet.secure_transaction import get_redis
+from wallet.tests.secure_transaction import get_unavailable_redis
+
+
+test_email = 'test@test.test'
+
+
+class BalanceCacheTestCase(TestCase):
+    """Тесты на кэш балансов и /wallet/<id>/balance/."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user_1 = User.objects.create_user(email=test_email)
+        self.wallet_1 = Wallet.objects.create(user=self.user_1, balance=100)
+        self.user_2 = User.objects.create_user(email=f'{test_email}_2')
+        self.wallet_2 = Wallet.objects.create(user=self.user_2)
+
+        self.redis = get_redis()
+        cache_stats.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user_1)
+        self.path = f'/wallet/{self.wallet_1.pk}/balance/'
+
+    def tearDown(self):
+        """Удаляем балансы тестовых кошельков из кэша."""
+        for wallet in (self.wallet_1, self.wallet_2):
+            self.redis.delete(get_cache_key(wallet.pk), get_load_lock_key(wallet.pk))
+
+    def _get_balance(self) -> dict:
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_miss_and_hit(self):
+        """Проверка, что после промаха баланс отдаётся из кэша без запросов к базе."""
+        self.assertEqual(self._get_balance()['balance'], '100.00')
+
+        with self.assertNumQueries(0):
+            data = self._get_balance()
+        self.assertEqual(data['wallet_id'], str(self.wallet_1.pk))
+        self.assertEqual(data['balance'], '100.00')
+        self.assertEqual(data['version'], 0)
+
+        stats = cache_stats.get()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_foreign_wallet(self):
+        """Проверка, что баланс чужого или несуществующего кошелька не отдаётся."""
+        response = self.client.get(f'/wallet/{self.wallet_2.pk}/balance/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # закэшированный баланс чужого кошелька тоже не отдаётся
+        response = self.client.get(f'/wallet/{self.wallet_2.pk}/balance/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.wallet_2.delete()
+        response = self.client.get(f'/wallet/{self.wallet_2.pk}/balance/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_refresh_after_transaction(self):
+        """Проверка записи новых балансов в кэш после перевода."""
+        self._get_balance()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                path='/wallet/transaction/',
+                data={'sender': self.wallet_1.pk, 'payee': self.wallet_2.pk, 'amount': 30},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            data = self._get_balance()
+        self.assertEqual((data['balance'], data['version']), ('70.00', 1))
+        self.assertEqual(get_balance(self.wallet_2.pk)['balance'], 30)
+        self.assertEqual(cache_stats.get()['misses'], 1)
+
+    def test_refresh_after_deposit(self):
+        """Проверка записи нового баланса в кэш после пополнения."""
+        self._get_balance()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                path='/wallet/deposit/',
+                data={'payee': self.wallet_1.pk, 'amount': 50},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            data = self._get_balance()
+        self.assertEqual((data['balance'], data['version']), ('150.00', 1))
+
+    def test_version_guard(self):
+        """Проверка, что баланс с меньшей версией не затирает более свежий."""
+        Wallet.objects.filter(pk=self.wallet_1.pk).update(balance=80, version=2)
+        refresh_balances([self.wallet_1.pk])
+
+        _set_balances(self.redis, [{
+            'id': self.wallet_1.pk,
+            'user_id': self.user_1.pk,
+            'balance': 100,
+            'version': 1,
+            'updated_at': timezone.now(),
+        }])
+        cached = get_balance(self.wallet_1.pk)
+        self.assertEqual((cached['balance'], cached['version']), (80, 2))
+
+    def test_redis_unavailable(self):
+        """Проверка чтения баланса из базы и проведения перевода, если редис недоступен."""
+        with mock.patch('wallet.balance_cache.get_redis', get_unavailable_redis):
+            with self.assertLogs('wallet.balance_cache', level='WARNING'):
+                self.assertEqual(self._get_balance()['balance'], '100.00')
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        path='/wallet/deposit/',
+                        data={'payee': self.wallet_1.pk, 'amount': 50},
+                    )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(cache_stats.get()['errors'], 2)
+        self.assertEqual(self._get_balance()['balance'], '150.00')
+
+    def test_database_error_on_refresh(self):
+        """Проверка, что ошибка базы после коммита сбрасывает баланс из кэша, а не ломает запрос."""
+        self._get_balance()
+        self.assertTrue(self.redis.exists(get_cache_key(self.wallet_1.pk)))
+        with mock.patch('wallet.balance_cache._load_balances', side_effect=OperationalError):
+            with self.assertLogs('wallet.balance_cache', level='WARNING'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        path='/wallet/deposit/',
+                        data={'payee': self.wallet_1.pk, 'amount': 50},
+                    )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(cache_stats.get()['errors'], 1)
+        self.assertFalse(self.redis.exists(get_cache_key(self.wallet_1.pk)))
+        self.assertEqual(self._get_balance()['balance'], '150.00')
+
+    def test_coalesced_miss(self):
+        """Проверка, что промах ждёт баланс, который загружает другой запрос."""
+        self.redis.set(get_load_lock_key(self.wallet_1.pk), 1)
+
+        # другой запрос кладёт баланс в кэш, пока этот ждёт
+        def load(delay):  # noqa: U100
+            refresh_balances([self.wallet_1.pk])
+
+        with mock.patch('wallet.balance_cache.sleep', side_effect=load):
+            self.assertEqual(self._get_balance()['balance'], '100.00')
+        stats = cache_stats.get()
+        self.assertEqual((stats['misses'], stats['coalesced']), (1, 1))
+
+    def test_coalesced_miss_timeout(self):
+        """Проверка чтения из базы, если другой запрос не загрузил баланс вовремя."""
+        self.redis.set(get_load_lock_key(self.wallet_1.pk), 1)
+        self.assertEqual(self._get_balance()['balance'], '100.00')
+        self.assertEqual(cache_stats.get()['coalesced'], 0)
+
+    @override_settings(WALLET_BALANCE_CACHE_STALENESS_SAMPLE_RATE=1)
+    def test_staleness(self):
+        """Проверка замера отставания кэша от базы."""
+        self._get_balance()
+        self._get_balance()
+        # баланс изменился в базе, но кэш не обновлён
+        Wallet.objects.filter(pk=self.wallet_1.pk).update(
+            balance=F('balance') + 1,
+            version=F('version') + 1,
+            updated_at=timezone.now() + timedelta(seconds=5),
+        )
+        self.assertEqual(self._get_balance()['balance'], '100.00')
+
+        stats = cache_stats.get()
+        self.assertEqual((stats['staleness_checks'], stats['stale']), (2, 1))
+        self.assertGreaterEqual(stats['max_stale_seconds'], 5)
+
+    def test_stats_view(self):
+        """Проверка, что статистику кэша видит только администратор."""
+        response = self.client.get('/internal/balance-cache/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user_1.is_staff = True
+        self.user_1.save(update_fields=['is_staff'])
+        self._get_balance()
+        response = self.client.get('/internal/balance-cache/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['misses'], 1)
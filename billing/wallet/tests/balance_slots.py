@@ -0,0 +1,254 @@
+import threading
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import (
+    connection,
+    transaction,
+)
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from wallet.balance_cache import (
+    _load_balances,
+    get_cache_key,
+)
+from wallet.balance_slots import (
+    credit_wallet,
+    set_slot_count,
+    sweep_slots,
+)
+from wallet.constants import (
+    TRANSFER_ENGINE_CONDITIONAL,
+    TRANSFER_ENGINE_LOCKING,
+)
+from wallet.models import (
+    Transaction,
+    Wallet,
+    WalletBalanceSlot,
+)
+from wallet.reconciliation import (
+    get_partitions,
+    reconcile_partition,
+)
+from wallet.secure_transaction import get_redis
+from wallet.transfer_engine import (
+    TransferError,
+    make_transfer,
+)
+
+
+test_email = 'test@test.test'
+
+
+class BalanceSlotsTestCase(TestCase):
+    """Тесты на шардирование баланса кошелька по слотам."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user = User.objects.create_user(email=test_email)
+        self.hot_wallet = Wallet.objects.create(user=self.user)
+        self.wallet = Wallet.objects.create(user=self.user)
+        set_slot_count(wallet_id=self.hot_wallet.pk, slot_count=4)
+        self.hot_wallet.refresh_from_db()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _deposit(self, wallet: Wallet, amount: int):
+        response = self.client.post(
+            path='/wallet/deposit/',
+            data={'payee': str(wallet.pk), 'amount': amount},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def _get_slot_balances(self):
+        return list(
+            WalletBalanceSlot.objects.filter(
+                wallet=self.hot_wallet,
+            ).order_by(
+                'slot',
+            ).values_list(
+                'balance',
+                flat=True,
+            ),
+        )
+
+    def test_deposit(self):
+        """Проверка, что пополнения идут в слоты, а баланс кошелька - их сумма."""
+        for _ in range(20):
+            self._deposit(self.hot_wallet, 5)
+
+        self.hot_wallet.refresh_from_db()
+        self.assertEqual(self.hot_wallet.balance, 0)
+        self.assertEqual(len(self._get_slot_balances()), 4)
+        self.assertEqual(sum(self._get_slot_balances()), 100)
+        self.assertEqual(self.hot_wallet.get_total_balance(), 100)
+        self.assertEqual(self.hot_wallet.check_balance(), 0)
+
+        response = self.client.get(f'/wallet/{self.hot_wallet.pk}/balance/')
+        self.assertEqual(response.json()['balance'], '100.00')
+
+    def test_transfer(self):
+        """Проверка, что списание с горячего кошелька забирает балансы из слотов."""
+        for engine in (TRANSFER_ENGINE_LOCKING, TRANSFER_ENGINE_CONDITIONAL):
+            if engine == TRANSFER_ENGINE_CONDITIONAL and connection.vendor != 'postgresql':
+                continue
+            with self.subTest(engine=engine):
+                self._deposit(self.hot_wallet, 10)
+                self._deposit(self.hot_wallet, 20)
+
+                make_transfer(
+                    user_id=self.user.pk,
+                    sender_id=self.hot_wallet.pk,
+                    payee_id=self.wallet.pk,
+                    amount=25,
+                    engine=engine,
+                )
+                self.hot_wallet.refresh_from_db()
+                self.assertEqual(self.hot_wallet.balance, 5)
+                self.assertEqual(sum(self._get_slot_balances()), 0)
+
+                with self.assertRaisesMessage(TransferError, 'insufficient funds'):
+                    make_transfer(
+                        user_id=self.user.pk,
+                        sender_id=self.hot_wallet.pk,
+                        payee_id=self.wallet.pk,
+                        amount=6,
+                        engine=engine,
+                    )
+
+                make_transfer(
+                    user_id=self.user.pk,
+                    sender_id=self.hot_wallet.pk,
+                    payee_id=self.wallet.pk,
+                    amount=5,
+                    engine=engine,
+                )
+                self.hot_wallet.refresh_from_db()
+                self.assertEqual(self.hot_wallet.check_balance(), 0)
+
+        self.assertEqual(Wallet.objects.get(pk=self.wallet.pk).check_balance(), 0)
+
+    def test_sweep_lock_order(self):
+        """Проверка, что перенос слотов блокирует строку кошелька раньше слотов."""
+        self._deposit(self.hot_wallet, 10)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sweep_slots(wallet_id=self.hot_wallet.pk), 10)
+
+        locked = [query['sql'] for query in queries if 'FOR UPDATE' in query['sql']]
+        self.assertEqual(len(locked), 2)
+        self.assertIn(f'FROM "{Wallet._meta.db_table}"', locked[0])
+        self.assertIn(f'FROM "{WalletBalanceSlot._meta.db_table}"', locked[1])
+        self.hot_wallet.refresh_from_db()
+        self.assertEqual(self.hot_wallet.balance, 10)
+
+    def test_batch(self):
+        """Проверка пакетного перевода с горячего кошелька."""
+        self._deposit(self.hot_wallet, 30)
+        response = self.client.post(
+            path='/wallet/transaction/batch/',
+            data={
+                'transactions': [
+                    {'sender': str(self.hot_wallet.pk), 'payee': str(self.wallet.pk), 'amount': 20},
+                    {'sender': str(self.hot_wallet.pk), 'payee': str(self.wallet.pk), 'amount': 10},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.hot_wallet.get_total_balance(), 0)
+        self.assertEqual(Wallet.objects.get(pk=self.wallet.pk).balance, 30)
+
+    def test_reconciliation(self):
+        """Проверка, что сверка учитывает слоты и исправляет строку кошелька."""
+        self._deposit(self.hot_wallet, 10)
+        self.assertEqual(reconcile_partition(*get_partitions(1)[0])['mismatches'], 0)
+
+        WalletBalanceSlot.objects.filter(wallet=self.hot_wallet, slot=0).update(balance=7)
+        result = reconcile_partition(*get_partitions(1)[0], fix=True)
+        self.assertEqual((result['mismatches'], result['fixed']), (1, 1))
+        self.hot_wallet.refresh_from_db()
+        self.assertEqual(self.hot_wallet.check_balance(), 0)
+
+    def test_set_slot_count_cache_version(self):
+        """Проверка, что после удаления слотов версия баланса не уменьшается и кэш обновляется."""
+        redis = get_redis()
+        self.addCleanup(redis.delete, get_cache_key(self.hot_wallet.pk))
+        for _ in range(8):
+            self._deposit(self.hot_wallet, 1)
+        version = _load_balances([self.hot_wallet.pk])[self.hot_wallet.pk]['version']
+
+        set_slot_count(wallet_id=self.hot_wallet.pk, slot_count=1)
+        self.assertGreaterEqual(
+            _load_balances([self.hot_wallet.pk])[self.hot_wallet.pk]['version'],
+            version,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self._deposit(self.hot_wallet, 1)
+        self.assertEqual(Decimal(redis.hget(get_cache_key(self.hot_wallet.pk), 'balance')), 9)
+
+    def test_set_slot_count(self):
+        """Проверка, что при уменьшении числа слотов баланс переносится в строку кошелька."""
+        for slot in range(4):
+            WalletBalanceSlot.objects.filter(
+                wallet=self.hot_wallet,
+                slot=slot,
+            ).update(
+                balance=slot + 1,
+            )
+
+        set_slot_count(wallet_id=self.hot_wallet.pk, slot_count=2)
+        self.hot_wallet.refresh_from_db()
+        self.assertEqual(self._get_slot_balances(), [1, 2])
+        self.assertEqual((self.hot_wallet.balance, self.hot_wallet.slot_count), (7, 2))
+
+        # зачисление по устаревшему числу слотов попадает в строку кошелька
+        stale_wallet = Wallet(pk=self.hot_wallet.pk, slot_count=64)
+        for _ in range(10):
+            credit_wallet(wallet=stale_wallet, amount=Decimal(1))
+        self.hot_wallet.refresh_from_db()
+        self.assertEqual(self.hot_wallet.get_total_balance(), 20)
+
+        out = StringIO()
+        call_command('shard_wallet', str(self.hot_wallet.pk), '--slots=0', stdout=out)
+        self.hot_wallet.refresh_from_db()
+        self.assertEqual((self.hot_wallet.balance, self.hot_wallet.slot_count), (20, 0))
+        self.assertEqual(self._get_slot_balances(), [])
+        self.assertIn('0 slots, balance 20.00', out.getvalue())
+
+
+class BalanceSlotsConcurrencyTestCase(TransactionTestCase):
+    """Тест на одновременные пополнения шардированного кошелька."""
+
+    def test_concurrent_deposits(self):
+        """Проверка, что одновременные пополнения слотов не теряют обновлений."""
+        user = User.objects.create_user(email=test_email)
+        wallet = Wallet.objects.create(user=user)
+        set_slot_count(wallet_id=wallet.pk, slot_count=4)
+        wallet.refresh_from_db()
+
+        def deposit():
+            try:
+                for _ in range(10):
+                    with transaction.atomic():
+                        Transaction.objects.create(payee=wallet, amount=1)
+                        credit_wallet(wallet=wallet, amount=Decimal(1))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=deposit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.get_total_balance(), 40)
+        self.assertEqual(wallet.check_balance(), 0)
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from users.models import User
+from wallet.models import (
+    Transaction,
+    Wallet,
+    WalletBalanceSnapshot,
+)
+
+
+test_email = 'test@test.test'
+
+
+@override_settings(WALLET_BALANCE_SNAPSHOT_LAG=300)
+class BalanceSnapshotTestCase(TestCase):
+    """Тесты на сверку баланса кошелька по снимку."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        user = User.objects.create_user(email=test_email)
+        self.wallet_1 = Wallet.objects.create(user=user, balance=70)
+        self.wallet_2 = Wallet.objects.create(user=user, balance=30)
+
+        # пополнение и перевод, попадающие в снимок, и свежий перевод после него
+        self.old_deposit = self._create_transaction(
+            sender=None,
+            payee=self.wallet_1,
+            amount=100,
+            age=timedelta(hours=2),
+        )
+        self._create_transaction(
+            sender=self.wallet_1,
+            payee=self.wallet_2,
+            amount=20,
+            age=timedelta(hours=1),
+        )
+        self._create_transaction(
+            sender=self.wallet_1,
+            payee=self.wallet_2,
+            amount=10,
+            age=timedelta(seconds=1),
+        )
+
+    def _create_transaction(self, sender, payee, amount, age) -> Transaction:
+        transaction = Transaction.objects.create(sender=sender, payee=payee, amount=amount)
+        # created_at ставится автоматически, сдвигаем его в прошлое отдельным запросом
+        Transaction.objects.filter(pk=transaction.pk).update(created_at=timezone.now() - age)
+        return transaction
+
+    def test_snapshot_created(self):
+        """Проверка, что в снимок попадают только транзакции старше лага."""
+        self.assertEqual(self.wallet_1.check_balance(), 0)
+        self.assertEqual(self.wallet_2.check_balance(), 0)
+
+        snapshot = WalletBalanceSnapshot.objects.get(wallet=self.wallet_1)
+        self.assertEqual(snapshot.balance, 80)
+        self.assertLess(snapshot.cutoff, timezone.now() - timedelta(seconds=299))
+        self.assertEqual(WalletBalanceSnapshot.objects.get(wallet=self.wallet_2).balance, 20)
+
+    def test_transactions_before_cutoff_not_summed(self):
+        """Проверка, что после снимка суммируются только транзакции после cutoff."""
+        self.wallet_1.check_balance()
+        # транзакция из снимка больше не читается
+        Transaction.objects.filter(pk=self.old_deposit.pk).update(amount=1)
+
+        with self.assertNumQueries(4):
+            # снимок, транзакции между старым и новым cutoff, сдвиг снимка, свежие транзакции
+            self.assertEqual(self.wallet_1.check_balance(), 0)
+
+        with override_settings(WALLET_BALANCE_SNAPSHOT_LAG=0):
+            self.assertEqual(self.wallet_1.check_balance(), 0)
+        self.assertEqual(WalletBalanceSnapshot.objects.get(wallet=self.wallet_1).balance, 70)
+
+    def test_update_balance(self):
+        """Проверка исправления баланса по сумме транзакций."""
+        Wallet.objects.filter(pk=self.wallet_1.pk).update(balance=75)
+        wallet = Wallet.objects.get(pk=self.wallet_1.pk)
+
+        self.assertEqual(wallet.check_balance(update_balance=True), 5)
+        self.assertEqual(Wallet.objects.get(pk=self.wallet_1.pk).balance, 70)
+        self.assertEqual(wallet.check_balance(), 0)
@@ -0,0 +1,167 @@
+import uuid
+
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+
+
+test_email = 'test@test.test'
+test_password = 'Secret!1'  # noqa: S105 для тестов можно
+
+
+class BatchTransactionTestCase(TestCase):
+    """Тесты на /wallet/transaction/batch/."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user_1 = User.objects.create_user(
+            email=test_email,
+            password=test_password,
+        )
+        self.wallet_1 = Wallet.objects.create(
+            user=self.user_1,
+            balance=1000,
+        )
+        self.wallet_3 = Wallet.objects.create(
+            user=self.user_1,
+        )
+        self.user_2 = User.objects.create_user(
+            email=f'{test_email}_2',
+            password=f'{test_password}_2',
+        )
+        self.wallet_2 = Wallet.objects.create(
+            user=self.user_2,
+        )
+
+        self.client = APIClient()
+        response = self.client.post(
+            path='/auth/login/',
+            data={
+                'email': test_email,
+                'password': test_password,
+            },
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + response.json()['access'],
+        )
+
+    def _get_balance(self, wallet: Wallet):
+        return Wallet.objects.get(pk=wallet.pk).balance
+
+    def test_bad_request(self):
+        """Проверка валидации."""
+        # пустой пакет
+        response = self.client.post(
+            path='/wallet/transaction/batch/',
+            data={'transactions': []},
+            format='json',
+        )
+        self.assertIn('transactions', response.json())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # неизвестный режим и неверная сумма
+        response = self.client.post(
+            path='/wallet/transaction/batch/',
+            data={
+                'mode': 'all',
+                'transactions': [{
+                    'sender': self.wallet_1.pk,
+                    'payee': self.wallet_2.pk,
+                    'amount': -1,
+                }],
+            },
+            format='json',
+        )
+        self.assertIn('mode', response.json())
+        self.assertIn('transactions', response.json())
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_atomic_batch(self):
+        """Проверка успешного пакета: средства, полученные в пакете, можно сразу отправить."""
+        response = self.client.post(
+            path='/wallet/transaction/batch/',
+            data={
+                'transactions': [
+                    {'sender': self.wallet_1.pk, 'payee': self.wallet_3.pk, 'amount': 1000},
+                    {'sender': self.wallet_3.pk, 'payee': self.wallet_2.pk, 'amount': 300},
+                    {'sender': self.wallet_3.pk, 'payee': self.wallet_2.pk, 'amount': 200},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok', 'ok'])
+        self.assertEqual(Transaction.objects.count(), 3)
+
+        self.assertEqual(self._get_balance(self.wallet_1), 0)
+        self.assertEqual(self._get_balance(self.wallet_3), 500)
+        self.assertEqual(self._get_balance(self.wallet_2), 500)
+
+    def test_atomic_batch_failed(self):
+        """Проверка, что в режиме atomic ошибка одного перевода отменяет весь пакет."""
+        response = self.client.post(
+            path='/wallet/transaction/batch/',
+            data={
+                'mode': 'atomic',
+                'transactions': [
+                    {'sender': self.wallet_1.pk, 'payee': self.wallet_2.pk, 'amount': 600},
+                    {'sender': self.wallet_1.pk, 'payee': self.wallet_2.pk, 'amount': 600},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.json()['results'],
+            [
+                {'index': 0, 'status': 'skipped'},
+                {'index': 1, 'status': 'error', 'error': 'insufficient funds'},
+            ],
+        )
+        self.assertEqual(Transaction.objects.count(), 0)
+        self.assertEqual(self._get_balance(self.wallet_1), 1000)
+        self.assertEqual(self._get_balance(self.wallet_2), 0)
+
+    def test_best_effort_batch(self):
+        """Проверка, что в режиме best_effort проводятся все корректные переводы."""
+        response = self.client.post(
+            path='/wallet/transaction/batch/',
+            data={
+                'mode': 'best_effort',
+                'transactions': [
+                    {'sender': self.wallet_1.pk, 'payee': self.wallet_2.pk, 'amount': 600},
+                    {'sender': self.wallet_1.pk, 'payee': self.wallet_2.pk, 'amount': 600},
+                    # чужой кошелёк
+                    {'sender': self.wallet_2.pk, 'payee': self.wallet_1.pk, 'amount': 1},
+                    # несуществующий получатель
+                    {'sender': self.wallet_1.pk, 'payee': uuid.uuid4(), 'amount': 1},
+                    {'sender': self.wallet_1.pk, 'payee': self.wallet_3.pk, 'amount': 400},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['ok', 'error', 'error', 'error', 'ok'],
+        )
+        self.assertEqual(
+            [result.get('error') for result in results],
+            [None, 'insufficient funds', 'wallet not found', 'payee not found', None],
+        )
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertTrue(
+            Transaction.objects.filter(pk=results[0]['transaction'], amount=600).exists(),
+        )
+
+        self.assertEqual(self._get_balance(self.wallet_1), 0)
+        self.assertEqual(self._get_balance(self.wallet_2), 600)
+        self.assertEqual(self._get_balance(self.wallet_3), 400)
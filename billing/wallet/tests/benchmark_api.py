@@ -0,0 +1,111 @@
+import json
+import os
+import random
+import tempfile
+from collections import Counter
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import (
+    SimpleTestCase,
+    TransactionTestCase,
+)
+
+from billing.benchmark import (
+    DISTRIBUTION_UNIFORM,
+    DISTRIBUTION_ZIPF,
+    compare_results,
+    make_sampler,
+)
+from users.models import User
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+
+
+class BenchmarkHelpersTestCase(SimpleTestCase):
+    """Тесты на распределения популярности и сравнение прогонов."""
+
+    def _sample(self, distribution: str) -> Counter:
+        sample = make_sampler(
+            size=100,
+            distribution=distribution,
+            zipf_s=1.2,
+            rng=random.Random(1),  # noqa: S311
+        )
+        return Counter(sample() for _ in range(10000))
+
+    def test_uniform(self):
+        """Проверка, что при равномерном распределении нет горячих кошельков."""
+        counts = self._sample(DISTRIBUTION_UNIFORM)
+        self.assertEqual(set(counts), set(range(100)))
+        self.assertLess(counts.most_common(1)[0][1], 200)
+
+    def test_zipf(self):
+        """Проверка, что по Ципфу первый кошелёк самый горячий."""
+        counts = self._sample(DISTRIBUTION_ZIPF)
+        self.assertTrue(set(counts) <= set(range(100)))
+        self.assertEqual(counts.most_common(1)[0][0], 0)
+        self.assertGreater(counts[0], 2000)
+        self.assertGreater(counts[0], counts[1] * 2)
+
+    def test_compare_results(self):
+        """Проверка сравнения сводок двух прогонов."""
+        baseline = {'deposit': {'throughput': 100, 'p50_ms': 10, 'p90_ms': 20, 'p99_ms': 40}}
+        current = {
+            'deposit': {'throughput': 120, 'p50_ms': 10, 'p90_ms': 30, 'p99_ms': 40},
+            'login': {'throughput': 1},
+        }
+        deposit, login = compare_results(baseline, current)
+        self.assertIn('throughput 100.0 -> 120.0 (+20.0% better)', deposit)
+        self.assertIn('p50_ms 10.0 -> 10.0 (+0.0%)', deposit)
+        self.assertIn('p90_ms 20.0 -> 30.0 (+50.0% worse)', deposit)
+        self.assertEqual(login, 'login: no baseline')
+
+
+class BenchmarkApiTestCase(TransactionTestCase):
+    """
+    Тест на команду benchmark_api.
+
+    Запросы идут из потоков со своими соединениями с базой, поэтому данные
+    должны быть закоммичены (TransactionTestCase).
+    """
+
+    def test_run(self):
+        """Проверка прогона всех сценариев, вывода результатов и удаления данных замера."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmark_api',
+                '--requests=6',
+                '--users=3',
+                '--concurrency=2',
+                '--distribution=zipf',
+                '--local-locks',
+                f'--output={output}',
+                stdout=StringIO(),
+            )
+            with open(output) as results_file:
+                results = json.load(results_file)
+
+            out = StringIO()
+            call_command(
+                'benchmark_api',
+                '--scenario=deposit',
+                '--requests=2',
+                '--users=2',
+                f'--compare={output}',
+                stdout=out,
+            )
+
+        self.assertEqual(list(results['scenarios']), ['login', 'deposit', 'transaction'])
+        for result in results['scenarios'].values():
+            self.assertEqual(result['count'], 6)
+            self.assertEqual(result['status_codes'], {'200': 6})
+            self.assertGreater(result['queries_per_request'], 0)
+        self.assertIn('deposit: throughput', out.getvalue())
+
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Wallet.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
@@ -1,9 +1,19 @@
+from unittest import mock
+
 from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from users.models import User
-from wallet.models import Wallet
+from wallet.balance_slots import (
+    get_slot_totals,
+    set_slot_count,
+)
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.serializers.deposit import CreateDepositSerializer
 
 
 test_email = 'test@test.test'
@@ -113,3 +123,41 @@ class DepositTestCase(TestCase):
             ).balance,
             deposit_amount,
         )
+
+    def test_wallet_frozen_after_validation(self):
+        """Проверка, что кошелёк, замороженный после проверки запроса, не пополняется."""
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION='Bearer ' + self._get_access_token(client=client),
+        )
+        validate_payee = CreateDepositSerializer.validate_payee
+
+        def freeze_after_validation(serializer, payee):
+            try:
+                return validate_payee(serializer, payee)
+            finally:
+                User.objects.filter(pk=self.user_2.pk).deactivate()
+
+        # обычный кошелёк и горячий, пополнение которого идёт в слот
+        for slot_count in (0, 4):
+            User.objects.filter(pk=self.user_2.pk).update(is_active=True)
+            Wallet.objects.filter(pk=self.wallet_2.pk).update(is_frozen=False)
+            set_slot_count(wallet_id=self.wallet_2.pk, slot_count=slot_count)
+            with mock.patch.object(
+                CreateDepositSerializer,
+                'validate_payee',
+                freeze_after_validation,
+            ):
+                response = client.post(
+                    path='/wallet/deposit/',
+                    data={
+                        'payee': self.wallet_2.pk,
+                        'amount': 100,
+                    },
+                )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json(), {'payee': ['wallet is frozen']})
+            self.assertEqual(Wallet.objects.get(pk=self.wallet_2.pk).balance, 0)
+            slot_totals = get_slot_totals([self.wallet_2.pk]).get(self.wallet_2.pk, {})
+            self.assertEqual(slot_totals.get('balance', 0), 0)
+            self.assertFalse(Transaction.objects.exists())
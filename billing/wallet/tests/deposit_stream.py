@@ -0,0 +1,238 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from wallet.deposit_stream import (
+    apply_deposits,
+    enqueue_deposit,
+    ensure_group,
+    process_batch,
+    read_batch,
+)
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.secure_transaction import get_redis
+from wallet.tests.secure_transaction import get_unavailable_redis
+
+
+test_stream = f'test_wallet_deposits_{uuid.uuid4().hex}'
+test_dead_letter_stream = f'{test_stream}_dead'
+
+
+@override_settings(
+    WALLET_DEPOSIT_MODE='stream',
+    WALLET_DEPOSIT_STREAM=test_stream,
+    WALLET_DEPOSIT_DEAD_LETTER_STREAM=test_dead_letter_stream,
+)
+class DepositStreamTestCase(TestCase):
+    """Тесты на приём пополнений в поток редиса и их пакетное проведение."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user = User.objects.create_user(email='test@test.test')
+        self.wallet_1 = Wallet.objects.create(user=self.user)
+        self.wallet_2 = Wallet.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.redis = get_redis()
+        ensure_group(self.redis)
+
+    def tearDown(self):
+        """Удаление потока."""
+        self.redis.delete(test_stream, test_dead_letter_stream)
+
+    def _deposit(self, wallet: Wallet, amount: int, **headers):
+        return self.client.post(
+            path='/wallet/deposit/',
+            data={'payee': str(wallet.pk), 'amount': amount},
+            **headers,
+        )
+
+    def _assert_balances(self, balance_1: int, balance_2: int):
+        self.wallet_1.refresh_from_db()
+        self.wallet_2.refresh_from_db()
+        self.assertEqual(self.wallet_1.balance, balance_1)
+        self.assertEqual(self.wallet_2.balance, balance_2)
+
+    def test_deposit_amount_limit(self):
+        """Проверка, что сумма, не помещающаяся в транзакцию, не принимается в поток."""
+        response = self._deposit(self.wallet_1, 10 ** 8)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.redis.xlen(test_stream), 0)
+
+    def test_deposit_accepted(self):
+        """Проверка, что пополнение принимается в поток и проводится воркером."""
+        response = self._deposit(self.wallet_1, 10)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.redis.xlen(test_stream), 1)
+        self._assert_balances(0, 0)
+
+        self.assertEqual(process_batch(self.redis, consumer='test', latency=0), 1)
+        self._assert_balances(10, 0)
+        transaction = Transaction.objects.get(pk=response.json()['transaction'])
+        self.assertEqual(transaction.payee_id, self.wallet_1.pk)
+        self.assertIsNone(transaction.sender_id)
+        # подтверждённые сообщения удаляются из потока
+        self.assertEqual(self.redis.xlen(test_stream), 0)
+        self.assertEqual(process_batch(self.redis, consumer='test', latency=0), 0)
+
+    def test_batch_coalesces_wallets(self):
+        """Проверка, что число запросов к базе не зависит от размера пачки."""
+        query_counts = []
+        for deposits in (2, 20):
+            for number in range(deposits):
+                enqueue_deposit(payee_id=(self.wallet_1, self.wallet_2)[number % 2].pk, amount=1)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(process_batch(self.redis, consumer='test', latency=0), deposits)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+        self._assert_balances(11, 11)
+        self.assertEqual(Transaction.objects.count(), 22)
+
+    def test_batch_size(self):
+        """Проверка, что пачка не больше batch_size."""
+        for _ in range(5):
+            enqueue_deposit(payee_id=self.wallet_1.pk, amount=Decimal('1.50'))
+        self.assertEqual(process_batch(self.redis, consumer='test', batch_size=3, latency=0), 3)
+        self.assertEqual(process_batch(self.redis, consumer='test', batch_size=3, latency=0), 2)
+        self._assert_balances(Decimal('7.50'), 0)
+
+    def test_redelivery_applied_once(self):
+        """Проверка, что повторно доставленное сообщение не проводится второй раз."""
+        enqueue_deposit(payee_id=self.wallet_1.pk, amount=10)
+        entries = read_batch(self.redis, consumer='test', latency=0)
+
+        self.assertEqual(apply_deposits(entries), 1)
+        with self.assertLogs('wallet.deposit_stream', level='WARNING'):
+            self.assertEqual(apply_deposits(entries), 0)
+        self._assert_balances(10, 0)
+
+    def test_redelivery_worker_clock_behind(self):
+        """Проверка, что повтор не проводится, если часы воркера отстают от часов приёма."""
+        enqueue_deposit(payee_id=self.wallet_1.pk, amount=10)
+        entries = read_batch(self.redis, consumer='test', latency=0)
+        accepted_at = parse_datetime(entries[0][1]['accepted_at'])
+
+        with mock.patch(
+            'wallet.deposit_stream.timezone.now',
+            return_value=accepted_at - timedelta(minutes=5),
+        ):
+            self.assertEqual(apply_deposits(entries), 1)
+            with self.assertLogs('wallet.deposit_stream', level='WARNING'):
+                self.assertEqual(apply_deposits(entries), 0)
+        self._assert_balances(10, 0)
+        self.assertEqual(Transaction.objects.get().created_at, accepted_at)
+
+    def test_duplicate_in_batch(self):
+        """Проверка, что сообщение, попавшее в пачку дважды, проводится один раз."""
+        enqueue_deposit(payee_id=self.wallet_1.pk, amount=10)
+        entries = read_batch(self.redis, consumer='test', latency=0)
+
+        with self.assertLogs('wallet.deposit_stream', level='WARNING'):
+            self.assertEqual(apply_deposits(entries + entries), 1)
+        self._assert_balances(10, 0)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_idempotency_key(self):
+        """Проверка, что повтор ключа идемпотентности в потоке проводится один раз."""
+        for _ in range(2):
+            enqueue_deposit(payee_id=self.wallet_1.pk, amount=10, idempotency_key='key')
+        with self.assertLogs('wallet.deposit_stream', level='WARNING'):
+            self.assertEqual(process_batch(self.redis, consumer='test', latency=0), 2)
+        self._assert_balances(10, 0)
+        self.assertEqual(Transaction.objects.filter(idempotency_key='key').count(), 1)
+
+    def test_claim_stale(self):
+        """Проверка, что неподтверждённые сообщения упавшего воркера забирает другой."""
+        enqueue_deposit(payee_id=self.wallet_1.pk, amount=10)
+        self.assertEqual(len(read_batch(self.redis, consumer='crashed', latency=0)), 1)
+        self.assertEqual(process_batch(self.redis, consumer='test', latency=0), 0)
+
+        with override_settings(WALLET_DEPOSIT_CLAIM_IDLE=0):
+            self.assertEqual(process_batch(self.redis, consumer='test', latency=0), 1)
+        self._assert_balances(10, 0)
+
+    def test_poison_message(self):
+        """Проверка, что непроводимое сообщение не держит пачку и уходит в недоставленные."""
+        enqueue_deposit(payee_id=self.wallet_1.pk, amount=10)
+        enqueue_deposit(payee_id=self.wallet_1.pk, amount=Decimal(10 ** 9))
+        enqueue_deposit(payee_id=self.wallet_2.pk, amount=5)
+
+        with self.assertLogs('wallet.deposit_stream', level='ERROR'):
+            self.assertEqual(process_batch(self.redis, consumer='test', latency=0), 3)
+        self._assert_balances(10, 5)
+        # непроведённое сообщение остаётся неподтверждённым
+        self.assertEqual(self.redis.xlen(test_stream), 1)
+        self.assertEqual(self.redis.xlen(test_dead_letter_stream), 0)
+
+        with override_settings(WALLET_DEPOSIT_CLAIM_IDLE=0, WALLET_DEPOSIT_MAX_DELIVERIES=2):
+            with self.assertLogs('wallet.deposit_stream', level='ERROR'):
+                self.assertEqual(process_batch(self.redis, consumer='test', latency=0), 1)
+        self.assertEqual(self.redis.xlen(test_stream), 0)
+        [(_, fields)] = self.redis.xrange(test_dead_letter_stream)
+        self.assertEqual(fields['amount'], str(10 ** 9))
+        self.assertIn('DataError', fields['reason'])
+        self._assert_balances(10, 5)
+
+    def test_wallet_frozen_while_queued(self):
+        """Проверка, что пополнение замороженного после приёма кошелька не теряется."""
+        response = self._deposit(self.wallet_1, 10)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self._deposit(self.wallet_2, 5)
+        Wallet.objects.filter(pk=self.wallet_1.pk).update(is_frozen=True)
+
+        with self.assertLogs('wallet.deposit_stream', level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(process_batch(self.redis, consumer='test', latency=0), 2)
+        self._assert_balances(0, 5)
+        self.assertEqual(self.redis.xlen(test_stream), 0)
+        [(_, fields)] = self.redis.xrange(test_dead_letter_stream)
+        self.assertEqual(fields['id'], response.json()['transaction'])
+        self.assertEqual(fields['reason'], 'wallet is frozen')
+        self.assertFalse(Transaction.objects.filter(pk=fields['id']).exists())
+
+    def test_redis_unavailable(self):
+        """Проверка, что без редиса пополнение проводится сразу."""
+        with mock.patch('wallet.deposit_stream.get_redis', get_unavailable_redis):
+            with self.assertLogs('wallet.views.deposit', level='WARNING'):
+                response = self._deposit(self.wallet_1, 10)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self._assert_balances(10, 0)
+
+    def test_worker_command(self):
+        """Проверка команды воркера, останавливающейся на пустом потоке."""
+        for _ in range(3):
+            self.assertEqual(self._deposit(self.wallet_2, 5).status_code, status.HTTP_202_ACCEPTED)
+        out = StringIO()
+        call_command('deposit_worker', latency=0, exit_when_empty=True, stdout=out)
+        self.assertIn('3 deposits', out.getvalue())
+        self._assert_balances(0, 15)
+
+    @mock.patch('wallet.management.commands.deposit_worker.ERROR_DELAY', 0)
+    def test_worker_survives_errors(self):
+        """Проверка, что воркер продолжает работу после любой ошибки пачки."""
+        with mock.patch(
+            'wallet.management.commands.deposit_worker.process_batch',
+            side_effect=[ValueError('broken'), 1, 0],
+        ):
+            with self.assertLogs('wallet.management.commands.deposit_worker', level='ERROR'):
+                out = StringIO()
+                call_command('deposit_worker', latency=0, exit_when_empty=True, stdout=out)
+        self.assertIn('1 deposits', out.getvalue())
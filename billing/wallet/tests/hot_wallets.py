@@ -0,0 +1,152 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from wallet.constants import (
+    HOT_WALLETS_ORDER_TIMEOUTS,
+    HOT_WALLETS_ORDER_TRANSFERS,
+    HOT_WALLETS_ORDERINGS,
+)
+from wallet.hot_wallets import get_hot_wallets
+from wallet.models import Wallet
+from wallet.secure_transaction import (
+    get_current_bucket,
+    get_redis,
+    get_window_key,
+    lock_stats,
+)
+from wallet.tests.secure_transaction import get_unavailable_redis
+from wallet.transfer_engine import make_transfer
+
+
+test_email = 'test@test.test'
+
+
+# отдельный размер интервала, чтобы в окно не попала статистика других тестов
+@override_settings(
+    WALLET_CONTENTION_BUCKET=7,
+    WALLET_CONTENTION_SAMPLE_RATE=1,
+    WALLET_LOCK_CONTENTION_THRESHOLD=0.005,
+    WALLET_LOCK_BACKEND='wallet.secure_transaction.LocalWalletLock',
+)
+class HotWalletsTestCase(TestCase):
+    """Тесты на статистику горячих кошельков, /internal/hot-wallets/ и команду hot_wallets."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user = User.objects.create_user(email=test_email, is_staff=True)
+        self.hot_wallet = Wallet.objects.create(user=self.user, balance=100)
+        self.wallet = Wallet.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        """Удаление статистики теста."""
+        bucket = get_current_bucket()
+        get_redis().delete(*[
+            get_window_key(metric=metric, bucket=bucket - offset)
+            for metric in HOT_WALLETS_ORDERINGS
+            for offset in range(2)
+        ])
+
+    def _record_traffic(self):
+        for _ in range(3):
+            lock_stats.record([self.hot_wallet.pk, self.wallet.pk], wait_time=0.1)
+        lock_stats.record([self.hot_wallet.pk], wait_time=0.5, is_timeout=True)
+        lock_stats.record([self.wallet.pk], wait_time=0)
+
+    def test_hot_wallets(self):
+        """Проверка ожидания, переводов, таймаутов и порядка горячих кошельков."""
+        self._record_traffic()
+
+        hot, other = get_hot_wallets(limit=10, window=60)
+        self.assertEqual(hot['wallet_id'], str(self.hot_wallet.pk))
+        self.assertEqual(
+            (hot['wait_ms'], hot['transfers'], hot['timeouts'], hot['avg_wait_ms']),
+            (800, 3, 1, 200),
+        )
+        self.assertGreater(hot['queue_depth'], 0)
+        self.assertEqual(other['wallet_id'], str(self.wallet.pk))
+        self.assertEqual((other['wait_ms'], other['transfers']), (300, 4))
+
+        top = get_hot_wallets(limit=1, window=60, order_by=HOT_WALLETS_ORDER_TRANSFERS)
+        self.assertEqual([wallet['wallet_id'] for wallet in top], [str(self.wallet.pk)])
+        top = get_hot_wallets(limit=10, window=60, order_by=HOT_WALLETS_ORDER_TIMEOUTS)
+        self.assertEqual(top[0]['wallet_id'], str(self.hot_wallet.pk))
+
+    @override_settings(WALLET_CONTENTION_SAMPLE_RATE=0.5)
+    def test_sampling(self):
+        """Проверка, что переводы без ожидания записываются с весом выборки."""
+        for _ in range(200):
+            lock_stats.record([self.wallet.pk], wait_time=0)
+
+        wallet, = get_hot_wallets(limit=10, window=60)
+        self.assertEqual(wallet['transfers'] % 2, 0)
+        self.assertGreater(wallet['transfers'], 100)
+        self.assertLess(wallet['transfers'], 300)
+
+    def test_transfer(self):
+        """Проверка, что перевод записывается в статистику обоих кошельков."""
+        make_transfer(
+            user_id=self.user.pk,
+            sender_id=self.hot_wallet.pk,
+            payee_id=self.wallet.pk,
+            amount=10,
+        )
+        hot_wallets = get_hot_wallets(limit=10, window=60, order_by=HOT_WALLETS_ORDER_TRANSFERS)
+        self.assertEqual(
+            {wallet['wallet_id']: wallet['transfers'] for wallet in hot_wallets},
+            {str(self.hot_wallet.pk): 1, str(self.wallet.pk): 1},
+        )
+
+    def test_view(self):
+        """Проверка ответа /internal/hot-wallets/ и доступа только для администратора."""
+        self._record_traffic()
+
+        response = self.client.get('/internal/hot-wallets/', {'limit': 1, 'window': 60})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['window'], 60)
+        self.assertEqual(
+            [wallet['wallet_id'] for wallet in response.json()['wallets']],
+            [str(self.hot_wallet.pk)],
+        )
+
+        # отдаётся окно после ограничения WALLET_CONTENTION_MAX_WINDOW
+        with override_settings(WALLET_CONTENTION_MAX_WINDOW=30):
+            response = self.client.get('/internal/hot-wallets/', {'window': 60})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['window'], 30)
+
+        response = self.client.get('/internal/hot-wallets/', {'order_by': 'balance'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.user.is_staff = False
+        self.user.save(update_fields=['is_staff'])
+        response = self.client.get('/internal/hot-wallets/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_view_redis_unavailable(self):
+        """Проверка, что без редиса /internal/hot-wallets/ отвечает 503."""
+        with mock.patch('wallet.hot_wallets.get_redis', get_unavailable_redis):
+            with self.assertLogs('wallet.views.hot_wallets', level='WARNING'):
+                response = self.client.get('/internal/hot-wallets/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_command(self):
+        """Проверка вывода команды hot_wallets."""
+        out = StringIO()
+        call_command('hot_wallets', stdout=out)
+        self.assertIn('no lock activity', out.getvalue())
+
+        self._record_traffic()
+        out = StringIO()
+        call_command('hot_wallets', '--limit=1', stdout=out)
+        self.assertIn(f'{self.hot_wallet.pk} ({test_email}): wait 800.0 ms', out.getvalue())
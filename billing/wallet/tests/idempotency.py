@@ -0,0 +1,216 @@
+import json
+import uuid
+from unittest import (
+    mock,
+    skipUnless,
+)
+
+from django.db import connection
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from wallet.deposit_stream import (
+    ensure_group,
+    process_batch,
+)
+from wallet.idempotency import (
+    REPLAYED_HEADER,
+    get_record_key,
+)
+from wallet.models import (
+    Transaction,
+    TransactionIdempotencyKey,
+    Wallet,
+)
+from wallet.secure_transaction import get_redis
+from wallet.tests.secure_transaction import get_unavailable_redis
+
+
+test_email = 'test@test.test'
+
+
+class IdempotencyTestCase(TestCase):
+    """Тесты на заголовок Idempotency-Key для /wallet/transaction/ и /wallet/deposit/."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user_1 = User.objects.create_user(email=test_email)
+        self.wallet_1 = Wallet.objects.create(user=self.user_1, balance=100)
+        self.user_2 = User.objects.create_user(email=f'{test_email}_2')
+        self.wallet_2 = Wallet.objects.create(user=self.user_2)
+
+        self.redis = get_redis()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user_1)
+        self.key = uuid.uuid4().hex
+        self.transfer = {'sender': self.wallet_1.pk, 'payee': self.wallet_2.pk, 'amount': 10}
+
+    def tearDown(self):
+        """Удаляем ответы тестовых запросов из редиса."""
+        for user in (self.user_1, self.user_2):
+            self.redis.delete(get_record_key(f'{user.pk}:{self.key}'))
+
+    def _post(self, path: str, data: dict, key: str = None):
+        return self.client.post(
+            path=path,
+            data=data,
+            HTTP_IDEMPOTENCY_KEY=key or self.key,
+        )
+
+    def _assert_balances(self, balance_1: int, balance_2: int):
+        self.wallet_1.refresh_from_db()
+        self.wallet_2.refresh_from_db()
+        self.assertEqual((self.wallet_1.balance, self.wallet_2.balance), (balance_1, balance_2))
+
+    def test_transaction_replay(self):
+        """Проверка, что повтор перевода отдаёт сохранённый ответ без запросов к базе."""
+        response = self._post('/wallet/transaction/', self.transfer)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(REPLAYED_HEADER, response)
+
+        with self.assertNumQueries(0):
+            response = self._post('/wallet/transaction/', self.transfer)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response[REPLAYED_HEADER], 'true')
+
+        self._assert_balances(90, 10)
+        self.assertEqual(
+            Transaction.objects.get(sender=self.wallet_1).idempotency_key,
+            f'{self.user_1.pk}:{self.key}',
+        )
+
+    def test_deposit_replay(self):
+        """Проверка, что повтор пополнения не зачисляет средства второй раз."""
+        for _ in range(3):
+            response = self._post('/wallet/deposit/', {'payee': self.wallet_2.pk, 'amount': 5})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self._assert_balances(100, 5)
+        self.assertEqual(Transaction.objects.filter(payee=self.wallet_2).count(), 1)
+
+    def test_error_replay(self):
+        """Проверка, что ошибка перевода тоже сохраняется и повторяется."""
+        data = {**self.transfer, 'amount': 1000}
+        response = self._post('/wallet/transaction/', data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self._post('/wallet/transaction/', data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'error': 'insufficient funds'})
+        self.assertEqual(response[REPLAYED_HEADER], 'true')
+
+    def test_validation_error_not_stored(self):
+        """Проверка, что после ошибки валидации запрос с тем же ключом выполняется."""
+        response = self._post('/wallet/transaction/', {**self.transfer, 'amount': -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self._post('/wallet/transaction/', self.transfer)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(REPLAYED_HEADER, response)
+        self._assert_balances(90, 10)
+
+    def test_key_reuse(self):
+        """Проверка ошибки при повторе ключа с другим запросом."""
+        self._post('/wallet/transaction/', self.transfer)
+        response = self._post('/wallet/transaction/', {**self.transfer, 'amount': 20})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self._assert_balances(90, 10)
+
+    def test_keys_of_different_users(self):
+        """Проверка, что одинаковые ключи разных пользователей не пересекаются."""
+        self._post('/wallet/transaction/', self.transfer)
+
+        self.client.force_authenticate(self.user_2)
+        response = self._post(
+            '/wallet/transaction/',
+            {'sender': self.wallet_2.pk, 'payee': self.wallet_1.pk, 'amount': 3},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(REPLAYED_HEADER, response)
+        self._assert_balances(93, 7)
+
+    def test_invalid_key(self):
+        """Проверка ошибки на слишком длинный ключ."""
+        response = self._post('/wallet/transaction/', self.transfer, key='k' * 65)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self._assert_balances(100, 0)
+
+    @override_settings(WALLET_IDEMPOTENCY_WAIT_TIMEOUT=0.05)
+    def test_in_progress(self):
+        """Проверка ответа 409, пока первый запрос с тем же ключом ещё выполняется."""
+        self._post('/wallet/transaction/', self.transfer)
+        record_key = get_record_key(f'{self.user_1.pk}:{self.key}')
+        record = json.loads(self.redis.get(record_key))
+        self.redis.set(record_key, json.dumps({'fingerprint': record['fingerprint']}))
+
+        response = self._post('/wallet/transaction/', self.transfer)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self._assert_balances(90, 10)
+
+    def test_redis_record_lost(self):
+        """Проверка, что без ответа в редисе дубликат отсекается по базе."""
+        self._post('/wallet/transaction/', self.transfer)
+        self.redis.delete(get_record_key(f'{self.user_1.pk}:{self.key}'))
+
+        response = self._post('/wallet/transaction/', self.transfer)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response[REPLAYED_HEADER], 'true')
+        self._assert_balances(90, 10)
+
+    def test_stream_deposit_record_lost(self):
+        """Проверка, что повтор пополнения через поток без ответа в редисе отдаёт id транзакции."""
+        stream = f'test_wallet_deposits_{uuid.uuid4().hex}'
+        self.addCleanup(self.redis.delete, stream)
+        with override_settings(WALLET_DEPOSIT_MODE='stream', WALLET_DEPOSIT_STREAM=stream):
+            ensure_group(self.redis)
+            deposit = {'payee': self.wallet_2.pk, 'amount': 5}
+            response = self._post('/wallet/deposit/', deposit)
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            accepted = response.json()
+            process_batch(self.redis, consumer='test', latency=0)
+            self.redis.delete(get_record_key(f'{self.user_1.pk}:{self.key}'))
+
+            response = self._post('/wallet/deposit/', deposit)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response[REPLAYED_HEADER], 'true')
+        self.assertEqual(response.json(), accepted)
+        self._assert_balances(100, 5)
+
+    def test_redis_unavailable(self):
+        """Проверка, что без редиса дубликат отсекается ключом идемпотентности в базе."""
+        with mock.patch('wallet.idempotency.get_redis', get_unavailable_redis):
+            with self.assertLogs('wallet.idempotency', level='WARNING'):
+                self._post('/wallet/deposit/', {'payee': self.wallet_2.pk, 'amount': 5})
+                # одновременный повтор: проверка в базе прошла раньше, чем первый запрос закоммитил
+                with mock.patch(
+                    'wallet.idempotency.TransactionIdempotencyKey.objects.filter',
+                ) as filter_mock:
+                    filter_mock.return_value.first.side_effect = [
+                        None,
+                        TransactionIdempotencyKey(response_status=status.HTTP_200_OK),
+                    ]
+                    response = self._post(
+                        '/wallet/deposit/',
+                        {'payee': self.wallet_2.pk, 'amount': 5},
+                    )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response[REPLAYED_HEADER], 'true')
+        self._assert_balances(100, 5)
+
+    @skipUnless(connection.vendor == 'postgresql', 'conditional transfer requires PostgreSQL')
+    @override_settings(WALLET_TRANSFER_ENGINE='conditional')
+    def test_conditional_engine(self):
+        """Проверка сохранения ключа при переводе одним запросом."""
+        self._post('/wallet/transaction/', self.transfer)
+        self.redis.delete(get_record_key(f'{self.user_1.pk}:{self.key}'))
+        self._post('/wallet/transaction/', self.transfer)
+
+        self._assert_balances(90, 10)
+        self.assertTrue(
+            Transaction.objects.filter(idempotency_key=f'{self.user_1.pk}:{self.key}').exists(),
+        )
@@ -0,0 +1,138 @@
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase
+from django.test.client import AsyncRequestFactory
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from billing.metrics import (
+    STAGE_AUTH,
+    STAGE_LOCK_WAIT,
+    STAGE_SQL,
+    STAGE_TRANSACTION,
+    STAGE_VALIDATION,
+    request_metrics,
+)
+from users.models import User
+from wallet.models import Wallet
+from wallet.views import create_deposit_async
+
+
+test_email = 'test@test.test'
+transaction_endpoint = 'wallet/transaction/'
+
+
+class MetricsTestCase(TransactionTestCase):
+    """
+    Тесты на метрики запросов и /metrics.
+
+    Асинхронная вью выполняет запросы к базе в потоках пула, поэтому данные теста
+    должны быть закоммичены (TransactionTestCase).
+    """
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user = User.objects.create_user(email=test_email)
+        self.wallet_1 = Wallet.objects.create(user=self.user, balance=100)
+        self.wallet_2 = Wallet.objects.create(user=self.user)
+        self.token = AccessToken.for_user(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def _get_count(self, name: str, **labels) -> float:
+        return REGISTRY.get_sample_value(f'{name}_count', labels) or 0
+
+    def _get_sum(self, name: str, **labels) -> float:
+        return REGISTRY.get_sample_value(f'{name}_sum', labels) or 0
+
+    def test_transaction_stages(self):
+        """Проверка замеров этапов и SQL запросов перевода."""
+        stages = (STAGE_AUTH, STAGE_VALIDATION, STAGE_LOCK_WAIT, STAGE_TRANSACTION, STAGE_SQL)
+        stages_before = {
+            stage: self._get_count(
+                'billing_request_stage_duration_seconds',
+                endpoint=transaction_endpoint,
+                stage=stage,
+            )
+            for stage in stages
+        }
+        requests_before = self._get_count(
+            'billing_request_duration_seconds',
+            endpoint=transaction_endpoint,
+            method='POST',
+            status='200',
+        )
+        queries_before = self._get_sum('billing_request_sql_queries', endpoint=transaction_endpoint)
+
+        response = self.client.post(
+            path='/wallet/transaction/',
+            data={'sender': str(self.wallet_1.pk), 'payee': str(self.wallet_2.pk), 'amount': 10},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for stage in stages:
+            self.assertEqual(
+                self._get_count(
+                    'billing_request_stage_duration_seconds',
+                    endpoint=transaction_endpoint,
+                    stage=stage,
+                ),
+                stages_before[stage] + 1,
+                stage,
+            )
+        self.assertEqual(
+            self._get_count(
+                'billing_request_duration_seconds',
+                endpoint=transaction_endpoint,
+                method='POST',
+                status='200',
+            ),
+            requests_before + 1,
+        )
+        self.assertGreater(
+            self._get_sum('billing_request_sql_queries', endpoint=transaction_endpoint),
+            queries_before,
+        )
+
+    def test_metrics_endpoint(self):
+        """Проверка выдачи метрик в текстовом формате Prometheus."""
+        self.client.post(
+            path='/wallet/deposit/',
+            data={'payee': str(self.wallet_2.pk), 'amount': 1},
+        )
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        content = response.content.decode()
+        self.assertIn('# TYPE billing_request_stage_duration_seconds histogram', content)
+        self.assertIn(
+            'billing_request_stage_duration_seconds_count{endpoint="wallet/deposit/",'
+            'stage="transaction"}',
+            content,
+        )
+
+    def test_async_view_stages(self):
+        """Проверка, что этапы из потока пула асинхронной вью попадают в замер запроса."""
+        request = AsyncRequestFactory().post(
+            '/wallet/deposit/',
+            data={'payee': str(self.wallet_2.pk), 'amount': 1},
+            content_type='application/json',
+            authorization=f'Bearer {self.token}',
+        )
+        with request_metrics() as metrics:
+            response = async_to_sync(create_deposit_async)(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            {STAGE_AUTH, STAGE_VALIDATION, STAGE_TRANSACTION, STAGE_SQL} <= set(metrics.stages),
+        )
+        self.assertGreater(metrics.sql_queries, 0)
+
+    def test_outside_request(self):
+        """Проверка, что вне запроса SQL запросы не учитываются."""
+        with request_metrics() as metrics:
+            Wallet.objects.count()
+        Wallet.objects.count()
+        self.assertEqual(metrics.sql_queries, 1)
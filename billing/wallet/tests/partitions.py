@@ -0,0 +1,180 @@
+import csv
+import gzip
+import os
+import tempfile
+import uuid
+from datetime import (
+    datetime,
+    timezone,
+)
+from io import StringIO
+from unittest import (
+    mock,
+    skipUnless,
+)
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from wallet.models import (
+    Transaction,
+    TransactionArchive,
+    TransactionIdempotencyKey,
+    Wallet,
+)
+from wallet.partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    archive_partition,
+    create_partition,
+    create_partitions,
+    get_archived_until,
+    get_month,
+    get_partition_name,
+    get_partitions,
+    is_partitioned,
+)
+from wallet.reconciliation import reconcile_partition
+
+
+old_month = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'partitioning requires PostgreSQL')
+class PartitionsTestCase(TestCase):
+    """Тесты на секционирование и архивацию таблицы транзакций."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user = User.objects.create_user(email='test@test.test')
+        self.wallet_1 = Wallet.objects.create(user=self.user, balance=70)
+        self.wallet_2 = Wallet.objects.create(user=self.user, balance=30)
+        self.directory = tempfile.mkdtemp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_old_transactions(self):
+        """Пополнение и перевод в старом месяце (строки попадают в секцию по умолчанию)."""
+        for transaction in (
+            Transaction.objects.create(payee=self.wallet_1, amount=100),
+            Transaction.objects.create(sender=self.wallet_1, payee=self.wallet_2, amount=30),
+        ):
+            Transaction.objects.filter(pk=transaction.pk).update(created_at=old_month)
+
+    def _count(self, table: str) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {table}')  # noqa: S608
+            return cursor.fetchone()[0]
+
+    def test_partitioned(self):
+        """Проверка, что после миграций таблица секционирована и секции созданы заранее."""
+        self.assertTrue(is_partitioned())
+        self.assertIn(get_partition_name(get_month(datetime.now(timezone.utc))), get_partitions())
+        self.assertEqual(create_partitions(), [])
+
+    def test_create_partition_moves_default_rows(self):
+        """Проверка, что строки месяца переносятся из секции по умолчанию в его секцию."""
+        self._create_old_transactions()
+        self.assertEqual(self._count(DEFAULT_PARTITION), 2)
+
+        self.assertTrue(create_partition(old_month))
+        self.assertFalse(create_partition(old_month))
+        self.assertEqual(self._count(DEFAULT_PARTITION), 0)
+        self.assertEqual(self._count(get_partition_name(old_month)), 2)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_partition_pruning(self):
+        """Проверка, что запрос за месяц читает только секцию этого месяца."""
+        create_partition(old_month)
+        month = get_month(datetime.now(timezone.utc))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'EXPLAIN SELECT * FROM {Transaction._meta.db_table} '  # noqa: S608
+                'WHERE payee_id = %s AND created_at >= %s AND created_at < %s',
+                [self.wallet_1.pk, month, add_months(month, 1)],
+            )
+            plan = '\n'.join(row for row, in cursor.fetchall())
+        self.assertIn(get_partition_name(month), plan)
+        self.assertNotIn(get_partition_name(add_months(month, 1)), plan)
+        self.assertNotIn(get_partition_name(old_month), plan)
+        self.assertNotIn(DEFAULT_PARTITION, plan)
+
+    def test_archive(self):
+        """Проверка выгрузки месяца: CSV, удаление секции, сверка и ключи идемпотентности."""
+        self._create_old_transactions()
+        TransactionIdempotencyKey.objects.create(
+            key='old',
+            transaction_id=Transaction.objects.first().pk,
+            created_at=old_month,
+        )
+        key = str(uuid.uuid4())
+        response = self.client.post(
+            path='/wallet/deposit/',
+            data={'payee': str(self.wallet_2.pk), 'amount': 10},
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        archive = archive_partition(month=old_month, directory=self.directory)
+
+        self.assertEqual(archive.rows, 2)
+        self.assertEqual(get_archived_until(), add_months(old_month, 1))
+        self.assertNotIn(get_partition_name(old_month), get_partitions())
+        self.assertEqual(Transaction.objects.count(), 1)
+        with gzip.open(archive.path, 'rt') as archive_file:
+            rows = list(csv.DictReader(archive_file))
+        self.assertEqual(sorted(row['amount'] for row in rows), ['100.00', '30.00'])
+
+        # снимки балансов покрывают выгруженные транзакции
+        for wallet in (self.wallet_1, self.wallet_2):
+            wallet.refresh_from_db()
+            self.assertEqual(wallet.check_balance(), 0)
+        result = reconcile_partition(lower=uuid.UUID(int=0), upper=uuid.UUID(int=2 ** 128 - 1))
+        self.assertEqual(result['mismatches'], 0)
+        self.assertEqual(
+            list(TransactionIdempotencyKey.objects.values_list('key', flat=True)),
+            [f'{self.user.pk}:{key}'],
+        )
+
+    def test_archive_failure_keeps_partition(self):
+        """Проверка, что при ошибке после выгрузки секция остаётся в базе."""
+        self._create_old_transactions()
+        with mock.patch('wallet.partitions.advance_snapshots', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                archive_partition(month=old_month, directory=self.directory)
+
+        self.assertIn(get_partition_name(old_month), get_partitions())
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertFalse(TransactionArchive.objects.exists())
+        # файл выгружен до блокировки и будет перезаписан при повторном запуске
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, f'{get_partition_name(old_month)}.csv.gz')),
+        )
+        self.assertEqual(archive_partition(month=old_month, directory=self.directory).rows, 2)
+
+    def test_archive_open_month(self):
+        """Проверка, что текущий месяц не архивируется."""
+        with self.assertRaises(ValueError):
+            archive_partition(month=get_month(datetime.now(timezone.utc)), directory=self.directory)
+        self.assertFalse(TransactionArchive.objects.exists())
+
+    def test_archive_command(self):
+        """Проверка команды архивации месяцев до заданного."""
+        self._create_old_transactions()
+        create_partition(old_month)
+        out = StringIO()
+        call_command(
+            'archive_transactions',
+            before='2020-02',
+            output_dir=self.directory,
+            stdout=out,
+        )
+        self.assertIn(get_partition_name(old_month), out.getvalue())
+        self.assertTrue(
+            os.path.exists(os.path.join(self.directory, f'{get_partition_name(old_month)}.csv.gz')),
+        )
+        self.assertEqual(Transaction.objects.count(), 0)
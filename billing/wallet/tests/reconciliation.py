@@ -0,0 +1,66 @@
+import uuid
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from users.models import User
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.reconciliation import (
+    get_partitions,
+    reconcile_partition,
+)
+
+
+class ReconciliationTestCase(TestCase):
+    """Тесты на сверку балансов всех кошельков."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        user = User.objects.create_user(email='test@test.test')
+        self.wallet_1 = Wallet.objects.create(user=user, balance=70)
+        self.wallet_2 = Wallet.objects.create(user=user, balance=30)
+        self.wallet_3 = Wallet.objects.create(user=user, balance=0)
+        Transaction.objects.create(payee=self.wallet_1, amount=100)
+        Transaction.objects.create(sender=self.wallet_1, payee=self.wallet_2, amount=30)
+        # перевод самому себе не меняет баланс
+        Transaction.objects.create(sender=self.wallet_3, payee=self.wallet_3, amount=5)
+
+    def test_partitions(self):
+        """Проверка, что диапазоны покрывают все id без пересечений."""
+        partitions = get_partitions(3)
+        self.assertEqual(partitions[0][0], uuid.UUID(int=0))
+        self.assertEqual(partitions[-1][1], uuid.UUID(int=2 ** 128 - 1))
+        for (_, upper), (lower, _) in zip(partitions, partitions[1:]):
+            self.assertEqual(upper.int + 1, lower.int)
+
+    def test_no_mismatches(self):
+        """Проверка, что сошедшиеся балансы не попадают в расхождения."""
+        result = reconcile_partition(*get_partitions(1)[0])
+        self.assertEqual(result['checked'], 3)
+        self.assertEqual(result['mismatches'], 0)
+
+    def test_fix(self):
+        """Проверка поиска и исправления расхождений пачками."""
+        Wallet.objects.filter(pk=self.wallet_1.pk).update(balance=75)
+        Wallet.objects.filter(pk=self.wallet_3.pk).update(balance=-1)
+
+        out = StringIO()
+        call_command(
+            'reconcile_wallets',
+            '--workers=1',
+            '--partitions=4',
+            '--batch-size=1',
+            '--fix',
+            stdout=out,
+        )
+        self.assertIn(str(self.wallet_1.pk), out.getvalue())
+        self.assertIn('checked 3 wallets', out.getvalue())
+        self.assertIn('2 mismatches, 2 fixed', out.getvalue())
+
+        self.assertEqual(Wallet.objects.get(pk=self.wallet_1.pk).balance, 70)
+        self.assertEqual(Wallet.objects.get(pk=self.wallet_3.pk).balance, 0)
+        self.assertEqual(reconcile_partition(*get_partitions(1)[0])['mismatches'], 0)
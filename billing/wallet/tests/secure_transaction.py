@@ -0,0 +1,434 @@
+import threading
+import uuid
+from unittest import (
+    mock,
+    skipUnless,
+)
+
+from django.conf import settings
+from django.db import (
+    OperationalError,
+    connection,
+)
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from redis import StrictRedis
+from redis.exceptions import (
+    ConnectionError,
+    TimeoutError,
+)
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from billing import redis_pool
+from users.models import User
+from wallet.models import Wallet
+from wallet.secure_transaction import (
+    AdvisoryWalletLock,
+    BaseWalletLock,
+    LocalWalletLock,
+    LockBackendUnavailable,
+    RedisWalletLock,
+    WalletLockTimeout,
+    get_full_key,
+    get_redis,
+    get_stats_key,
+    lease_renewer,
+    lock_stats,
+    locked_atomic,
+    retry_on_conflict,
+)
+from wallet.transfer_engine import make_transfer
+
+
+def get_unavailable_redis() -> StrictRedis:
+    """Редис, к которому нельзя подключиться."""
+    return StrictRedis(host='localhost', port=1)
+
+
+class WalletLockTestCase(TestCase):
+    """Тесты на бэкенды локов кошельков."""
+
+    def setUp(self):
+        """Ошибка редиса в другом тесте (test_fallback) не должна приостанавливать статистику."""
+        lock_stats._paused_until = 0
+
+    def test_sort_wallet_ids(self):
+        """Проверка, что локи берутся в одном порядке независимо от порядка аргументов."""
+        wallet_ids = [uuid.uuid4() for _ in range(5)]
+        self.assertEqual(
+            BaseWalletLock.sort_wallet_ids(wallet_ids),
+            BaseWalletLock.sort_wallet_ids(reversed(wallet_ids + wallet_ids)),
+        )
+        self.assertEqual(len(BaseWalletLock.sort_wallet_ids(wallet_ids + wallet_ids)), 5)
+
+    def test_local_lock(self):
+        """Проверка, что второй лок на кошелёк ждёт освобождения первого."""
+        wallet_id = uuid.uuid4()
+        is_locked = threading.Event()
+
+        def worker():
+            with LocalWalletLock().atomic(wallet_id):
+                is_locked.set()
+            connection.close()
+
+        with LocalWalletLock().atomic(wallet_id, uuid.uuid4()):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            self.assertFalse(is_locked.wait(timeout=0.1))
+
+        self.assertTrue(is_locked.wait(timeout=1))
+        thread.join()
+        self.assertNotIn(str(wallet_id), LocalWalletLock._locks)
+
+    def test_redis_lock_all_or_nothing(self):
+        """Проверка, что redis лок берёт либо все кошельки сразу, либо ни одного."""
+        wallet_1, wallet_2 = uuid.uuid4(), uuid.uuid4()
+        is_locked = threading.Event()
+
+        def worker():
+            with RedisWalletLock().atomic(wallet_2, wallet_1):
+                is_locked.set()
+            connection.close()
+
+        with RedisWalletLock().atomic(wallet_1):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            self.assertFalse(is_locked.wait(timeout=0.1))
+            # второй кошелёк не захвачен, пока первый занят
+            self.assertFalse(get_redis().exists(get_full_key(wallet_id=wallet_2)))
+
+        self.assertTrue(is_locked.wait(timeout=1))
+        thread.join()
+        self.assertFalse(get_redis().exists(get_full_key(wallet_id=wallet_1)))
+        self.assertFalse(get_redis().exists(get_full_key(wallet_id=wallet_2)))
+
+    def _occupy_wallet(self, wallet_id: uuid.UUID, lease_ms: int = None):
+        """Лок кошелька другим (например, упавшим) воркером."""
+        key = get_full_key(wallet_id=wallet_id)
+        get_redis().set(key, 'other worker', px=lease_ms)
+        self.addCleanup(get_redis().delete, key)
+
+    @override_settings(WALLET_LOCK_LEASE=5)
+    def test_redis_lock_lease(self):
+        """Проверка, что лок ставится со временем жизни и продлевается, пока он взят."""
+        wallet_id = uuid.uuid4()
+        key = get_full_key(wallet_id=wallet_id)
+
+        with RedisWalletLock().atomic(wallet_id):
+            self.assertTrue(0 < get_redis().pttl(key) <= 5000)
+            with override_settings(WALLET_LOCK_LEASE=60):
+                lease_renewer.renew_all()
+            self.assertGreater(get_redis().pttl(key), 5000)
+
+        self.assertFalse(get_redis().exists(key))
+
+    @override_settings(WALLET_LOCK_ACQUIRE_TIMEOUT=1)
+    def test_redis_lock_expired_lease(self):
+        """Проверка, что лок упавшего воркера освобождается по истечении времени жизни."""
+        wallet_id = uuid.uuid4()
+        self._occupy_wallet(wallet_id=wallet_id, lease_ms=50)
+
+        with RedisWalletLock().atomic(wallet_id):
+            self.assertNotEqual(get_redis().get(get_full_key(wallet_id=wallet_id)), 'other worker')
+
+    @override_settings(WALLET_LOCK_ACQUIRE_TIMEOUT=0.05, WALLET_LOCK_RETRY_AFTER=3)
+    def test_redis_lock_timeout(self):
+        """Проверка, что занятый кошелёк ждём не дольше таймаута и пишем статистику."""
+        wallet_1, wallet_2 = uuid.uuid4(), uuid.uuid4()
+        self._occupy_wallet(wallet_id=wallet_1)
+        for wallet_id in (wallet_1, wallet_2):
+            self.addCleanup(get_redis().delete, get_stats_key(wallet_id=wallet_id))
+
+        with self.assertLogs('wallet.secure_transaction', level='WARNING'):
+            with self.assertRaises(WalletLockTimeout) as context:
+                with RedisWalletLock().atomic(wallet_1, wallet_2):
+                    self.fail('lock must not be acquired')
+        self.assertEqual(context.exception.retry_after, 3)
+        # второй кошелёк не остался заблокированным
+        self.assertFalse(get_redis().exists(get_full_key(wallet_id=wallet_2)))
+
+        stats = lock_stats.get(wallet_id=wallet_1)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['contended'], 1)
+        self.assertGreaterEqual(stats['wait_ms'], 50)
+
+    @override_settings(WALLET_LOCK_ACQUIRE_TIMEOUT=0.05)
+    def test_local_lock_timeout(self):
+        """Проверка таймаута лока внутри процесса."""
+        wallet_1, wallet_2 = uuid.uuid4(), uuid.uuid4()
+        with LocalWalletLock().atomic(wallet_2):
+            with self.assertLogs('wallet.secure_transaction', level='WARNING'):
+                with self.assertRaises(WalletLockTimeout):
+                    with LocalWalletLock().atomic(wallet_1, wallet_2):
+                        self.fail('lock must not be acquired')
+
+        # первый кошелёк отпущен после таймаута
+        with LocalWalletLock().atomic(wallet_1, wallet_2):
+            pass
+        # локи отпущенных кошельков не копятся
+        self.assertFalse({str(wallet_1), str(wallet_2)} & set(LocalWalletLock._locks))
+
+    @override_settings(
+        WALLET_LOCK_BACKEND='wallet.secure_transaction.RedisWalletLock',
+        WALLET_TRANSFER_ENGINE='locking',
+        WALLET_LOCK_ACQUIRE_TIMEOUT=0.05,
+    )
+    def test_busy_wallet_response(self):
+        """Проверка, что перевод с занятого кошелька сразу получает 429 с Retry-After."""
+        user = User.objects.create_user(email='test@test.test')
+        sender = Wallet.objects.create(user=user, balance=100)
+        payee = Wallet.objects.create(user=user)
+        self._occupy_wallet(wallet_id=sender.pk)
+        self.addCleanup(get_redis().delete, get_stats_key(wallet_id=sender.pk))
+        self.addCleanup(get_redis().delete, get_stats_key(wallet_id=payee.pk))
+
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.assertLogs('wallet.secure_transaction', level='WARNING'):
+            response = client.post(
+                path='/wallet/transaction/',
+                data={'sender': sender.pk, 'payee': payee.pk, 'amount': 10},
+            )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json(), {'error': 'wallet is busy'})
+        self.assertEqual(Wallet.objects.get(pk=sender.pk).balance, 100)
+
+    @override_settings(
+        WALLET_LOCK_BACKEND='wallet.secure_transaction.RedisWalletLock',
+        WALLET_LOCK_FALLBACK_BACKEND='wallet.secure_transaction.LocalWalletLock',
+    )
+    def test_fallback(self):
+        """Проверка переключения на запасной бэкенд, если редис недоступен."""
+        with mock.patch('wallet.secure_transaction.get_redis', get_unavailable_redis):
+            with self.assertLogs('wallet.secure_transaction', level='WARNING'):
+                with locked_atomic(uuid.uuid4()):
+                    self.assertTrue(connection.in_atomic_block)
+
+    @override_settings(
+        WALLET_LOCK_BACKEND='wallet.secure_transaction.RedisWalletLock',
+        WALLET_LOCK_FALLBACK_BACKEND='',
+    )
+    def test_without_fallback(self):
+        """Проверка ошибки, если редис недоступен, а запасной бэкенд не задан."""
+        with mock.patch('wallet.secure_transaction.get_redis', get_unavailable_redis):
+            with self.assertRaises(LockBackendUnavailable):
+                with locked_atomic(uuid.uuid4()):
+                    self.fail('lock must not be acquired')
+
+    @skipUnless(connection.vendor == 'postgresql', 'advisory locks require PostgreSQL')
+    def test_advisory_lock(self):
+        """Проверка, что advisory лок живёт до конца транзакции."""
+        wallet_ids = [uuid.uuid4(), uuid.uuid4()]
+        lock_keys = sorted(AdvisoryWalletLock.get_lock_key(wallet_id) for wallet_id in wallet_ids)
+        query = (
+            'SELECT ((classid::bigint << 32) | objid::bigint)::bigint FROM pg_locks '
+            "WHERE locktype = 'advisory' AND pid = pg_backend_pid() ORDER BY 1"
+        )
+
+        with AdvisoryWalletLock().atomic(*wallet_ids):
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+                locked_keys = [
+                    # objid и classid - беззнаковые половины ключа
+                    key if key < 2 ** 63 else key - 2 ** 64
+                    for key, in cursor.fetchall()
+                ]
+        self.assertEqual(sorted(locked_keys), lock_keys)
+
+    @skipUnless(connection.vendor == 'postgresql', 'advisory locks require PostgreSQL')
+    @override_settings(WALLET_LOCK_ACQUIRE_TIMEOUT=0.05)
+    def test_advisory_lock_timeout(self):
+        """Проверка, что advisory лок занятого кошелька ждём не дольше таймаута."""
+        wallet_id = uuid.uuid4()
+        is_locked, is_done = threading.Event(), threading.Event()
+
+        def worker():
+            # лок другой сессии базы
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_lock(%s)',
+                    [AdvisoryWalletLock.get_lock_key(wallet_id)],
+                )
+                is_locked.set()
+                is_done.wait(timeout=5)
+            connection.close()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        self.assertTrue(is_locked.wait(timeout=1))
+        try:
+            with self.assertLogs('wallet.secure_transaction', level='WARNING'):
+                with self.assertRaises(WalletLockTimeout):
+                    with AdvisoryWalletLock().atomic(wallet_id):
+                        self.fail('lock must not be acquired')
+        finally:
+            is_done.set()
+            thread.join()
+
+    @skipUnless(connection.vendor == 'postgresql', 'advisory locks require PostgreSQL')
+    @override_settings(WALLET_LOCK_BACKEND='wallet.secure_transaction.AdvisoryWalletLock')
+    def test_advisory_transfer(self):
+        """Проверка перевода под advisory локом."""
+        user = User.objects.create_user(email='test@test.test')
+        sender = Wallet.objects.create(user=user, balance=100)
+        payee = Wallet.objects.create(user=user)
+
+        make_transfer(
+            user_id=user.pk,
+            sender_id=sender.pk,
+            payee_id=payee.pk,
+            amount=60,
+        )
+
+        self.assertEqual(Wallet.objects.get(pk=sender.pk).balance, 40)
+        self.assertEqual(Wallet.objects.get(pk=payee.pk).balance, 60)
+
+
+class DeadlockError(Exception):
+    """Ошибка драйвера базы с кодом deadlock_detected."""
+
+    pgcode = '40P01'
+
+
+@override_settings(WALLET_TRANSFER_RETRY_ATTEMPTS=3, WALLET_TRANSFER_RETRY_BACKOFF=0)
+class RetryOnConflictTestCase(SimpleTestCase):
+    """Тесты на повтор транзакции при deadlock."""
+
+    def _get_function(self, errors: list) -> mock.Mock:
+        def raise_error():
+            if errors:
+                raise errors.pop(0)
+            return 'done'
+
+        return mock.Mock(side_effect=raise_error, __name__='transfer')
+
+    def _get_deadlock(self) -> OperationalError:
+        error = OperationalError('deadlock detected')
+        error.__cause__ = DeadlockError()
+        return error
+
+    def test_retry(self):
+        """Проверка, что транзакция повторяется после deadlock."""
+        function = self._get_function(errors=[self._get_deadlock(), self._get_deadlock()])
+        with self.assertLogs('wallet.secure_transaction', level='WARNING'):
+            self.assertEqual(retry_on_conflict(function)(), 'done')
+        self.assertEqual(function.call_count, 3)
+
+    def test_attempts_exceeded(self):
+        """Проверка, что после исчерпания попыток ошибка пробрасывается."""
+        function = self._get_function(errors=[self._get_deadlock() for _ in range(3)])
+        with self.assertLogs('wallet.secure_transaction', level='WARNING'):
+            with self.assertRaises(OperationalError):
+                retry_on_conflict(function)()
+        self.assertEqual(function.call_count, 3)
+
+    def test_other_errors(self):
+        """Проверка, что прочие ошибки базы не повторяются."""
+        function = self._get_function(errors=[OperationalError('server closed the connection')])
+        with self.assertRaises(OperationalError):
+            retry_on_conflict(function)()
+        self.assertEqual(function.call_count, 1)
+
+
+class RedisPoolTestCase(TestCase):
+    """Тесты на общий пул соединений с редисом."""
+
+    def test_shared_pool(self):
+        """Проверка, что клиенты используют один пул и соединения возвращаются в него."""
+        self.assertIs(get_redis().connection_pool, get_redis().connection_pool)
+
+        wait_count = redis_pool.get_pool_stats()['wait_count']
+        for _ in range(3):
+            get_redis().ping()
+
+        stats = redis_pool.get_pool_stats()
+        self.assertEqual(stats['wait_count'], wait_count + 3)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertGreaterEqual(stats['idle'], 1)
+        self.assertEqual(stats['created'], stats['idle'])
+
+    def test_new_pool_after_fork(self):
+        """Проверка, что в дочернем процессе создаётся свой пул."""
+        parent_pool = redis_pool.get_connection_pool()
+        with mock.patch('billing.redis_pool.os.getpid', return_value=-1):
+            self.assertIsNot(redis_pool.get_connection_pool(), parent_pool)
+
+    def test_retry(self):
+        """Проверка повтора любой команды, если соединение не удалось получить."""
+        pool = redis_pool.get_connection_pool()
+        client = redis_pool.RetryingRedis(connection_pool=pool, retry_attempts=3)
+        with mock.patch.object(
+            pool,
+            'get_connection',
+            side_effect=ConnectionError,
+        ) as get_connection:
+            with self.assertRaises(ConnectionError):
+                client.xadd('test_retry_stream', {'field': 'value'})
+        self.assertEqual(get_connection.call_count, 3)
+
+    def test_pool_exhausted(self):
+        """Проверка, что исчерпание пула не повторяется."""
+        pool = redis_pool.MeasuredConnectionPool(
+            host=settings.REDIS['HOST'],
+            port=settings.REDIS['PORT'],
+            max_connections=1,
+            timeout=0.05,
+        )
+        self.addCleanup(pool.disconnect)
+        client = redis_pool.RetryingRedis(connection_pool=pool, retry_attempts=3)
+        busy = pool.get_connection('PING')
+        with mock.patch.object(
+            pool,
+            'get_connection',
+            wraps=pool.get_connection,
+        ) as get_connection:
+            with self.assertRaises(redis_pool.PoolExhaustedError):
+                client.get('test_retry_key')
+        self.assertEqual(get_connection.call_count, 1)
+        pool.release(busy)
+        self.assertIsNone(client.get('test_retry_key'))
+
+    def test_retry_after_send(self):
+        """Проверка, что после отправки повторяются только идемпотентные команды."""
+        client = redis_pool.RetryingRedis(
+            connection_pool=redis_pool.get_connection_pool(),
+            retry_attempts=3,
+        )
+        commands = (
+            (lambda: client.get('test_retry_key'), 3),
+            (lambda: client.set('test_retry_key', 1, ex=1), 3),
+            (lambda: client.set('test_retry_key', 1, ex=1, nx=True), 1),
+            (lambda: client.xadd('test_retry_stream', {'field': 'value'}), 1),
+            (lambda: client.incr('test_retry_key'), 1),
+        )
+        for command, attempts in commands:
+            with mock.patch.object(
+                client,
+                'parse_response',
+                side_effect=TimeoutError,
+            ) as parse_response:
+                with self.assertRaises(TimeoutError):
+                    command()
+            self.assertEqual(parse_response.call_count, attempts)
+        self.assertEqual(redis_pool.get_pool_stats()['in_use'], 0)
+        get_redis().delete('test_retry_key', 'test_retry_stream')
+
+    def test_stats_view(self):
+        """Проверка, что статистику пула видит только администратор."""
+        client = APIClient()
+        user = User.objects.create_user(email='test@test.test')
+        client.force_authenticate(user)
+        response = client.get('/internal/redis-pool/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        user.save()
+        response = client.get('/internal/redis-pool/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('in_use', response.json())
+        self.assertIn('wait_max_ms', response.json())
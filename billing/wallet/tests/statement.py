@@ -0,0 +1,166 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+)
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from billing.asgi import application
+from users.models import User
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.statement import STATEMENT_COLUMNS
+
+
+test_email = 'test@test.test'
+
+
+class StatementTestCase(TestCase):
+    """Тесты на /wallet/<id>/statement/."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user_1 = User.objects.create_user(email=test_email)
+        self.wallet_1 = Wallet.objects.create(user=self.user_1)
+        self.user_2 = User.objects.create_user(email=f'{test_email}_2')
+        self.wallet_2 = Wallet.objects.create(user=self.user_2)
+
+        self.transactions = [
+            Transaction.objects.create(payee=self.wallet_1, amount=100),
+            Transaction.objects.create(sender=self.wallet_1, payee=self.wallet_2, amount=10),
+            Transaction.objects.create(
+                sender=self.wallet_2,
+                payee=self.wallet_1,
+                amount=20,
+                is_anonymous=True,
+                comment='анонимно, "с кавычками"',
+            ),
+            Transaction.objects.create(sender=self.wallet_1, payee=self.wallet_1, amount=5),
+            Transaction.objects.create(sender=self.wallet_2, payee=self.wallet_2, amount=1),
+        ]
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user_1)
+        self.path = f'/wallet/{self.wallet_1.pk}/statement/'
+
+    def _get_content(self, response) -> bytes:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        """Проверка выписки в CSV: все транзакции кошелька от старых к новым."""
+        response = self.client.get(self.path)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(self._get_content(response).decode())))
+
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [str(transaction.pk) for transaction in self.transactions[:4]],
+        )
+        self.assertEqual([row['direction'] for row in rows], ['in', 'out', 'in', 'in'])
+        self.assertEqual(rows[0]['sender'], '')
+        # отправитель анонимного перевода скрыт
+        self.assertEqual(rows[2]['sender'], '')
+        self.assertEqual(rows[2]['comment'], 'анонимно, "с кавычками"')
+        self.assertEqual(rows[1]['amount'], '10.00')
+
+    def test_ndjson_gzip(self):
+        """Проверка выписки в NDJSON со сжатием."""
+        response = self.client.get(
+            self.path,
+            {'export_format': 'ndjson', 'gzip': 'true'},
+        )
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.ndjson.gz', response['Content-Disposition'])
+        lines = gzip.decompress(self._get_content(response)).decode().splitlines()
+
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(tuple(rows[0]), STATEMENT_COLUMNS)
+        self.assertEqual(rows[1]['sender'], str(self.wallet_1.pk))
+        self.assertIsNone(rows[2]['sender'])
+
+    def test_bad_request(self):
+        """Проверка доступа к чужому кошельку и неверного формата."""
+        response = self.client.get(f'/wallet/{self.wallet_2.pk}/statement/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(self.path, {'export_format': 'xlsx'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('export_format', response.json())
+
+    def test_export_command(self):
+        """Проверка выгрузки выписки командой в файл."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'statement.csv.gz')
+            call_command(
+                'export_statement',
+                str(self.wallet_2.pk),
+                f'--output={path}',
+                '--gzip',
+                stderr=io.StringIO(),
+            )
+            with gzip.open(path, 'rt') as statement:
+                rows = list(csv.DictReader(statement))
+
+        self.assertEqual(
+            [row['id'] for row in rows],
+            [str(self.transactions[index].pk) for index in (1, 2, 4)],
+        )
+        # свой анонимный перевод отправитель видит
+        self.assertEqual(rows[1]['sender'], str(self.wallet_2.pk))
+
+
+class StatementASGITestCase(TransactionTestCase):
+    """
+    Тесты на выгрузку выписки под ASGI.
+
+    Выписка читается в отдельном потоке со своим соединением, поэтому данные теста
+    должны быть закоммичены (TransactionTestCase).
+    """
+
+    def test_stream(self):
+        """Проверка, что выписка под ASGI читается из базы вне событийного цикла."""
+        user = User.objects.create_user(email=test_email)
+        wallet = Wallet.objects.create(user=user)
+        transactions = [
+            Transaction.objects.create(payee=wallet, amount=amount)
+            for amount in (1, 2)
+        ]
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': f'/wallet/{wallet.pk}/statement/',
+            'query_string': b'export_format=ndjson',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Bearer {AccessToken.for_user(user)}'.encode()),
+            ],
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(application)(scope, receive, send)
+
+        self.assertEqual(messages[0]['status'], status.HTTP_200_OK)
+        self.assertNotIn('more_body', messages[-1])
+        content = b''.join(message.get('body', b'') for message in messages[1:])
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [str(item.pk) for item in transactions])
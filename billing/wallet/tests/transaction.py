@@ -1,10 +1,19 @@
 import uuid
 
-from django.test import TestCase
+from django.db import connection
+from django.test import (
+    TestCase,
+    override_settings,
+)
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
 from users.models import User
+from wallet.constants import (
+    TRANSFER_ENGINE_CONDITIONAL,
+    TRANSFER_ENGINE_LOCKING,
+)
 from wallet.models import (
     Transaction,
     Wallet,
@@ -283,3 +292,30 @@ class TransactionTestCase(TestCase):
             ).balance,
             1_000_000,
         )
+
+    def test_query_count(self):
+        """
+        Проверка числа запросов к базе на перевод.
+
+        Пользователь берётся из кэша авторизации, кошельки не запрашиваются при валидации:
+        locking - выборка обоих кошельков, вставка транзакции, обновление балансов
+        (и SAVEPOINT/RELEASE вокруг них, так как тест уже идёт в транзакции);
+        conditional - один запрос. В обоих случаях после коммита кэш балансов
+        перечитывает оба кошелька одним запросом.
+        """
+        Wallet.objects.filter(pk=self.wallet_1.pk).update(balance=100)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user_1)}')
+        data = {'sender': self.wallet_1.pk, 'payee': self.wallet_2.pk, 'amount': 1}
+        # первый запрос кладёт пользователя в кэш
+        client.post(path='/wallet/transaction/', data=data)
+
+        engines = [(TRANSFER_ENGINE_LOCKING, 6)]
+        if connection.vendor == 'postgresql':
+            engines.append((TRANSFER_ENGINE_CONDITIONAL, 2))
+        for engine, query_count in engines:
+            with self.subTest(engine=engine), override_settings(WALLET_TRANSFER_ENGINE=engine):
+                with self.assertNumQueries(query_count):
+                    with self.captureOnCommitCallbacks(execute=True):
+                        response = client.post(path='/wallet/transaction/', data=data)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,152 @@
+import uuid
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users.models import User
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+
+
+test_email = 'test@test.test'
+
+
+class TransactionHistoryTestCase(TestCase):
+    """Тесты на /wallet/<id>/transactions/."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user_1 = User.objects.create_user(email=test_email)
+        self.wallet_1 = Wallet.objects.create(user=self.user_1)
+        self.user_2 = User.objects.create_user(email=f'{test_email}_2')
+        self.wallet_2 = Wallet.objects.create(user=self.user_2)
+
+        # у двух транзакций одинаковое время, порядок между ними задаёт id
+        self.now = timezone.now()
+        self.transactions = [
+            self._create_transaction(None, self.wallet_1, 100, 6),
+            self._create_transaction(self.wallet_1, self.wallet_2, 10, 5),
+            self._create_transaction(self.wallet_2, self.wallet_1, 20, 4),
+            self._create_transaction(self.wallet_1, self.wallet_1, 30, 3),
+            self._create_transaction(self.wallet_2, self.wallet_1, 40, 2),
+            self._create_transaction(self.wallet_1, self.wallet_2, 50, 2),
+            self._create_transaction(self.wallet_2, self.wallet_2, 60, 0),
+        ]
+        Transaction.objects.filter(
+            pk=self.transactions[2].pk,
+        ).update(
+            is_anonymous=True,
+        )
+        Transaction.objects.filter(
+            pk=self.transactions[1].pk,
+        ).update(
+            is_anonymous=True,
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user_1)
+        self.path = f'/wallet/{self.wallet_1.pk}/transactions/'
+
+    def _create_transaction(self, sender, payee, amount, hours_ago) -> Transaction:
+        created_at = self.now - timedelta(hours=hours_ago)
+        transaction = Transaction.objects.create(sender=sender, payee=payee, amount=amount)
+        Transaction.objects.filter(pk=transaction.pk).update(created_at=created_at)
+        transaction.created_at = created_at
+        return transaction
+
+    def _get_expected_ids(self, transactions):
+        return [
+            str(transaction.pk)
+            for transaction in sorted(
+                transactions,
+                key=lambda transaction: (transaction.created_at, str(transaction.pk)),
+                reverse=True,
+            )
+        ]
+
+    def _get_all_pages(self, limit: int, **params):
+        results = []
+        response = self.client.get(self.path, {'limit': limit, **params})
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.json()['results']), limit)
+            results += response.json()['results']
+            if response.json()['next'] is None:
+                return results
+            response = self.client.get(response.json()['next'])
+
+    def test_pages(self):
+        """Проверка, что страницы по курсору содержат все транзакции кошелька ровно один раз."""
+        results = self._get_all_pages(limit=2)
+        self.assertEqual(
+            [result['id'] for result in results],
+            self._get_expected_ids(self.transactions[:6]),
+        )
+
+    def test_no_offset_and_count(self):
+        """Проверка, что страница выбирается без OFFSET и COUNT(*)."""
+        response = self.client.get(self.path, {'limit': 2})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(response.json()['next'])
+        for query in queries.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'].upper())
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_anonymous_sender(self):
+        """Проверка, что скрывается только отправитель анонимной входящей транзакции."""
+        results = {
+            result['id']: result
+            for result in self.client.get(self.path).json()['results']
+        }
+        self.assertIsNone(results[str(self.transactions[2].pk)]['sender'])
+        self.assertEqual(
+            results[str(self.transactions[1].pk)]['sender'],
+            str(self.wallet_1.pk),
+        )
+        self.assertEqual(
+            results[str(self.transactions[4].pk)]['sender'],
+            str(self.wallet_2.pk),
+        )
+
+    def test_filters(self):
+        """Проверка фильтров по направлению, сумме и дате."""
+        response = self.client.get(self.path, {'direction': 'in'})
+        self.assertEqual(
+            [result['id'] for result in response.json()['results']],
+            self._get_expected_ids(self.transactions[2:5] + self.transactions[:1]),
+        )
+
+        response = self.client.get(self.path, {'direction': 'out', 'amount_min': 20})
+        self.assertEqual(
+            [result['id'] for result in response.json()['results']],
+            self._get_expected_ids([self.transactions[3], self.transactions[5]]),
+        )
+
+        date_to = self.transactions[3].created_at
+        results = self._get_all_pages(limit=1, amount_max=40, date_to=date_to.isoformat())
+        self.assertEqual(
+            [result['id'] for result in results],
+            self._get_expected_ids(self.transactions[1:4]),
+        )
+
+    def test_bad_request(self):
+        """Проверка доступа к чужому кошельку и неверных параметров."""
+        response = self.client.get(f'/wallet/{self.wallet_2.pk}/transactions/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(f'/wallet/{uuid.uuid4()}/transactions/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(self.path, {'direction': 'all'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('direction', response.json())
+
+        response = self.client.get(self.path, {'cursor': 'broken'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,190 @@
+import threading
+from time import sleep
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+)
+
+from users.models import User
+from wallet.constants import (
+    TRANSFER_ENGINE_CONDITIONAL,
+    TRANSFER_ENGINES,
+)
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.transfer_engine import (
+    TransferError,
+    make_transfer,
+)
+
+
+test_email = 'test@test.test'
+test_password = 'Secret!1'  # noqa: S105 для тестов можно
+
+
+@skipUnless(connection.vendor == 'postgresql', 'conditional engine requires PostgreSQL')
+class ConditionalTransferTestCase(TestCase):
+    """Тесты на перевод одним запросом с условным списанием."""
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user_1 = User.objects.create_user(
+            email=test_email,
+            password=test_password,
+        )
+        self.wallet_1 = Wallet.objects.create(
+            user=self.user_1,
+            balance=1000,
+        )
+        self.user_2 = User.objects.create_user(
+            email=f'{test_email}_2',
+            password=f'{test_password}_2',
+        )
+        self.wallet_2 = Wallet.objects.create(
+            user=self.user_2,
+        )
+
+    def _transfer(self, sender: Wallet, payee: Wallet, amount: int):
+        make_transfer(
+            user_id=self.user_1.pk,
+            sender_id=sender.pk,
+            payee_id=payee.pk,
+            amount=amount,
+            comment='test',
+            engine=TRANSFER_ENGINE_CONDITIONAL,
+        )
+
+    def _get_balance(self, wallet: Wallet):
+        return Wallet.objects.get(pk=wallet.pk).balance
+
+    def test_good_transfer(self):
+        """Проверка успешного перевода."""
+        with self.assertNumQueries(1):
+            self._transfer(sender=self.wallet_1, payee=self.wallet_2, amount=300)
+
+        self.assertEqual(self._get_balance(self.wallet_1), 700)
+        self.assertEqual(self._get_balance(self.wallet_2), 300)
+        transaction = Transaction.objects.get()
+        self.assertEqual(transaction.sender_id, self.wallet_1.pk)
+        self.assertEqual(transaction.payee_id, self.wallet_2.pk)
+        self.assertEqual(transaction.amount, 300)
+        self.assertEqual(transaction.comment, 'test')
+
+    def test_not_enough_balance(self):
+        """Проверка, что при нехватке средств ничего не меняется."""
+        with self.assertRaisesMessage(TransferError, 'insufficient funds'):
+            self._transfer(sender=self.wallet_1, payee=self.wallet_2, amount=1001)
+
+        self.assertEqual(self._get_balance(self.wallet_1), 1000)
+        self.assertEqual(self._get_balance(self.wallet_2), 0)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_another_user(self):
+        """Проверка, что нельзя списать с чужого кошелька."""
+        Wallet.objects.filter(pk=self.wallet_2.pk).update(balance=1000)
+
+        with self.assertRaisesMessage(TransferError, 'wallet not found'):
+            self._transfer(sender=self.wallet_2, payee=self.wallet_1, amount=1)
+
+        self.assertEqual(self._get_balance(self.wallet_2), 1000)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_payee_not_found(self):
+        """Проверка, что перевод на несуществующий кошелёк не списывает средства."""
+        with self.assertRaisesMessage(TransferError, 'payee not found'):
+            self._transfer(sender=self.wallet_1, payee=Wallet(), amount=1)
+
+        self.assertEqual(self._get_balance(self.wallet_1), 1000)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_self_transfer(self):
+        """Проверка перевода на свой же кошелёк."""
+        self._transfer(sender=self.wallet_1, payee=self.wallet_1, amount=1000)
+
+        self.assertEqual(self._get_balance(self.wallet_1), 1000)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'deadlock statistics require PostgreSQL')
+class SymmetricTransferStressTestCase(TransactionTestCase):
+    """Нагрузочный тест встречных переводов A->B и B->A между парой кошельков."""
+
+    threads = 8
+    transfers_per_thread = 50
+    initial_balance = 1000
+
+    def setUp(self):
+        """Настройка тестов."""
+        self.user = User.objects.create_user(email=test_email)
+        self.wallet_1 = Wallet.objects.create(user=self.user, balance=self.initial_balance)
+        self.wallet_2 = Wallet.objects.create(user=self.user, balance=self.initial_balance)
+
+    def _get_deadlocks_count(self) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_stat_clear_snapshot()')
+            cursor.execute(
+                'SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()',
+            )
+            return cursor.fetchone()[0]
+
+    def _run_symmetric_transfers(self, engine: str, errors: list):
+        def worker(sender: Wallet, payee: Wallet):
+            try:
+                for _ in range(self.transfers_per_thread):
+                    make_transfer(
+                        user_id=self.user.pk,
+                        sender_id=sender.pk,
+                        payee_id=payee.pk,
+                        amount=1,
+                        engine=engine,
+                    )
+            except Exception as exc:  # noqa: B902 нам нужны все ошибки
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(
+                target=worker,
+                args=(
+                    (self.wallet_1, self.wallet_2)
+                    if thread_number % 2
+                    else (self.wallet_2, self.wallet_1)
+                ),
+            )
+            for thread_number in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_no_deadlocks(self):
+        """Проверка, что встречные переводы не приводят к deadlock ни в одном режиме."""
+        for engine in TRANSFER_ENGINES:
+            with self.subTest(engine=engine):
+                deadlocks_before = self._get_deadlocks_count()
+
+                errors = []
+                self._run_symmetric_transfers(engine=engine, errors=errors)
+
+                # статистика закрытых соединений попадает в pg_stat_database не мгновенно
+                sleep(0.5)
+                self.assertEqual(errors, [])
+                self.assertEqual(self._get_deadlocks_count(), deadlocks_before)
+
+        transfers_count = self.threads * self.transfers_per_thread * len(TRANSFER_ENGINES)
+        self.assertEqual(Transaction.objects.count(), transfers_count)
+        self.assertEqual(
+            Wallet.objects.get(pk=self.wallet_1.pk).balance,
+            self.initial_balance,
+        )
+        self.assertEqual(
+            Wallet.objects.get(pk=self.wallet_2.pk).balance,
+            self.initial_balance,
+        )
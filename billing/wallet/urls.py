@@ -1,12 +1,41 @@
+from django.conf import settings
 from django.urls import path
 
 from wallet.views import (
+    CreateBatchTransactionView,
     CreateDepositView,
     CreateTransactionView,
+    WalletBalanceView,
+    WalletStatementView,
+    WalletTransactionListView,
+    create_deposit_async,
+    create_transaction_async,
 )
 
 
+if settings.WALLET_ASYNC_VIEWS:
+    # под ASGI перевод и пополнение обрабатываются асинхронными вью
+    deposit_view = create_deposit_async
+    transaction_view = create_transaction_async
+else:
+    deposit_view = CreateDepositView.as_view({'post': 'create'})
+    transaction_view = CreateTransactionView.as_view({'post': 'create'})
+
+
 urlpatterns = [
-    path('deposit/', CreateDepositView.as_view({'post': 'create'})),
-    path('transaction/', CreateTransactionView.as_view({'post': 'create'})),
+    path('deposit/', deposit_view),
+    path('transaction/', transaction_view),
+    path('transaction/batch/', CreateBatchTransactionView.as_view({'post': 'create'})),
+    path(
+        '<uuid:wallet_id>/balance/',
+        WalletBalanceView.as_view({'get': 'retrieve'}),
+    ),
+    path(
+        '<uuid:wallet_id>/transactions/',
+        WalletTransactionListView.as_view({'get': 'list'}),
+    ),
+    path(
+        '<uuid:wallet_id>/statement/',
+        WalletStatementView.as_view({'get': 'retrieve'}),
+    ),
 ]
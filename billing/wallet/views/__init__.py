@@ -1,8 +1,28 @@
+from wallet.views.async_create import (
+    create_deposit_async,
+    create_transaction_async,
+)
+from wallet.views.balance import (
+    BalanceCacheStatsView,
+    WalletBalanceView,
+)
+from wallet.views.batch_transaction import CreateBatchTransactionView
 from wallet.views.deposit import CreateDepositView
+from wallet.views.hot_wallets import HotWalletsView
+from wallet.views.statement import WalletStatementView
 from wallet.views.transaction import CreateTransactionView
+from wallet.views.transaction_history import WalletTransactionListView
 
 
 __all__ = [
+    'BalanceCacheStatsView',
+    'CreateBatchTransactionView',
     'CreateTransactionView',
     'CreateDepositView',
+    'HotWalletsView',
+    'WalletBalanceView',
+    'WalletStatementView',
+    'WalletTransactionListView',
+    'create_deposit_async',
+    'create_transaction_async',
 ]
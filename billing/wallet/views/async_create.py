@@ -0,0 +1,116 @@
+"""
+Асинхронные вью перевода и пополнения для запуска под ASGI.
+
+Перевод почти всё время ждёт ответа редиса и базы, поэтому синхронный воркер большую
+часть времени простаивает. Асинхронная вью проверяет подпись токена в событийном цикле,
+а чтение пользователя и проведение перевода (та же DRF вью, что и для WSGI) отдаёт
+в пул потоков воркера, так что один воркер одновременно обрабатывает
+до ASYNC_POOL['CONCURRENCY'] запросов.
+"""
+from typing import (
+    Callable,
+    Optional,
+)
+
+from django.http import JsonResponse
+from rest_framework import (
+    exceptions,
+    status,
+)
+from rest_framework_simplejwt.tokens import Token
+
+from billing.async_pool import (
+    ConcurrencyLimitExceeded,
+    concurrency_limit,
+    run_in_pool,
+)
+from billing.authentication import CachedJWTAuthentication
+from billing.metrics import (
+    STAGE_AUTH,
+    stage_timer,
+)
+from wallet.views.deposit import CreateDepositView
+from wallet.views.transaction import CreateTransactionView
+
+
+authentication = CachedJWTAuthentication()
+
+
+def get_validated_token(request) -> Optional[Token]:
+    """
+    Проверка подписи и срока JWT токена без обращения к базе, прямо в событийном цикле.
+
+    :return: токен или None, если токена в запросе нет
+    :raises AuthenticationFailed: токен недействителен
+    """
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    return authentication.get_validated_token(raw_token)
+
+
+def _unauthorized(request, exc: exceptions.APIException) -> JsonResponse:
+    """Ответ 401 в том же формате, что и у DRF."""
+    data = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+    response = JsonResponse(data, status=status.HTTP_401_UNAUTHORIZED)
+    response['WWW-Authenticate'] = authentication.authenticate_header(request)
+    return response
+
+
+def async_create_view(view_class) -> Callable:
+    """
+    Асинхронная обёртка над DRF вью создания транзакции.
+
+    :param view_class: DRF вью с методом create
+    :return: асинхронная вью для urlpatterns
+    """
+    sync_view = view_class.as_view({'post': 'create'})
+
+    def dispatch(request, validated_token: Token, *args, **kwargs):
+        # пользователь и перевод читаются за один переход в поток пула
+        try:
+            with stage_timer(STAGE_AUTH):
+                user = authentication.get_user(validated_token)
+        except exceptions.AuthenticationFailed as exc:
+            return _unauthorized(request, exc)
+        # DRF вью не проверяет токен повторно, а берёт уже проверенного пользователя
+        request._force_auth_user = user
+        request._force_auth_token = validated_token
+        # ответ рендерится в потоке пула, а не в общем потоке синхронного кода джанго
+        response = sync_view(request, *args, **kwargs)
+        response.render()
+        return response
+
+    async def view(request, *args, **kwargs):
+        # запрос с недействительным токеном отклоняется, не занимая поток пула
+        try:
+            with stage_timer(STAGE_AUTH):
+                validated_token = get_validated_token(request)
+        except exceptions.AuthenticationFailed as exc:
+            return _unauthorized(request, exc)
+        if validated_token is None:
+            return _unauthorized(request, exceptions.NotAuthenticated())
+
+        try:
+            async with concurrency_limit():
+                return await run_in_pool(dispatch, request, validated_token, *args, **kwargs)
+        except ConcurrencyLimitExceeded:
+            # воркер перегружен: не копим очередь, клиент повторит позже
+            response = JsonResponse(
+                {'error': 'server is busy'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+            response['Retry-After'] = '1'
+            return response
+
+    # DRF вью не проверяют CSRF, csrf_exempt не подходит для корутин в Django 3.2
+    view.csrf_exempt = True
+    view.__name__ = f'async_{view_class.__name__}'
+    return view
+
+
+create_transaction_async = async_create_view(CreateTransactionView)
+create_deposit_async = async_create_view(CreateDepositView)
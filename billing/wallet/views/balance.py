@@ -0,0 +1,60 @@
+from django.http import Http404
+from rest_framework import (
+    generics,
+    status,
+)
+from rest_framework.permissions import (
+    IsAdminUser,
+    IsAuthenticated,
+)
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import ViewSetMixin
+
+from wallet.balance_cache import (
+    cache_stats,
+    get_balance,
+)
+from wallet.models import Wallet
+
+
+class WalletBalanceView(ViewSetMixin, generics.GenericAPIView):
+    """
+    Баланс кошелька пользователя.
+
+    Баланс отдаётся из кэша в редисе без запросов к базе, версия в ответе
+    увеличивается при каждом изменении баланса.
+    """
+
+    queryset = Wallet.objects.all()
+    permission_classes = (IsAuthenticated,)
+
+    def retrieve(self, request, *args, **kwargs):  # noqa: U100
+        """Метод получения баланса."""
+        balance = get_balance(wallet_id=self.kwargs['wallet_id'])
+        if balance is None or balance['user_id'] != request.user.pk:
+            raise Http404
+
+        return Response(
+            {
+                'wallet_id': str(balance['id']),
+                'balance': str(balance['balance']),
+                'version': balance['version'],
+                'updated_at': balance['updated_at'].isoformat(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class BalanceCacheStatsView(APIView):
+    """
+    Статистика кэша балансов: попадания, промахи, ошибки редиса и отставание кэша от базы.
+
+    Счётчики у каждого воркера свои, поэтому ответ относится к воркеру, обработавшему запрос.
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):  # noqa: U100
+        """Статистика кэша текущего процесса."""
+        return Response(cache_stats.get())
@@ -0,0 +1,62 @@
+from rest_framework import (
+    generics,
+    status,
+)
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.viewsets import ViewSetMixin
+
+from billing.metrics import (
+    STAGE_VALIDATION,
+    stage_timer,
+)
+from wallet.balance_cache import refresh_balances_on_commit
+from wallet.batch_transfer import make_batch_transfer
+from wallet.models import Transaction
+from wallet.secure_transaction import WalletLockTimeout
+from wallet.serializers import CreateBatchTransactionSerializer
+
+
+class CreateBatchTransactionView(ViewSetMixin, generics.CreateAPIView):
+    """
+    Пакетное создание транзакций между кошельками.
+
+    Позволяет провести тысячи переводов за один запрос вместо тысячи запросов на
+    /wallet/transaction/. Результат возвращается по каждому переводу пакета.
+    """
+
+    serializer_class = CreateBatchTransactionSerializer
+    queryset = Transaction.objects.all()
+    permission_classes = (IsAuthenticated,)
+
+    def create(self, request, *args, **kwargs):  # noqa: U100
+        """Метод проверки и безопасного проведения пакета транзакций."""
+        serializer = self.serializer_class(data=request.data)
+        with stage_timer(STAGE_VALIDATION):
+            serializer.is_valid(raise_exception=True)
+
+        items = serializer.validated_data['transactions']
+        try:
+            is_applied, results = make_batch_transfer(
+                user=request.user,
+                items=items,
+                mode=serializer.validated_data['mode'],
+            )
+        except WalletLockTimeout as exc:
+            # кошельки пакета заняты другими переводами: не держим воркер, клиент повторит позже
+            return Response(
+                {'error': str(exc)},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(exc.retry_after)},
+            )
+
+        # записываем в кэш балансы всех кошельков пакета: у кошельков без изменений
+        # версия не выросла, и кэш их не перезапишет
+        refresh_balances_on_commit(
+            *{item['sender'] for item in items} | {item['payee'] for item in items},
+        )
+
+        return Response(
+            {'results': results},
+            status=status.HTTP_200_OK if is_applied else status.HTTP_400_BAD_REQUEST,
+        )
@@ -1,58 +1,100 @@
+from logging import getLogger
+
+from django.conf import settings
 from django.db import transaction
-from django.db.models import F
+from redis import RedisError
 from rest_framework import (
     generics,
     status,
 )
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSetMixin
 
+from billing.metrics import (
+    STAGE_TRANSACTION,
+    STAGE_VALIDATION,
+    stage_timer,
+)
+from wallet.balance_cache import refresh_balances_on_commit
+from wallet.balance_slots import credit_wallet
+from wallet.constants import DEPOSIT_MODE_STREAM
+from wallet.deposit_stream import enqueue_deposit
+from wallet.idempotency import idempotent
 from wallet.models import (
     Transaction,
-    Wallet,
+    TransactionIdempotencyKey,
 )
 from wallet.serializers.deposit import CreateDepositSerializer
 
 
+logger = getLogger(__name__)
+
+
 class CreateDepositView(ViewSetMixin, generics.CreateAPIView):
     """
     Создание транзакции на пополнение кошелька.
 
     Предусматривается только пополнение кошелька из внешних источников такие как
     платёжные системы (paypal, qiwi, walletone), банковские переводы и др.
+
+    С WALLET_DEPOSIT_MODE=stream пополнение только принимается в поток редиса
+    (ответ 202 с id будущей транзакции), а проводится пачкой воркером deposit_worker.
+    Если редис недоступен, пополнение проводится сразу.
     """
 
     serializer_class = CreateDepositSerializer
     queryset = Transaction.objects.all()
     permission_classes = (IsAuthenticated,)
 
-    def create(self, request, *args, **kwargs):  # noqa: U100
+    @idempotent
+    def create(self, request, *args, idempotency_key=None, **kwargs):  # noqa: U100
         """Метод проверки и безопасного создания транзакции."""
         serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with stage_timer(STAGE_VALIDATION):
+            serializer.is_valid(raise_exception=True)
 
         payee = serializer.validated_data['payee']
         amount = serializer.validated_data['amount']
         is_anonymous = serializer.validated_data.get('is_anonymous', False)
         comment = serializer.validated_data.get('comment', '')
 
+        if settings.WALLET_DEPOSIT_MODE == DEPOSIT_MODE_STREAM:
+            try:
+                transaction_id = enqueue_deposit(
+                    payee_id=payee.pk,
+                    amount=amount,
+                    is_anonymous=is_anonymous,
+                    comment=comment,
+                    idempotency_key=idempotency_key,
+                )
+            except RedisError:
+                logger.warning('Deposit stream is unavailable, applying deposit now', exc_info=True)
+            else:
+                return Response(
+                    {'transaction': str(transaction_id)},
+                    status=status.HTTP_202_ACCEPTED,
+                )
+
         # при сохранении транзакции обновляем баланс кошелька
-        with transaction.atomic():
+        with stage_timer(STAGE_TRANSACTION), transaction.atomic():
             # создаём новую транзакцию
-            Transaction.objects.create(
+            new_transaction = Transaction.objects.create(
                 sender=None,
                 payee_id=payee.pk,
                 amount=amount,
                 is_anonymous=is_anonymous,
                 comment=comment,
+                idempotency_key=idempotency_key,
             )
-            # обновляем баланс получателя транзакции
-            Wallet.objects.filter(
-                pk=payee.pk,
-            ).update(
-                balance=F('balance') + amount,
-            )
+            TransactionIdempotencyKey.register(new_transaction)
+            # обновляем баланс получателя транзакции (у горячего кошелька - один из слотов);
+            # кошелёк могли заморозить после проверки в сериализаторе, тогда всё откатываем
+            if not credit_wallet(wallet=payee, amount=amount):
+                raise ValidationError({'payee': ['wallet is frozen']})
+            # новый баланс записывается в кэш после коммита
+            refresh_balances_on_commit(payee.pk)
 
         return Response(
             {},
@@ -0,0 +1,52 @@
+from logging import getLogger
+
+from redis import RedisError
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from wallet.hot_wallets import (
+    clamp_window,
+    get_hot_wallets,
+)
+from wallet.serializers import HotWalletsFilterSerializer
+
+
+logger = getLogger(__name__)
+
+
+class HotWalletsView(APIView):
+    """
+    Самые горячие кошельки за скользящее окно: ожидание лока, переводы, таймауты.
+
+    Статистика общая для всех воркеров (хранится в редисе). По ней видно, какие
+    кошельки ограничивают пропускную способность переводов. Если редис недоступен,
+    ответ 503.
+    """
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request, *args, **kwargs):  # noqa: U100
+        """Топ горячих кошельков по параметрам запроса."""
+        filters = HotWalletsFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+        # окно, за которое на самом деле посчитана статистика
+        window = clamp_window(params['window'])
+        try:
+            wallets = get_hot_wallets(
+                limit=params['limit'],
+                window=window,
+                order_by=params['order_by'],
+            )
+        except RedisError:
+            logger.warning('Lock statistics are unavailable', exc_info=True)
+            return Response(
+                {'error': 'lock statistics are unavailable'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        return Response({
+            'window': window,
+            'wallets': wallets,
+        })
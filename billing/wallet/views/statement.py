@@ -0,0 +1,66 @@
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import generics
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.viewsets import ViewSetMixin
+
+from wallet.constants import (
+    STATEMENT_FORMAT_CSV,
+    STATEMENT_FORMAT_NDJSON,
+)
+from wallet.models import Wallet
+from wallet.serializers import StatementFilterSerializer
+from wallet.statement import (
+    get_statement_rows,
+    stream_statement,
+)
+
+
+class WalletStatementView(ViewSetMixin, generics.GenericAPIView):
+    """
+    Выгрузка полной выписки по кошельку пользователя в CSV или NDJSON.
+
+    Выписка отдаётся потоком по мере чтения из базы, поэтому память воркера
+    не зависит от количества транзакций на кошельке.
+    """
+
+    queryset = Wallet.objects.all()
+    permission_classes = (IsAuthenticated,)
+
+    content_types = {
+        STATEMENT_FORMAT_CSV: 'text/csv',
+        STATEMENT_FORMAT_NDJSON: 'application/x-ndjson',
+    }
+
+    def retrieve(self, request, *args, **kwargs):  # noqa: U100
+        """Метод выгрузки выписки."""
+        wallet = get_object_or_404(
+            self.queryset.only('pk'),
+            pk=self.kwargs['wallet_id'],
+            user=request.user,
+        )
+        serializer = StatementFilterSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        export_format = params['export_format']
+        filename = f'statement_{wallet.pk}.{export_format}'
+        content_type = self.content_types[export_format]
+        if params['gzip']:
+            filename = f'{filename}.gz'
+            content_type = 'application/gzip'
+
+        response = StreamingHttpResponse(
+            stream_statement(
+                rows=get_statement_rows(
+                    wallet_id=wallet.pk,
+                    date_from=params.get('date_from'),
+                    date_to=params.get('date_to'),
+                ),
+                export_format=export_format,
+                compress=params['gzip'],
+            ),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -1,6 +1,3 @@
-import redis_lock
-from django.db import transaction
-from django.db.models import F
 from rest_framework import (
     generics,
     status,
@@ -9,15 +6,19 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSetMixin
 
-from wallet.models import (
-    Transaction,
-    Wallet,
-)
-from wallet.secure_transaction import (
-    get_full_key,
-    get_redis,
+from billing.metrics import (
+    STAGE_VALIDATION,
+    stage_timer,
 )
+from wallet.balance_cache import refresh_balances_on_commit
+from wallet.idempotency import idempotent
+from wallet.models import Transaction
+from wallet.secure_transaction import WalletLockTimeout
 from wallet.serializers import CreateTransactionSerializer
+from wallet.transfer_engine import (
+    TransferError,
+    make_transfer,
+)
 
 
 class CreateTransactionView(ViewSetMixin, generics.CreateAPIView):
@@ -27,64 +28,42 @@ class CreateTransactionView(ViewSetMixin, generics.CreateAPIView):
     queryset = Transaction.objects.all()
     permission_classes = (IsAuthenticated,)
 
-    def create(self, request, *args, **kwargs):  # noqa: U100
+    @idempotent
+    def create(self, request, *args, idempotency_key=None, **kwargs):  # noqa: U100
         """Метод проверки и безопасного создания транзакции."""
         serializer = self.serializer_class(data=request.data)
-        serializer.is_valid(raise_exception=True)
-
-        sender = serializer.validated_data['sender']
-        payee = serializer.validated_data['payee']
-        amount = serializer.validated_data['amount']
-        is_anonymous = serializer.validated_data.get('is_anonymous', False)
-        comment = serializer.validated_data.get('comment', '')
-
-        redis_client = get_redis()
-
-        # Для невозможности двух параллельных транзакций на списывание средств с кошелька
-        with redis_lock.Lock(redis_client, get_full_key(wallet_id=sender.pk)):
-            # проверяем достаточно ли средств на кошельке и что кошелёк принадлежит пользователю
-            try:
-                sender_wallet: Wallet = Wallet.objects.get(
-                    pk=sender.pk,
-                    user=request.user,
-                )
-            except Wallet.DoesNotExist:
-                return Response(
-                    {'error': 'wallet not found'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        with stage_timer(STAGE_VALIDATION):
+            serializer.is_valid(raise_exception=True)
 
-            if sender_wallet.balance < amount:
-                # ошибка о нехвате средств
-                return Response(
-                    {'error': 'insufficient funds'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        # кошельки проверяются в том же запросе, что и баланс отправителя
+        sender_id = serializer.validated_data['sender']
+        payee_id = serializer.validated_data['payee']
+        try:
+            make_transfer(
+                user_id=request.user.pk,
+                sender_id=sender_id,
+                payee_id=payee_id,
+                amount=serializer.validated_data['amount'],
+                is_anonymous=serializer.validated_data['is_anonymous'],
+                comment=serializer.validated_data['comment'],
+                idempotency_key=idempotency_key,
+            )
+        except TransferError as exc:
+            # ошибка поля - в том же формате, что и ошибки валидации сериализатора
+            return Response(
+                {exc.field: [str(exc)]} if exc.field else {'error': str(exc)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except WalletLockTimeout as exc:
+            # кошелёк занят другими переводами: не держим воркер, клиент повторит позже
+            return Response(
+                {'error': str(exc)},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={'Retry-After': str(exc.retry_after)},
+            )
 
-            # при сохранении транзакции обновляем балансы кошельков
-            # делаем это внутри лока, чтобы с кошелька отправителя не произошло второй транзакции
-            # до обновления баланса
-            with transaction.atomic():
-                # создаём новую транзакцию
-                Transaction.objects.create(
-                    sender_id=sender.pk,
-                    payee_id=payee.pk,
-                    amount=amount,
-                    is_anonymous=is_anonymous,
-                    comment=comment,
-                )
-                # обновляем баланс отправителя транзакции
-                Wallet.objects.filter(
-                    pk=sender.pk,
-                ).update(
-                    balance=F('balance') - amount,
-                )
-                # обновляем баланс получателя транзакции
-                Wallet.objects.filter(
-                    pk=payee.pk,
-                ).update(
-                    balance=F('balance') + amount,
-                )
+        # перевод уже закоммичен, записываем новые балансы в кэш
+        refresh_balances_on_commit(sender_id, payee_id)
 
         return Response(
             {},
@@ -0,0 +1,79 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import generics
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.viewsets import ViewSetMixin
+
+from wallet.constants import (
+    TRANSACTION_DIRECTION_IN,
+    TRANSACTION_DIRECTION_OUT,
+)
+from wallet.models import (
+    Transaction,
+    Wallet,
+)
+from wallet.pagination import KeysetPagination
+from wallet.serializers import (
+    TransactionHistoryFilterSerializer,
+    TransactionHistorySerializer,
+)
+
+
+class WalletTransactionListView(ViewSetMixin, generics.ListAPIView):
+    """
+    История транзакций кошелька пользователя, от новых к старым.
+
+    Входящие и исходящие транзакции выбираются отдельно по индексам (payee, created_at)
+    и (sender, created_at), каждая часть ограничена размером страницы (KeysetPagination).
+    """
+
+    serializer_class = TransactionHistorySerializer
+    queryset = Transaction.objects.all()
+    permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+
+    def get_wallet(self) -> Wallet:
+        """Кошелёк из url, принадлежащий пользователю."""
+        return get_object_or_404(
+            Wallet.objects.only('pk'),
+            pk=self.kwargs['wallet_id'],
+            user=self.request.user,
+        )
+
+    def get_queryset(self):
+        """Входящие и исходящие транзакции кошелька с фильтрами из параметров запроса."""
+        filters = TransactionHistoryFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+
+        transactions = self.queryset
+        if 'amount_min' in params:
+            transactions = transactions.filter(amount__gte=params['amount_min'])
+        if 'amount_max' in params:
+            transactions = transactions.filter(amount__lte=params['amount_max'])
+        if 'date_from' in params:
+            transactions = transactions.filter(created_at__gte=params['date_from'])
+        if 'date_to' in params:
+            transactions = transactions.filter(created_at__lte=params['date_to'])
+
+        wallet_id = self.wallet.pk
+        incoming = transactions.filter(payee_id=wallet_id)
+        outgoing = transactions.filter(sender_id=wallet_id)
+        if params.get('direction') == TRANSACTION_DIRECTION_IN:
+            return [incoming]
+        if params.get('direction') == TRANSACTION_DIRECTION_OUT:
+            return [outgoing]
+        # перевод самому себе уже попал во входящие
+        return [incoming, outgoing.exclude(payee_id=wallet_id)]
+
+    def get_serializer_context(self):
+        """Кошелёк из url нужен сериализатору для скрытия анонимных отправителей."""
+        context = super().get_serializer_context()
+        context['wallet_id'] = self.wallet.pk
+        return context
+
+    def list(self, request, *args, **kwargs):  # noqa: U100
+        """Страница истории транзакций."""
+        self.wallet = self.get_wallet()
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)